@@ -2,28 +2,84 @@
 Recall Anki Plugin - Enhanced Multiple Choice Card Creator
 """
 
-from aqt import mw
-from aqt import gui_hooks
-from aqt.qt import *
+try:
+    from aqt import mw
+except ImportError:
+    # Running outside Anki, e.g. the command line importer
+    mw = None
 
 # Import from our modular structure using relative imports
 from .src.markdown.converter import convert_markdown_to_html, format_code_block
-from .src.ui.dialog import RecallInputDialog, show_recall_input_dialog
-from .src.card_templates.note_types import create_recall_note_type
-
-# Add menu item
-action = QAction("Create Recall Question", mw)
-action.triggered.connect(show_recall_input_dialog)
-action.setShortcut(QKeySequence("Ctrl+Shift+R"))  # Updated keyboard shortcut
-mw.form.menuTools.addAction(action)
+from .src.card_templates.note_types import create_recall_note_type, set_collection_theme
+from .src.card_templates.migrations import run_migrations, upgrade_note_types
+from .src.card_templates.registry import (
+    get_note_type_registry, reset_note_type_registry, on_operation_did_execute
+)
+from .src.importer import duplicates
+from .src.utils.config import get_config
 
 def init():
     """Initialize the plugin."""
-    # Create default Recall12 card (1 correct, 2 incorrect options)
-    create_recall_note_type(1, 2)
+    # Note types are created and upgraded with the chosen card theme
+    config = get_config()
+    set_collection_theme(mw.col, config['card_theme'], config['lite_theme_decks'])
+    # Read the profile's note types once and create the generic RecallN
+    # note type, which fits most questions
+    get_note_type_registry(mw.col).get_model(1, 1)
+    # Bring notes created by older versions up to date
+    run_migrations(mw.col)
+    # Refresh once after all outdated note types are regenerated
+    if upgrade_note_types(mw.col):
+        mw.reset()
+    # Adding fields to older note types needs a full sync, so the user is asked
+    offer_note_type_fields()
+
+# Worker processes and the command line importer also import this package,
+# but have no main window
+if mw is not None:
+    from aqt import gui_hooks
+    from aqt.qt import *
+
+    from .src.ui.dialog import RecallInputDialog, show_recall_input_dialog
+    from .src.ui.folder_import import show_folder_import_dialog
+    from .src.ui.note_actions import (
+        add_browser_menu_action, add_browser_context_action, add_reviewer_context_action,
+        move_notes_to_generic_note_type, add_note_type_fields, offer_note_type_fields
+    )
+
+    # Add menu items
+    action = QAction("Create Recall Question", mw)
+    action.triggered.connect(show_recall_input_dialog)
+    action.setShortcut(QKeySequence("Ctrl+Shift+R"))  # Updated keyboard shortcut
+    mw.form.menuTools.addAction(action)
+
+    folder_action = QAction("Import Recall Folder…", mw)
+    folder_action.triggered.connect(show_folder_import_dialog)
+    mw.form.menuTools.addAction(folder_action)
+
+    generic_action = QAction("Move Recall Notes to RecallN…", mw)
+    generic_action.triggered.connect(move_notes_to_generic_note_type)
+    mw.form.menuTools.addAction(generic_action)
+
+    fields_action = QAction("Upgrade Recall Note Types…", mw)
+    fields_action.triggered.connect(add_note_type_fields)
+    mw.form.menuTools.addAction(fields_action)
+
+    # Edit existing notes from the browser and the reviewer
+    gui_hooks.browser_menus_did_init.append(add_browser_menu_action)
+    gui_hooks.browser_will_show_context_menu.append(add_browser_context_action)
+    gui_hooks.reviewer_will_show_context_menu.append(add_reviewer_context_action)
 
-# Add the init hook
-gui_hooks.profile_did_open.append(init)
+    # Add the init hook
+    gui_hooks.profile_did_open.append(init)
+    # Keep the note type registry in step with the profile's note types
+    gui_hooks.operation_did_execute.append(on_operation_did_execute)
+    gui_hooks.profile_will_close.append(reset_note_type_registry)
+    # And the duplicate index with its notes
+    gui_hooks.operation_did_execute.append(duplicates.on_operation_did_execute)
+    gui_hooks.profile_will_close.append(duplicates.reset_duplicate_index)
+    # Synced notes don't come with an operation, so they are all read again
+    gui_hooks.sync_did_finish.append(duplicates.reset_duplicate_index)
 
 # Version information
-__version__ = "2.0.0" 
\ No newline at end of file
+__version__ = "2.0.0"
@@ -0,0 +1,248 @@
+"""
+Command line importer for Recall Anki plugin.
+
+Builds Recall notes into a collection file without Anki's GUI, using the
+`anki` package from PyPI, or into an .apkg file without any Anki install:
+
+    python -m recall.cli import --collection path.anki2 --deck X bank.md ...
+    python -m recall.cli apkg --output deck.apkg --deck X bank.md ...
+
+Folders are scanned for .md files. The exit status is 1 if any question
+failed to parse; the questions that did parse are still written.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from itertools import repeat
+
+from .src.importer.batch import find_markdown_files, get_source_name, convert_file, create_executor
+from .src.markdown.highlighter import is_available as can_highlight
+
+STAGES = ('read', 'parse', 'convert', 'snapshot', 'write')
+
+def build_parser():
+    """Build the argument parser."""
+    parser = argparse.ArgumentParser(prog='python -m recall.cli', description=__doc__.strip().split('\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help='Import markdown question banks into a collection')
+    import_parser.add_argument('paths', nargs='+', metavar='PATH', help='Markdown files or folders of them')
+    import_parser.add_argument('--collection', help='Path to the .anki2 collection file')
+    import_parser.add_argument('--deck', help='Deck to add the notes to, created if missing')
+    import_parser.add_argument('--workers', type=int, default=0,
+                               help='Worker processes for parsing and conversion (default: one per CPU)')
+    import_parser.add_argument('--chunk-size', type=int, default=500,
+                               help='Notes added to the collection at a time (default: 500)')
+    import_parser.add_argument('--dry-run', action='store_true',
+                               help='Parse and convert only, without opening the collection')
+    import_parser.add_argument('--remove-missing', action='store_true',
+                               help='Remove notes in the deck whose question no longer exists')
+    import_parser.add_argument('--allow-duplicates', action='store_true',
+                               help='Add questions that are already in the collection instead of skipping them')
+    import_parser.add_argument('--highlight', action='store_true',
+                               help='Highlight code blocks now with Pygments instead of on the card')
+    import_parser.add_argument('--collapse-lines', type=int, default=60, metavar='N',
+                               help='Show only the first lines of code blocks longer than N lines until expanded '
+                                    '(default: 60, 0 keeps every block whole)')
+    import_parser.add_argument('--snapshots', action='store_true',
+                               help='Save a PNG snapshot of each HTML preview, rendered offscreen with Qt WebEngine')
+    import_parser.add_argument('--stats', action='store_true', help='Print timings for each stage')
+
+    apkg_parser = commands.add_parser('apkg', help='Build an .apkg file from markdown question banks')
+    apkg_parser.add_argument('paths', nargs='+', metavar='PATH', help='Markdown files or folders of them')
+    apkg_parser.add_argument('--output', required=True, help='Path of the .apkg file to write')
+    apkg_parser.add_argument('--deck', required=True, help='Deck the package adds the notes to')
+    apkg_parser.add_argument('--workers', type=int, default=0,
+                             help='Worker processes for parsing and conversion (default: one per CPU)')
+    apkg_parser.add_argument('--highlight', action='store_true',
+                             help='Highlight code blocks now with Pygments instead of on the card')
+    apkg_parser.add_argument('--collapse-lines', type=int, default=60, metavar='N',
+                             help='Show only the first lines of code blocks longer than N lines until expanded '
+                                  '(default: 60, 0 keeps every block whole)')
+    apkg_parser.add_argument('--snapshots', action='store_true',
+                             help='Save a PNG snapshot of each HTML preview, rendered offscreen with Qt WebEngine')
+    apkg_parser.add_argument('--stats', action='store_true', help='Print timings for each stage')
+    return parser
+
+def collect_paths(paths):
+    """
+    Expand folders into the markdown files they contain.
+
+    Returns:
+        list: (path, source_name) of each file, see get_source_name
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend((file_path, get_source_name(file_path, path)) for file_path in find_markdown_files(path))
+        else:
+            files.append((path, get_source_name(path)))
+    return files
+
+def convert_files(files, media_dir, workers, timings, write, writer=None, highlight=False, collapse_lines=0,
+                  snapshots=False):
+    """
+    Convert files in worker processes and pass each note to write, in order.
+
+    Args:
+        files (list): (path, source_name) of the markdown files to convert
+        media_dir (str): Folder external images are saved to
+        workers (int): Number of worker processes, see create_executor
+        timings (dict): Seconds per stage, updated in place
+        write (callable): Called with each converted note
+        writer (NoteWriter, optional): Writer whose previously imported
+            questions are skipped when unchanged
+        highlight (bool): Highlight code blocks with Pygments
+        collapse_lines (int): Collapse code blocks with more lines
+        snapshots (bool): Add a snapshot image to each preview, see
+            add_preview_snapshots
+
+    Returns:
+        tuple: Number of questions converted and number of errors
+    """
+    questions = 0
+    errors = 0
+    view = None
+    if highlight and not can_highlight():
+        print("Pygments is not installed, code blocks are left for Prism", file=sys.stderr)
+        highlight = False
+    if snapshots:
+        from .src.markdown.snapshot import add_preview_snapshots, create_snapshot_view, is_available
+        if is_available():
+            # Qt runs on this thread, so previews are rendered here rather than in the workers
+            view = create_snapshot_view()
+        else:
+            print("PyQt6-WebEngine is not installed, previews are not snapshotted", file=sys.stderr)
+    paths = [path for path, source_name in files]
+    source_names = [source_name for path, source_name in files]
+    known_hashes = [writer.known_hashes(source_name) if writer else None for source_name in source_names]
+    with create_executor(workers) as executor:
+        for result in executor.map(convert_file, paths, repeat(media_dir), source_names, known_hashes,
+                                   repeat(highlight), repeat(collapse_lines)):
+            if writer is not None:
+                writer.record_sources(result)
+            for stage, seconds in result['timings'].items():
+                timings[stage] += seconds
+            for line_number, message in result['errors']:
+                errors += 1
+                print(f"{result['path']}:{line_number}: {message}", file=sys.stderr)
+
+            questions += len(result['notes'])
+            if view is not None:
+                snapshot_start = time.perf_counter()
+                for converted in result['notes']:
+                    add_preview_snapshots(converted['fields'], media_dir, view)
+                timings['snapshot'] += time.perf_counter() - snapshot_start
+            write_start = time.perf_counter()
+            for converted in result['notes']:
+                write(converted)
+            timings['write'] += time.perf_counter() - write_start
+    return questions, errors
+
+def print_summary(action, questions, files, errors, elapsed, timings, stats, detail=None):
+    """Print what was done, and the timings per stage if asked to."""
+    print(f"{action} {questions} questions from {files} files with {errors} errors "
+          f"in {elapsed:.2f}s ({questions / max(elapsed, 1e-6):.1f} questions/s)")
+    if detail:
+        print(f"  {detail}")
+    if stats:
+        # Worker stages are summed over all workers, so they can exceed the wall time
+        for stage in STAGES:
+            print(f"  {stage:<8} {timings[stage]:8.3f}s")
+
+def import_files(args):
+    """
+    Run the import command.
+
+    Returns:
+        int: The exit status
+    """
+    files = collect_paths(args.paths)
+    timings = dict.fromkeys(STAGES, 0.0)
+    start = time.perf_counter()
+
+    if args.dry_run:
+        # Downloaded images must not end up in a real media folder
+        media_dir = tempfile.mkdtemp(prefix='recall-dry-run-')
+        try:
+            questions, errors = convert_files(files, media_dir, args.workers, timings, lambda converted: None,
+                                              highlight=args.highlight, collapse_lines=args.collapse_lines,
+                                              snapshots=args.snapshots)
+        finally:
+            shutil.rmtree(media_dir, ignore_errors=True)
+    else:
+        from anki.collection import Collection
+        from .src.importer.writer import NoteWriter, load_source_index
+
+        col = Collection(args.collection)
+        try:
+            deck_id = col.decks.id(args.deck)
+            writer = NoteWriter(col, deck_id, args.chunk_size, load_source_index(col, deck_id),
+                                not args.allow_duplicates)
+            questions, errors = convert_files(files, col.media.dir(), args.workers, timings, writer.add, writer,
+                                              args.highlight, args.collapse_lines, args.snapshots)
+            write_start = time.perf_counter()
+            writer.flush()
+            if args.remove_missing:
+                writer.remove_missing()
+            timings['write'] += time.perf_counter() - write_start
+        finally:
+            col.close()
+
+    if args.dry_run:
+        action, detail = 'Converted', None
+    else:
+        action = 'Imported'
+        detail = (f"{writer.written} added, {writer.updated} updated, "
+                  f"{writer.unchanged} unchanged, {writer.duplicates} duplicates skipped, "
+                  f"{writer.removed} removed")
+    print_summary(action, questions, len(files), errors, time.perf_counter() - start, timings, args.stats, detail)
+    return 1 if errors else 0
+
+def build_apkg(args):
+    """
+    Run the apkg command.
+
+    Returns:
+        int: The exit status
+    """
+    from .src.exporter.apkg import ApkgWriter
+
+    files = collect_paths(args.paths)
+    timings = dict.fromkeys(STAGES, 0.0)
+    start = time.perf_counter()
+
+    media_dir = tempfile.mkdtemp(prefix='recall-apkg-media-')
+    try:
+        with ApkgWriter(args.output, args.deck, media_dir) as writer:
+            questions, errors = convert_files(files, media_dir, args.workers, timings, writer.add,
+                                              highlight=args.highlight, collapse_lines=args.collapse_lines,
+                                              snapshots=args.snapshots)
+            write_start = time.perf_counter()
+        timings['write'] += time.perf_counter() - write_start
+    finally:
+        shutil.rmtree(media_dir, ignore_errors=True)
+
+    detail = f"{writer.written} added, {writer.duplicates} duplicates skipped"
+    print_summary('Packaged', questions, len(files), errors, time.perf_counter() - start, timings, args.stats,
+                  detail)
+    return 1 if errors else 0
+
+def main(argv=None):
+    """Entry point for python -m recall.cli."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'import':
+        if not args.dry_run and not (args.collection and args.deck):
+            parser.error('--collection and --deck are required unless --dry-run is given')
+        return import_files(args)
+    if args.command == 'apkg':
+        return build_apkg(args)
+    return 2
+
+if __name__ == '__main__':
+    sys.exit(main())
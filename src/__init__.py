@@ -3,12 +3,22 @@ Recall Anki Plugin - Enhanced Multiple Choice Card Creator
 Main package for the modular components.
 """
 
+try:
+    from aqt import mw
+except ImportError:
+    # Running outside Anki, e.g. the command line importer
+    mw = None
+
 # Import and expose key components
 from .markdown.converter import convert_markdown_to_html, format_code_block
-from .ui.dialog import RecallInputDialog, show_recall_input_dialog
+from .markdown.parser import parse_input
 from .card_templates.note_types import create_recall_note_type
 
+# The dialogs need Qt, which is only set up inside Anki
+if mw is not None:
+    from .ui.dialog import RecallInputDialog, show_recall_input_dialog
+
 # Version information
 __version__ = "2.0.0"
 
-# Make sure this is recognized as a proper Python package 
\ No newline at end of file
+# Make sure this is recognized as a proper Python package 
@@ -4,5 +4,7 @@ Card templates for Recall Anki plugin.
 
 # Use relative import
 from .note_types import create_recall_note_type
+from .migrations import run_migrations
+from .registry import get_note_type_registry
 
-__all__ = ['create_recall_note_type'] 
\ No newline at end of file
+__all__ = ['create_recall_note_type', 'run_migrations', 'get_note_type_registry'] 
\ No newline at end of file
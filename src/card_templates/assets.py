@@ -0,0 +1,216 @@
+"""
+Media assets shared by all Recall note types for Recall Anki plugin.
+
+The card runtime, assets/recall.js, is installed under a name derived from
+its contents, so a changed runtime never meets a cached older copy.
+Prism is vendored in assets/prism from the official PrismJS download and
+installed into the collection media as a versioned core plus one file per
+grammar, so cards highlight code offline and load only the grammars they
+use. The JetBrains Mono code font is installed from assets/fonts the same
+way. Names start with an underscore so Anki keeps the files even though no
+field references them.
+"""
+
+import hashlib
+import json
+import os
+import re
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+PRISM_DIR = os.path.join(ASSETS_DIR, 'prism')
+FONTS_DIR = os.path.join(ASSETS_DIR, 'fonts')
+
+PRISM_VERSION = "1.24.1"
+
+# Grammars and the grammars each one extends, which must load first
+PRISM_DEPENDENCIES = {
+    'markup': [],
+    'css': [],
+    'clike': [],
+    'javascript': ['clike'],
+    'python': [],
+    'java': ['clike'],
+    'json': [],
+    'sql': [],
+    'yaml': [],
+    'bash': [],
+    'csharp': ['clike'],
+    'typescript': ['javascript'],
+}
+
+# Release components not in assets/prism yet; cards load them from the CDN
+# earlier versions loaded every grammar from, and leave those blocks plain
+# offline. Adding a component file to assets/prism/components and removing
+# it here vendors it
+PRISM_CDN_LANGUAGES = ['csharp', 'typescript']
+PRISM_CDN_PREFIX = f"https://cdnjs.cloudflare.com/ajax/libs/prism/{PRISM_VERSION}/components/prism-"
+
+# Grammars installed into the collection media
+PRISM_LANGUAGES = [language for language in PRISM_DEPENDENCIES if language not in PRISM_CDN_LANGUAGES]
+
+# Grammars to load for other language classes; HTML highlights embedded
+# styles and scripts once css and javascript are loaded after markup
+PRISM_ALIASES = {
+    'html': ['markup', 'css', 'javascript'],
+    'xml': ['markup'],
+    'svg': ['markup'],
+    'js': ['javascript'],
+    'py': ['python'],
+    'sh': ['bash'],
+    'shell': ['bash'],
+    'yml': ['yaml'],
+    'ts': ['typescript'],
+    'cs': ['csharp'],
+    'dotnet': ['csharp'],
+}
+
+# The core is <prefix>-core.js and each grammar <prefix>-<language>.js
+PRISM_MEDIA_PREFIX = f"_recall_prism-{PRISM_VERSION}"
+PRISM_SCRIPT_NAME = f"{PRISM_MEDIA_PREFIX}-core.js"
+PRISM_STYLE_NAME = f"{PRISM_MEDIA_PREFIX}.css"
+
+FONT_VERSION = "2.211"
+
+# Latin subset of each JetBrains Mono weight the styling uses, instanced
+# from the variable font with its ligatures kept; see fonts/OFL.txt
+FONT_FILES = {
+    400: 'JetBrainsMono-Regular.woff2',
+    500: 'JetBrainsMono-Medium.woff2',
+    600: 'JetBrainsMono-SemiBold.woff2',
+}
+FONT_MEDIA_PREFIX = f"_recall_jetbrains-mono-{FONT_VERSION}"
+
+# Matches every version of the runtime, Prism and font files, to find stale ones
+ASSET_MEDIA_PATTERN = re.compile(r'^_recall(?:_prism|_jetbrains-mono)?-[\w.-]+\.(?:js|css|woff2)$')
+
+def read_asset(*parts):
+    """Read a text asset file, relative to the assets folder."""
+    with open(os.path.join(ASSETS_DIR, *parts), encoding='utf-8') as f:
+        return f.read()
+
+def build_runtime_script():
+    """
+    Build the card runtime with the Prism file names it loads from media.
+
+    Returns:
+        bytes: The contents of the runtime media file
+    """
+    runtime_assets = {
+        'prismScript': PRISM_SCRIPT_NAME,
+        'prismStyle': PRISM_STYLE_NAME,
+        'prismPrefix': PRISM_MEDIA_PREFIX,
+        'prismDependencies': PRISM_DEPENDENCIES,
+        'prismAliases': PRISM_ALIASES,
+        'prismCdnLanguages': PRISM_CDN_LANGUAGES,
+        'prismCdnPrefix': PRISM_CDN_PREFIX,
+    }
+    script = f"window.RecallAssets = {json.dumps(runtime_assets)};\n" + read_asset('recall.js')
+    return script.encode('utf-8')
+
+RUNTIME_SCRIPT = build_runtime_script()
+RUNTIME_VERSION = hashlib.sha1(RUNTIME_SCRIPT).hexdigest()[:10]
+RUNTIME_SCRIPT_NAME = f"_recall-{RUNTIME_VERSION}.js"
+
+def get_font_media_name(weight):
+    """Get the media file name of a JetBrains Mono weight."""
+    return f"{FONT_MEDIA_PREFIX}-{weight}.woff2"
+
+def get_font_face_css():
+    """
+    Get the @font-face rules that load JetBrains Mono from the media folder.
+
+    Returns:
+        str: CSS for the note type styling
+    """
+    rules = []
+    for weight, file_name in FONT_FILES.items():
+        postscript_name = file_name[:-len('.woff2')]
+        style = postscript_name.split('-', 1)[1]
+        # An installed copy of the font is used before the media file
+        rules.append(f"""
+    @font-face {{
+        font-family: 'JetBrains Mono';
+        font-style: normal;
+        font-weight: {weight};
+        font-display: block;
+        src: local('JetBrains Mono {style}'), local('{postscript_name}'),
+             url('{get_font_media_name(weight)}') format('woff2');
+    }}""")
+    return ''.join(rules)
+
+def get_prism_load_order(languages):
+    """
+    Get the grammars to load for some language classes, dependencies first.
+
+    The back template's loader resolves languages the same way.
+
+    Args:
+        languages (iterable): Language classes used by a note, e.g. "python"
+
+    Returns:
+        list: Vendored grammar names; unknown languages are left out
+    """
+    order = []
+
+    def add(language):
+        for name in PRISM_ALIASES.get(language, [language]):
+            if name in PRISM_DEPENDENCIES and name not in order:
+                for dependency in PRISM_DEPENDENCIES[name]:
+                    add(dependency)
+                order.append(name)
+
+    for language in languages:
+        add(language)
+    return order
+
+def get_media_assets():
+    """
+    Get the media files the note types need.
+
+    Returns:
+        dict: File contents as bytes, keyed by media file name
+    """
+    assets = {
+        RUNTIME_SCRIPT_NAME: RUNTIME_SCRIPT,
+        PRISM_SCRIPT_NAME: read_asset('prism', 'prism-core.min.js').encode('utf-8'),
+        PRISM_STYLE_NAME: read_asset('prism', 'prism-tomorrow.css').encode('utf-8'),
+    }
+    for language in PRISM_LANGUAGES:
+        assets[f"{PRISM_MEDIA_PREFIX}-{language}.js"] = (
+            read_asset('prism', 'components', f'prism-{language}.min.js').encode('utf-8')
+        )
+    for weight, file_name in FONT_FILES.items():
+        with open(os.path.join(FONTS_DIR, file_name), 'rb') as f:
+            assets[get_font_media_name(weight)] = f.read()
+    return assets
+
+def install_media_assets(col=None):
+    """
+    Add the current assets to the collection media and remove stale versions.
+
+    Args:
+        col (Collection, optional): The collection, defaults to the
+            collection open in Anki
+
+    Returns:
+        list: Names of the files added
+    """
+    if col is None:
+        from aqt import mw
+        col = mw.col
+
+    assets = get_media_assets()
+    added = []
+    for name, data in assets.items():
+        if not col.media.have(name):
+            col.media.write_data(name, data)
+            added.append(name)
+
+    media_dir = col.media.dir()
+    stale = [
+        name for name in (os.listdir(media_dir) if os.path.isdir(media_dir) else [])
+        if ASSET_MEDIA_PATTERN.match(name) and name not in assets
+    ]
+    if stale:
+        col.media.trash_files(stale)
+    return added
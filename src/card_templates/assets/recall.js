@@ -0,0 +1,504 @@
+/*
+ * Card runtime for Recall Anki plugin.
+ *
+ * Shared by every Recall note type and installed into the collection media
+ * under a versioned name. The templates only hold the hidden field divs and
+ * the ids of the options in a data-items attribute. Each field is in the
+ * page once and is moved, never copied, to where it is shown. RecallAssets,
+ * with the Prism file names and grammar dependencies, is prepended when the
+ * file is installed.
+ *
+ * Anki keeps the page between cards and runs the script again for each one,
+ * so the runtime is defined once and only run() executes per card.
+ */
+(function() {
+    if (!window.Recall) {
+        window.Recall = createRuntime(window.RecallAssets);
+    }
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', window.Recall.run);
+    } else {
+        window.Recall.run();
+    }
+
+    function createRuntime(assets) {
+        var selectedOptions = new Set();
+        var submitted = false;
+
+        function shuffleArray(array) {
+            for (let i = array.length - 1; i > 0; i--) {
+                const j = Math.floor(Math.random() * (i + 1));
+                [array[i], array[j]] = [array[j], array[i]];
+            }
+            return array;
+        }
+
+        // The template leaves out the options of empty fields, so only
+        // items whose content is on the page are used
+        function getItems(container) {
+            let items;
+            try {
+                items = JSON.parse(container.getAttribute('data-items') || '[]');
+            } catch (error) {
+                console.error('Recall Anki: invalid data-items:', error);
+                return [];
+            }
+            return items.filter(item => document.getElementById(item.contentId));
+        }
+
+        // Get the nodes of a hidden field: a <template>'s inert content, or
+        // the children of a hidden div in notes from older templates
+        function getFieldSource(divId) {
+            const div = document.getElementById(divId);
+            if (!div) {
+                console.error('Recall Anki: div not found:', divId);
+                return null;
+            }
+            const source = div.content || div;
+            return source.hasChildNodes() ? source : null;
+        }
+
+        // Move a hidden field's content into an element; the field is
+        // parsed once by the template and never serialized again
+        function moveContent(divId, target) {
+            const source = getFieldSource(divId);
+            if (!source) return false;
+            while (source.firstChild) {
+                target.appendChild(source.firstChild);
+            }
+            return true;
+        }
+
+        function getSelectedOptions() {
+            const selectedOptionsStr = document.body.getAttribute('data-selected-options');
+            return selectedOptionsStr ? JSON.parse(selectedOptionsStr) : [];
+        }
+
+        // Explanations of options that were neither correct nor selected stay
+        // in their template until expanded
+        function addExplanationToggle(explanation, explanationId) {
+            if (!getFieldSource(explanationId)) return;
+            explanation.classList.add('collapsed');
+            const toggle = document.createElement('button');
+            toggle.className = 'explanation-toggle';
+            toggle.textContent = 'Show explanation';
+            toggle.addEventListener('click', function() {
+                explanation.removeChild(toggle);
+                explanation.classList.remove('collapsed');
+                moveContent(explanationId, explanation);
+                activateContent(explanation);
+                highlightCode(explanation);
+            });
+            explanation.appendChild(toggle);
+        }
+
+        function getShuffledMapping(count) {
+            const mapping = { originalToShuffled: {}, shuffledToOriginal: {} };
+            shuffleArray(Array.from({ length: count }, (value, index) => index)).forEach((originalIndex, newIndex) => {
+                mapping.originalToShuffled[originalIndex] = newIndex;
+                mapping.shuffledToOriginal[newIndex] = originalIndex;
+            });
+            return mapping;
+        }
+
+        // The shuffled order the front side showed, if it matches these items
+        function getOptionMapping(count) {
+            try {
+                const mapping = JSON.parse(document.body.getAttribute('data-option-mapping'));
+                if (mapping && Object.keys(mapping.shuffledToOriginal).length === count) {
+                    return mapping;
+                }
+            } catch (error) {
+                // No usable mapping, shuffle again
+            }
+            return null;
+        }
+
+        function createOptionTemplate() {
+            const option = document.createElement('div');
+            option.className = 'option';
+            const checkbox = document.createElement('input');
+            checkbox.type = 'checkbox';
+            checkbox.name = 'option';
+            checkbox.className = 'option-checkbox';
+            option.appendChild(checkbox);
+            option.appendChild(document.createElement('label'));
+            return option;
+        }
+
+        function initializeOptions(optionsContainer, mapping) {
+            try {
+                const options = getItems(optionsContainer);
+
+                // Build every option off-document and insert them at once
+                const template = createOptionTemplate();
+                const fragment = document.createDocumentFragment();
+                for (let newIndex = 0; newIndex < options.length; newIndex++) {
+                    const option = options[mapping.shuffledToOriginal[newIndex]];
+                    if (!option || !option.contentId) continue;
+
+                    const optionDiv = template.cloneNode(true);
+                    optionDiv.id = 'option' + newIndex;
+                    optionDiv.setAttribute('data-index', newIndex);
+                    optionDiv.firstChild.id = 'checkbox' + newIndex;
+                    if (!moveContent(option.contentId, optionDiv.lastChild)) continue;
+                    optionDiv.addEventListener('click', selectOption.bind(null, newIndex));
+                    fragment.appendChild(optionDiv);
+                }
+                optionsContainer.textContent = '';
+                optionsContainer.appendChild(fragment);
+
+                document.body.setAttribute('data-option-mapping', JSON.stringify(mapping));
+            } catch (error) {
+                console.error('Error initializing options:', error);
+                console.error('Error details:', error.message);
+                if (error.stack) {
+                    console.error('Stack trace:', error.stack);
+                }
+            }
+        }
+
+        function selectOption(index) {
+            if (submitted) return;
+
+            const checkbox = document.getElementById('checkbox' + index);
+            const optionDiv = document.getElementById('option' + index);
+
+            if (selectedOptions.has(index)) {
+                selectedOptions.delete(index);
+                optionDiv.classList.remove('selected');
+                checkbox.checked = false;
+            } else {
+                selectedOptions.add(index);
+                optionDiv.classList.add('selected');
+                checkbox.checked = true;
+            }
+        }
+
+        function submitAnswer() {
+            if (submitted || selectedOptions.size === 0) return;
+            submitted = true;
+
+            const mapping = JSON.parse(document.body.getAttribute('data-option-mapping'));
+            const originalSelected = Array.from(selectedOptions).map(index => mapping.shuffledToOriginal[index]);
+            document.body.setAttribute('data-selected-options', JSON.stringify(originalSelected));
+
+            document.getElementById('submit-btn').disabled = true;
+            pycmd('ans');
+        }
+
+        function buildAnswerContainers(answersDiv) {
+            try {
+                const allItems = getItems(answersDiv);
+                // Shown without the front first, e.g. in the card preview
+                let mapping = getOptionMapping(allItems.length);
+                if (!mapping) {
+                    mapping = getShuffledMapping(allItems.length);
+                    document.body.setAttribute('data-option-mapping', JSON.stringify(mapping));
+                }
+                const stO = mapping.shuffledToOriginal;
+                const selected = getSelectedOptions();
+
+                const questionDiv = document.querySelector('.question');
+                const questionText = questionDiv ? (questionDiv.textContent || questionDiv.innerText || '') : '';
+
+                const fragment = document.createDocumentFragment();
+                for (let newIndex = 0; newIndex < allItems.length; newIndex++) {
+                    if (typeof stO[newIndex] === 'undefined') {
+                        console.error('Recall Anki: shuffledToOriginal mapping missing for index ' + newIndex);
+                        continue;
+                    }
+                    const originalIndex = stO[newIndex];
+                    const item = allItems[originalIndex];
+                    if (typeof item === 'undefined') {
+                        console.error('Recall Anki: allItems missing for originalIndex ' + originalIndex);
+                        continue;
+                    }
+                    const container = document.createElement('div');
+                    container.className = 'explanation-container ' +
+                        (item.isCorrect ? 'correct-answer' : 'incorrect-answer');
+                    container.setAttribute('data-option-index', originalIndex);
+
+                    const reference = document.createElement('div');
+                    reference.className = 'question-reference';
+                    reference.textContent = 'Q: ' + questionText;
+                    const header = document.createElement('div');
+                    header.className = 'option-header';
+                    const explanation = document.createElement('div');
+                    explanation.className = 'explanation';
+
+                    if (item.contentId) {
+                        moveContent(item.contentId, header);
+                    } else {
+                        console.error('Recall Anki: item missing contentId for originalIndex ' + originalIndex);
+                    }
+                    if (!item.explanationId) {
+                        console.error('Recall Anki: item missing explanationId for originalIndex ' + originalIndex);
+                    } else if (item.isCorrect || selected.includes(originalIndex)) {
+                        moveContent(item.explanationId, explanation);
+                    } else {
+                        addExplanationToggle(explanation, item.explanationId);
+                    }
+
+                    container.appendChild(reference);
+                    container.appendChild(header);
+                    container.appendChild(explanation);
+                    fragment.appendChild(container);
+                }
+                answersDiv.textContent = '';
+                answersDiv.appendChild(fragment);
+            } catch (err) {
+                console.error('Recall Anki: Error building answer containers:', err);
+                console.error('Error details:', err.message);
+                if (err.stack) {
+                    console.error(err.stack);
+                }
+            }
+        }
+
+        function highlightSelection() {
+            try {
+                const selected = getSelectedOptions();
+                if (!selected.length) return;
+
+                document.querySelectorAll('.explanation-container').forEach(container => {
+                    const optionIndexStr = container.getAttribute('data-option-index');
+                    if (optionIndexStr === null) return; // Skip if attribute is missing
+                    if (selected.includes(parseInt(optionIndexStr))) {
+                        container.classList.add('was-selected');
+                        const header = container.querySelector('.option-header');
+                        if (header) header.classList.add('was-selected');
+                    }
+                });
+            } catch (error) {
+                console.error('Recall Anki: Error in highlightSelection:', error);
+                if (error.stack) {
+                    console.error(error.stack);
+                }
+            }
+        }
+
+        function loadScript(src) {
+            return new Promise(function(resolve, reject) {
+                const script = document.createElement('script');
+                script.src = src;
+                script.onload = resolve;
+                script.onerror = reject;
+                document.head.appendChild(script);
+            });
+        }
+
+        // Languages recorded at conversion time, or found in the code blocks
+        // of notes converted before they were recorded
+        function getCodeLanguages(root) {
+            const recorded = document.getElementById('recall_code_languages');
+            const languages = (recorded ? recorded.textContent : '').split(/\s+/).filter(Boolean);
+            if (!languages.length) {
+                root.querySelectorAll('pre code[class*="language-"]:not(.highlighted)').forEach(function(code) {
+                    const match = code.className.match(/language-(\S+)/);
+                    if (match) languages.push(match[1]);
+                });
+            }
+            return languages;
+        }
+
+        // Load Prism and only the grammars the note uses; resolves to false
+        // if there is nothing to highlight
+        function loadPrism(languages) {
+            const order = [];
+            function add(language) {
+                (assets.prismAliases[language] || [language]).forEach(function(name) {
+                    if (!assets.prismDependencies.hasOwnProperty(name) || order.indexOf(name) >= 0) return;
+                    assets.prismDependencies[name].forEach(add);
+                    order.push(name);
+                });
+            }
+            languages.forEach(add);
+            if (!order.length) return Promise.resolve(false);
+
+            let ready;
+            if (window.Prism && window.Prism.languages) {
+                ready = Promise.resolve();
+            } else {
+                window.Prism = { manual: true };
+                const style = document.createElement('link');
+                style.rel = 'stylesheet';
+                style.href = assets.prismStyle;
+                document.head.appendChild(style);
+                ready = loadScript(assets.prismScript);
+            }
+            return order.reduce(function(chain, name) {
+                return chain.then(function() {
+                    if (Prism.languages[name]) return;
+                    if (assets.prismCdnLanguages.indexOf(name) >= 0) {
+                        // Offline, these blocks stay plain and the rest still highlight
+                        return loadScript(assets.prismCdnPrefix + name + '.min.js').catch(function() {});
+                    }
+                    return loadScript(assets.prismPrefix + '-' + name + '.js');
+                });
+            }, ready).then(function() {
+                return true;
+            });
+        }
+
+        // Rendered previews are placeholders until they are scrolled into
+        // view or clicked, and at most MAX_LIVE_PREVIEWS iframes are live
+        const MAX_LIVE_PREVIEWS = 3;
+        let livePreviews = [];
+        const visiblePreviews = new Set();
+        const previewObserver = 'IntersectionObserver' in window ?
+            new IntersectionObserver(function(entries) {
+                entries.forEach(function(entry) {
+                    if (entry.isIntersecting) {
+                        visiblePreviews.add(entry.target);
+                        startPreview(entry.target);
+                    } else {
+                        visiblePreviews.delete(entry.target);
+                    }
+                });
+            }, { rootMargin: '200px' }) : null;
+
+        function stopPreview(preview) {
+            const frame = preview.querySelector('iframe');
+            if (frame) preview.removeChild(frame);
+            preview.removeAttribute('data-live');
+        }
+
+        function startPreview(preview) {
+            if (preview.hasAttribute('data-live')) return;
+            if (livePreviews.length >= MAX_LIVE_PREVIEWS) {
+                // Stop the oldest preview out of view, or else the oldest one
+                const index = livePreviews.findIndex(live => !visiblePreviews.has(live));
+                stopPreview(livePreviews.splice(index >= 0 ? index : 0, 1)[0]);
+            }
+            const frame = document.createElement('iframe');
+            frame.setAttribute('sandbox', 'allow-scripts allow-forms allow-modals');
+            // Documents are media files; older fields hold them inline
+            const src = preview.getAttribute('data-src');
+            if (src) {
+                frame.src = src;
+            } else {
+                frame.srcdoc = preview.getAttribute('data-srcdoc');
+            }
+            preview.setAttribute('data-live', '');
+            preview.appendChild(frame);
+            livePreviews.push(preview);
+        }
+
+        // Previews with a snapshot image only go live when clicked
+        function activatePreviews(root) {
+            root.querySelectorAll('.recall-preview:not([data-ready])').forEach(function(preview) {
+                preview.setAttribute('data-ready', '');
+                const button = preview.querySelector('.preview-run');
+                const snapshot = preview.querySelector('.preview-snapshot');
+                if (button) {
+                    if (snapshot) button.textContent = 'Run live';
+                    button.addEventListener('click', function() {
+                        startPreview(preview);
+                    });
+                }
+                if (previewObserver && !snapshot) previewObserver.observe(preview);
+            });
+        }
+
+        // Long code blocks show their first lines until expanded; the whole
+        // block waits in a template and is only laid out and highlighted then
+        function activateCodeBlocks(root) {
+            root.querySelectorAll('.collapsed-code:not([data-ready])').forEach(function(block) {
+                block.setAttribute('data-ready', '');
+                const button = block.querySelector('.code-expand');
+                const template = block.querySelector('template');
+                if (!button || !template) return;
+                button.addEventListener('click', function() {
+                    const excerpt = block.querySelector('pre');
+                    block.insertBefore(template.content, excerpt);
+                    block.removeChild(excerpt);
+                    block.removeChild(template);
+                    block.removeChild(button);
+                    block.classList.remove('collapsed-code');
+                    highlightCode(block);
+                });
+            });
+        }
+
+        // Set up the previews and long code blocks in an element
+        function activateContent(root) {
+            activatePreviews(root);
+            activateCodeBlocks(root);
+        }
+
+        // Forget the previews of the page Anki replaced
+        function resetPreviews() {
+            if (previewObserver) previewObserver.disconnect();
+            visiblePreviews.clear();
+            livePreviews = [];
+        }
+
+        // Highlight the code blocks in an element, or the whole page
+        function highlightCode(root) {
+            root = root || document;
+            loadPrism(getCodeLanguages(root)).then(function(loaded) {
+                if (!loaded) return;
+                // Blocks highlighted at conversion time are already tokenized
+                root.querySelectorAll('pre code:not(.highlighted)').forEach(function(block) {
+                    Prism.highlightElement(block);
+                });
+
+                // Enhanced syntax highlighting for JavaScript
+                root.querySelectorAll('.language-javascript:not(.highlighted), .language-js:not(.highlighted)').forEach(function(codeBlock) {
+                    // Fix common patterns that Prism might miss
+                    let html = codeBlock.innerHTML;
+
+                    // Highlight standalone 'document', 'window', 'console' objects
+                    html = html.replace(/\b(document|window|console|process|global|module|exports|require)\b(?!<\/span>)(?![^<]*>)/g,
+                        '<span class="token dom variable">$1</span>');
+
+                    // Highlight const/let/var variable declarations
+                    html = html.replace(/(<span class="token keyword">(?:const|let|var)<\/span>\s+)([a-zA-Z_$][a-zA-Z0-9_$]*)(?![^<]*>)/g,
+                        '$1<span class="token variable">$2</span>');
+
+                    // Highlight properties after dots (but not methods)
+                    html = html.replace(/(\.)([a-zA-Z_$][a-zA-Z0-9_$]*)(?=\s*[^(])/g,
+                        '$1<span class="token property">$2</span>');
+
+                    codeBlock.innerHTML = html;
+                });
+            }).catch(function(error) {
+                console.error('Recall Anki: Error loading Prism:', error);
+            });
+        }
+
+        // Set up the side on the page. The back side includes the front one,
+        // whose option divs hold the only copy of each option; they are moved
+        // into the answers, in the order the question was shown in
+        function run() {
+            // Per-deck styling of the card element matches on its deck, see get_lite_deck_overrides
+            const recallCard = document.querySelector('.recall-card');
+            const card = recallCard && recallCard.closest('.card');
+            if (card) card.setAttribute('data-deck', recallCard.getAttribute('data-deck'));
+            const answersDiv = document.getElementById('answers');
+            const optionsContainer = document.getElementById('options');
+            if (answersDiv) {
+                if (answersDiv.hasAttribute('data-ready')) return;
+                answersDiv.setAttribute('data-ready', '');
+                if (optionsContainer) optionsContainer.style.display = 'none';
+                const submitButton = document.getElementById('submit-btn');
+                if (submitButton) submitButton.style.display = 'none';
+                buildAnswerContainers(answersDiv);
+                highlightSelection();
+                resetPreviews();
+                activateContent(document);
+                highlightCode();
+            } else if (optionsContainer && !optionsContainer.hasAttribute('data-ready')) {
+                optionsContainer.setAttribute('data-ready', '');
+                selectedOptions = new Set();
+                submitted = false;
+                initializeOptions(optionsContainer, getShuffledMapping(getItems(optionsContainer).length));
+                resetPreviews();
+                activateContent(document);
+            }
+        }
+
+        return { run: run, selectOption: selectOption, submitAnswer: submitAnswer };
+    }
+})();
@@ -0,0 +1,339 @@
+"""
+Migrations of existing Recall notes and note types for Recall Anki plugin.
+
+Each migration runs once per collection; the names of the migrations that
+have run are kept in the collection config. Migrations run unasked when a
+profile opens, so they never change a note type's fields, which would
+force a full sync; see upgrade_note_type_fields.
+"""
+
+import re
+
+from ..markdown.converter import get_question_summary, get_question_checksum
+from ..markdown.tags import get_content_tags, replace_content_tags, tags_differ
+from .assets import install_media_assets, PRISM_VERSION, FONT_VERSION, RUNTIME_VERSION
+from .note_types import (
+    get_recall_models, get_option_counts, get_note_type_templates,
+    add_missing_fields, get_missing_fields, has_template_fields, is_sorted_by_summary, create_recall_note_type,
+    get_slot_counts, get_slot_fields, is_current_note_type, get_collection_theme, MAX_CORRECT_OPTIONS,
+    MAX_INCORRECT_OPTIONS, GENERIC_MODEL_NAME, SUMMARY_FIELD, CHECKSUM_FIELD
+)
+
+MIGRATIONS_KEY = "recallMigrations"
+# Whether the user was offered upgrade_note_type_fields when a profile opened
+FIELD_UPGRADE_OFFERED_KEY = "recallFieldUpgradeOffered"
+# Name of the undo step that upgrades the note types
+UPGRADE_UNDO_NAME = "Upgrade Recall Note Types"
+
+# The <style> block format_code_block used to embed in every code block.
+# The old converter ran its emphasis and line break passes over it, so its
+# comments were mangled into <em> tags; it is found by its font import and
+# .code-block rules instead, with the line breaks that followed it
+EMBEDDED_CODE_STYLE_MARKER = "@import url('https://fonts.googleapis.com/css2?family=JetBrains+Mono"
+EMBEDDED_CODE_STYLE_PATTERN = re.compile(
+    r'\s*<style>(?:(?!</style>).)*?' + re.escape(EMBEDDED_CODE_STYLE_MARKER)
+    + r'(?:(?!</style>).)*?\.code-block\b.*?</style>(?:\s*<br\s*/?>)*',
+    re.DOTALL
+)
+
+def strip_embedded_code_styles(field_html):
+    """Remove the <style> blocks embedded by older versions from a field."""
+    return EMBEDDED_CODE_STYLE_PATTERN.sub('', field_html)
+
+def migrate_embedded_code_styles(col, chunk_size=500):
+    """
+    Strip the <style> block older versions embedded in every code block.
+    
+    The rules are part of the note type CSS now, so the note types are
+    upgraded first. Note types without the fields the current templates
+    use keep their styling, so their notes keep the block until
+    upgrade_note_type_fields upgrades them.
+    
+    Args:
+        col (Collection): The collection
+        chunk_size (int): Notes updated per collection operation
+        
+    Returns:
+        int: Number of notes changed
+    """
+    upgrade_note_types(col)
+    model_ids = [model['id'] for model in get_recall_models(col) if has_template_fields(model)]
+    if not model_ids:
+        return 0
+    
+    note_ids = col.db.list(
+        f"select id from notes where mid in ({','.join(map(str, model_ids))}) and flds like ?",
+        f"%{EMBEDDED_CODE_STYLE_MARKER}%"
+    )
+    for start in range(0, len(note_ids), chunk_size):
+        notes = [col.get_note(note_id) for note_id in note_ids[start:start + chunk_size]]
+        for note in notes:
+            for field_name in note.keys():
+                note[field_name] = strip_embedded_code_styles(note[field_name])
+        col.update_notes(notes)
+    return len(note_ids)
+
+def migrate_question_summaries(col, chunk_size=500):
+    """
+    Fill the summary field of existing notes.
+    
+    Note types without the field are skipped. Sorting by it is a schema
+    change, made by upgrade_note_type_fields.
+    
+    Args:
+        col (Collection): The collection
+        chunk_size (int): Notes updated per collection operation
+        
+    Returns:
+        int: Number of notes changed
+    """
+    changed = 0
+    for model in get_recall_models(col):
+        if SUMMARY_FIELD not in [field['name'] for field in model['flds']]:
+            continue
+        
+        note_ids = col.models.nids(model['id'])
+        for start in range(0, len(note_ids), chunk_size):
+            notes = [col.get_note(note_id) for note_id in note_ids[start:start + chunk_size]]
+            notes = [note for note in notes if not note[SUMMARY_FIELD]]
+            for note in notes:
+                note[SUMMARY_FIELD] = get_question_summary(note['Question'])
+            if notes:
+                col.update_notes(notes)
+                changed += len(notes)
+    return changed
+
+def migrate_content_tags(col, chunk_size=500):
+    """
+    Tag existing notes with what their fields contain, see get_content_tags.
+    
+    Args:
+        col (Collection): The collection
+        chunk_size (int): Notes updated per collection operation
+        
+    Returns:
+        int: Number of notes changed
+    """
+    changed = 0
+    for model in get_recall_models(col):
+        note_ids = col.models.nids(model['id'])
+        for start in range(0, len(note_ids), chunk_size):
+            notes = []
+            for note_id in note_ids[start:start + chunk_size]:
+                note = col.get_note(note_id)
+                tags = replace_content_tags(note.tags, get_content_tags(dict(note.items())))
+                if tags_differ(tags, note.tags):
+                    note.tags = tags
+                    notes.append(note)
+            if notes:
+                col.update_notes(notes)
+                changed += len(notes)
+    return changed
+
+def migrate_question_checksums(col, chunk_size=500):
+    """
+    Fill the checksum field of existing notes from their question and options.
+    
+    The checksum is read from the converted fields every note has, so notes
+    from before markdown was stored are checked for duplicates too.
+    Checksums that differ from the current ones are replaced. Note types
+    without the field are skipped.
+    
+    Args:
+        col (Collection): The collection
+        chunk_size (int): Notes updated per collection operation
+        
+    Returns:
+        int: Number of notes changed
+    """
+    changed = 0
+    for model in get_recall_models(col):
+        if CHECKSUM_FIELD not in [field['name'] for field in model['flds']]:
+            continue
+        
+        note_ids = col.models.nids(model['id'])
+        for start in range(0, len(note_ids), chunk_size):
+            notes = []
+            for note_id in note_ids[start:start + chunk_size]:
+                note = col.get_note(note_id)
+                checksum = get_question_checksum(dict(note.items()))
+                if note[CHECKSUM_FIELD] != checksum:
+                    note[CHECKSUM_FIELD] = checksum
+                    notes.append(note)
+            if notes:
+                col.update_notes(notes)
+                changed += len(notes)
+    return changed
+
+def migrate_media_assets(col):
+    """
+    Install the runtime, Prism and font files and remove older versions.
+    
+    The templates and styling that load them are brought up to date by
+    upgrade_note_types.
+    
+    Args:
+        col (Collection): The collection
+        
+    Returns:
+        int: Number of files added
+    """
+    return len(install_media_assets(col))
+
+def migrate_to_generic_note_type(col):
+    """
+    Move the notes of the per-count Recall note types onto the generic one.
+    
+    Notes keep their fields, cards and review history; nothing is converted
+    again. Each note type is moved in one operation and removed once it
+    has no notes left; note types with fields of their own are kept as
+    they are. Changing note types needs a full sync, so this is
+    not one of the automatic migrations; in Anki the user is asked first.
+    
+    Args:
+        col (Collection): The collection
+        
+    Returns:
+        int: Number of notes moved
+    """
+    generic_counts = (MAX_CORRECT_OPTIONS, MAX_INCORRECT_OPTIONS)
+    generic = col.models.by_name(GENERIC_MODEL_NAME)
+    if not generic:
+        create_recall_note_type(*generic_counts, col=col)
+        generic = col.models.by_name(GENERIC_MODEL_NAME)
+    elif add_missing_fields(generic, *generic_counts, col=col):
+        generic = col.models.by_name(GENERIC_MODEL_NAME)
+    generic_positions = {field['name']: field['ord'] for field in generic['flds']}
+    
+    moved = 0
+    for model in get_recall_models(col):
+        names = [field['name'] for field in model['flds']]
+        counts = get_option_counts(names)
+        if model['id'] == generic['id'] or get_slot_counts(*counts) != generic_counts:
+            continue
+        # Map each old field onto the slot field it fills
+        slot_names = get_slot_fields(dict(zip(names, names)), *counts, generic_counts)
+        field_map = {
+            names.index(old_name): generic_positions[new_name]
+            for new_name, old_name in slot_names.items()
+            if old_name and new_name in generic_positions
+        }
+        if len(field_map) != len(names):
+            # Fields added by the user would be lost
+            continue
+        note_ids = col.models.nids(model['id'])
+        if note_ids:
+            col.models.change(model, note_ids, generic, field_map, {0: 0})
+            moved += len(note_ids)
+        col.models.remove(model['id'])
+    return moved
+
+# In the order they run; names must never change once released
+MIGRATIONS = [
+    ("strip_embedded_code_styles", migrate_embedded_code_styles),
+    # Named by the asset versions, so every changed file is installed
+    (f"media_assets_{PRISM_VERSION}_{FONT_VERSION}_{RUNTIME_VERSION}", migrate_media_assets),
+    ("question_summaries", migrate_question_summaries),
+    ("content_tags", migrate_content_tags),
+    ("question_checksums", migrate_question_checksums),
+]
+
+def upgrade_note_types(col):
+    """
+    Regenerate the templates and styling of outdated Recall note types.
+    
+    Note types are created once and never touched again by
+    create_recall_note_type, so template and styling changes, and a new
+    card theme choice, reach existing note types here. Only the version
+    stamps are compared; when every note type is current nothing is
+    written. Note types without the fields the templates use are left
+    until upgrade_note_type_fields adds them.
+    
+    Args:
+        col (Collection): The collection
+        
+    Returns:
+        int: Number of note types upgraded
+    """
+    theme = get_collection_theme(col)
+    outdated = [model for model in get_recall_models(col)
+                if has_template_fields(model) and not is_current_note_type(model, *theme)]
+    if not outdated:
+        return 0
+    
+    # The new templates may load a runtime or font the media doesn't have yet
+    install_media_assets(col)
+    # All note types are upgraded in one undo step; older Anki versions
+    # have no custom undo entries
+    undo_entry = col.add_custom_undo_entry(UPGRADE_UNDO_NAME) if hasattr(col, 'add_custom_undo_entry') else None
+    for model in outdated:
+        correct_count, incorrect_count = get_option_counts([field['name'] for field in model['flds']])
+        template = model['tmpls'][0]
+        template['qfmt'], template['afmt'], model['css'] = get_note_type_templates(
+            correct_count, incorrect_count, *theme
+        )
+        col.models.update_dict(model)
+    if undo_entry is not None:
+        col.merge_undo_entries(undo_entry)
+    return len(outdated)
+
+def needs_note_type_fields(col):
+    """Check whether any Recall note type lacks fields of the current version or sorts by another field."""
+    return any(get_missing_fields(model) or not is_sorted_by_summary(model) for model in get_recall_models(col))
+
+def upgrade_note_type_fields(col):
+    """
+    Add the fields introduced after Recall note types were created.
+    
+    Until then notes of those note types have no summary, checksum or
+    other hidden field, and the note types keep their templates and sort
+    field. Adding fields and changing the sort field need a full sync, so
+    Anki asks the user first and AbortSchemaModification is raised when
+    they decline. The new fields of existing notes are filled in
+    afterwards, and the code styles older versions embedded are stripped.
+    
+    Args:
+        col (Collection): The collection
+        
+    Returns:
+        int: Number of note types changed
+    """
+    changed = 0
+    for model in get_recall_models(col):
+        upgraded = add_missing_fields(model, *get_option_counts(field['name'] for field in model['flds']), col=col)
+        if upgraded:
+            model = col.models.get(model['id'])
+        if not is_sorted_by_summary(model):
+            col.mod_schema(check=True)
+            model['sortf'] = [field['name'] for field in model['flds']].index(SUMMARY_FIELD)
+            col.models.update_dict(model)
+            upgraded = True
+        if upgraded:
+            changed += 1
+    if changed:
+        migrate_question_summaries(col)
+        migrate_question_checksums(col)
+        upgrade_note_types(col)
+        migrate_embedded_code_styles(col)
+    return changed
+
+def run_migrations(col):
+    """
+    Run the migrations that have not run on a collection yet.
+    
+    Args:
+        col (Collection): The collection
+        
+    Returns:
+        dict: Number of notes or note types each migration changed, keyed
+            by migration name
+    """
+    done = set(col.get_config(MIGRATIONS_KEY, []))
+    results = {}
+    for name, migrate in MIGRATIONS:
+        if name in done:
+            continue
+        results[name] = migrate(col)
+        done.add(name)
+        col.set_config(MIGRATIONS_KEY, sorted(done))
+    return results
@@ -1,120 +1,451 @@
 """
 Note type creation for Recall Anki plugin.
+
+The templates and styling are plain strings, so this module can be used
+without Anki's GUI, e.g. from the command line importer.
 """
 
-from aqt import mw
-from aqt.qt import *
-from anki.models import ModelManager
+import hashlib
+import json
+import re
+from functools import lru_cache
+
+from .assets import (
+    install_media_assets, get_font_face_css, RUNTIME_SCRIPT_NAME, RUNTIME_VERSION, FONT_VERSION
+)
+
+# Hidden fields, never shown on the card, that let re-imports find and
+# update the note a question was created from
+SOURCE_FIELD = "RecallSource"
+HASH_FIELD = "RecallHash"
+# Hidden field with the compressed markdown, for editing the note again
+MARKDOWN_FIELD = "RecallMarkdown"
+# Hidden field with the code block languages, so only their grammars load
+LANGUAGES_FIELD = "RecallLanguages"
+# Hidden field with the question as short plain text, the sort field
+SUMMARY_FIELD = "RecallSummary"
+# Hidden field with the formatting-independent checksum of the question
+CHECKSUM_FIELD = "RecallChecksum"
+
+# The generic note type has a slot for up to this many options of each kind
+# and its templates skip the empty ones; questions with more options get a
+# note type of their own
+MAX_CORRECT_OPTIONS = 10
+MAX_INCORRECT_OPTIONS = 10
+GENERIC_MODEL_NAME = "RecallN"
 
-def create_recall_note_type(correct_options, incorrect_options):
+# Bump whenever the templates or styling change. The version also covers
+# the runtime and font files they load, so changing those upgrades the
+# note types too, see upgrade_note_types in migrations.py
+NOTE_TYPE_REVISION = 3
+TEMPLATE_VERSION = f"{NOTE_TYPE_REVISION}.{FONT_VERSION}.{RUNTIME_VERSION}"
+# Stamped into the generated templates and styling
+TEMPLATE_STAMP = f"Recall note type {TEMPLATE_VERSION}"
+
+# Comments the generators write for readability; the version stamp is kept
+HTML_COMMENT_PATTERN = re.compile(r'<!--(?! Recall note type ).*?-->', re.DOTALL)
+CSS_COMMENT_PATTERN = re.compile(r'/\*(?! Recall note type ).*?\*/', re.DOTALL)
+
+# The lite theme keeps the colors but drops shadows, transitions and
+# translucency, which cost paint and compositing time on weak devices
+THEME_FULL = "full"
+THEME_LITE = "lite"
+CARD_THEMES = (THEME_FULL, THEME_LITE)
+# Collection config with the theme chosen in the add-on config, so note
+# types created or upgraded without the GUI use it too
+THEME_CONFIG_KEY = "recallCardTheme"
+LITE_DISABLED_PROPERTIES = {'box-shadow', 'text-shadow', 'transition'}
+# Translucent colors become opaque by blending them over the card background
+LITE_BACKDROP = (0x28, 0x2c, 0x34)
+RGBA_PATTERN = re.compile(r'rgba\(\s*(\d+),\s*(\d+),\s*(\d+),\s*([\d.]+)\s*\)')
+CSS_RULE_PATTERN = re.compile(r'([^{}]+)\{([^{}]*)\}')
+
+def get_model_name(correct_options, incorrect_options):
     """
-    Create a recall note type with code examples.
+    Get the note type name for a number of correct and incorrect options.
     
     Args:
         correct_options (int): Number of correct options
         incorrect_options (int): Number of incorrect options
         
     Returns:
-        dict: The created note type model
+        str: The note type name
     """
+    if (correct_options, incorrect_options) == (MAX_CORRECT_OPTIONS, MAX_INCORRECT_OPTIONS):
+        return GENERIC_MODEL_NAME
     # Rename from ExamCard to Recall with special case for 1-1 configuration
     if correct_options == 1 and incorrect_options == 1:
-        model_name = "Recall"
-    else:
-        model_name = f"Recall{correct_options}{incorrect_options}"
+        return "Recall"
+    # The separator keeps counts of 10 or more apart, e.g. 11 and 2 from 1 and 12
+    return f"Recall{correct_options}_{incorrect_options}"
+
+def get_slot_counts(correct_options, incorrect_options):
+    """
+    Get the option slots of the note type a question is added to.
     
-    if model_name not in mw.col.models.all_names():
-        mm = mw.col.models
-        m = mm.new(model_name)
+    Args:
+        correct_options (int): Number of correct options of the question
+        incorrect_options (int): Number of incorrect options of the question
         
-        # Add fields
-        fields = ["Question"]
+    Returns:
+        tuple: Number of correct and incorrect option fields of the note
+            type, to pass to get_model_name and create_recall_note_type
+    """
+    if correct_options <= MAX_CORRECT_OPTIONS and incorrect_options <= MAX_INCORRECT_OPTIONS:
+        return MAX_CORRECT_OPTIONS, MAX_INCORRECT_OPTIONS
+    return correct_options, incorrect_options
+
+def get_slot_fields(fields, correct_options, incorrect_options, slot_counts):
+    """
+    Map converted fields onto the fields of the note type they are added to.
+    
+    A question fills the first option slots of the note type; the fields
+    of the other slots are emptied, so the card skips them.
+    
+    Args:
+        fields (dict): Field name to HTML, as made by
+            convert_sections_to_fields
+        correct_options (int): Number of correct options of the question
+        incorrect_options (int): Number of incorrect options of the question
+        slot_counts (tuple): Number of correct and incorrect option fields
+            of the note type
         
-        # Add correct options fields
-        for i in range(correct_options):
-            suffix = str(i + 1) if correct_options > 1 else ""
-            fields.extend([
-                f"CorrectOption{suffix}",
-                f"CorrectExplanation{suffix}"
-            ])
+    Returns:
+        dict: Field name to HTML, using the note type's field names
+    """
+    slot_correct, slot_incorrect = slot_counts
+    slot_fields = dict(fields)
+    # A single correct option has unnumbered fields
+    if correct_options == 1 and slot_correct > 1:
+        for name in ("CorrectOption", "CorrectExplanation"):
+            if name in slot_fields:
+                slot_fields[f"{name}1"] = slot_fields.pop(name)
+    for i in range(correct_options, slot_correct):
+        slot_fields[f"CorrectOption{i + 1}"] = ''
+        slot_fields[f"CorrectExplanation{i + 1}"] = ''
+    for i in range(incorrect_options, slot_incorrect):
+        slot_fields[f"IncorrectOption{i + 1}"] = ''
+        slot_fields[f"IncorrectExplanation{i + 1}"] = ''
+    return slot_fields
+
+def get_field_names(correct_options, incorrect_options):
+    """
+    Get the field names of a note type, in order.
+    
+    Args:
+        correct_options (int): Number of correct options
+        incorrect_options (int): Number of incorrect options
         
-        # Add incorrect options fields
-        for i in range(incorrect_options):
-            fields.extend([
-                f"IncorrectOption{i + 1}",
-                f"IncorrectExplanation{i + 1}"
-            ])
+    Returns:
+        list: The field names
+    """
+    fields = ["Question"]
+    
+    # Add correct options fields
+    for i in range(correct_options):
+        suffix = str(i + 1) if correct_options > 1 else ""
+        fields.extend([
+            f"CorrectOption{suffix}",
+            f"CorrectExplanation{suffix}"
+        ])
+    
+    # Add incorrect options fields
+    for i in range(incorrect_options):
+        fields.extend([
+            f"IncorrectOption{i + 1}",
+            f"IncorrectExplanation{i + 1}"
+        ])
+    
+    fields.extend([SOURCE_FIELD, HASH_FIELD, MARKDOWN_FIELD, LANGUAGES_FIELD, SUMMARY_FIELD, CHECKSUM_FIELD])
+    return fields
+
+def get_option_counts(field_names):
+    """
+    Get the number of correct and incorrect options from a note type's fields.
+    
+    Args:
+        field_names (list): The field names of a Recall note type
+        
+    Returns:
+        tuple: Number of correct options and number of incorrect options
+    """
+    correct_count = sum(1 for name in field_names if name.startswith("CorrectOption"))
+    incorrect_count = sum(1 for name in field_names if name.startswith("IncorrectOption"))
+    return correct_count, incorrect_count
+
+def get_missing_fields(model):
+    """
+    Get the fields introduced after a Recall note type was created.
+    
+    Args:
+        model (dict): The note type model
+        
+    Returns:
+        list: Names of the fields the note type lacks, in field order
+    """
+    existing = [field['name'] for field in model['flds']]
+    return [name for name in get_field_names(*get_option_counts(existing)) if name not in existing]
+
+def has_template_fields(model):
+    """
+    Check whether a note type has every field the current templates use.
+    
+    Anki rejects templates that reference a missing field, so note types
+    created before a hidden field was introduced keep their templates until
+    the field is added, see add_missing_fields.
+    
+    Args:
+        model (dict): The note type model
+        
+    Returns:
+        bool: Whether the current templates can be applied
+    """
+    return LANGUAGES_FIELD in {field['name'] for field in model['flds']}
+
+def is_sorted_by_summary(model):
+    """Check whether a note type sorts its notes by their question summary."""
+    names = [field['name'] for field in model['flds']]
+    return SUMMARY_FIELD in names and model['sortf'] == names.index(SUMMARY_FIELD)
+
+def add_missing_fields(model, correct_options, incorrect_options, col=None):
+    """
+    Add fields introduced after a note type was created.
+    
+    Adding fields is a schema change, which needs a full sync, so Anki asks
+    the user first and AbortSchemaModification is raised when they decline.
+    This must never run unasked, e.g. when a profile opens.
+    
+    Args:
+        model (dict): The note type model
+        correct_options (int): Number of correct options
+        incorrect_options (int): Number of incorrect options
+        col (Collection, optional): Collection the note type belongs to,
+            defaults to the collection open in Anki
+        
+    Returns:
+        bool: Whether the note type was changed
+    """
+    if col is None:
+        from aqt import mw
+        col = mw.col
+    existing = {field['name'] for field in model['flds']}
+    missing = [name for name in get_field_names(correct_options, incorrect_options) if name not in existing]
+    if not missing:
+        return False
+    
+    col.mod_schema(check=True)
+    mm = col.models
+    for name in missing:
+        mm.add_field(model, mm.new_field(name))
+    mm.update_dict(model)
+    return True
+
+def is_recall_model(model):
+    """
+    Check whether a note type was created by Recall.
+    
+    The name says nothing, since users name their own note types
+    "Recall..." too. Recall note types have the fields of get_field_names
+    for their option counts, in order; older ones lack some of the hidden
+    fields added since. Note types created by this version also carry the
+    version stamp, which keeps them recognized after the user adds a field.
+    
+    Args:
+        model (dict): The note type model
+        
+    Returns:
+        bool: Whether the note type is a Recall note type
+    """
+    if any('<!-- Recall note type ' in template['qfmt'] for template in model['tmpls']):
+        return True
+    names = [field['name'] for field in model['flds']]
+    correct_count, incorrect_count = get_option_counts(names)
+    if not correct_count:
+        return False
+    layout = get_field_names(correct_count, incorrect_count)
+    visible_count = layout.index(SOURCE_FIELD)
+    hidden = names[visible_count:]
+    return (names[:visible_count] == layout[:visible_count]
+            and set(hidden) <= set(layout[visible_count:]) and len(set(hidden)) == len(hidden))
+
+def get_recall_models(col):
+    """
+    Get all Recall note types of a collection, see is_recall_model.
+    
+    Args:
+        col (Collection): The collection
+        
+    Returns:
+        list: The note type models
+    """
+    models = []
+    for entry in col.models.all_names_and_ids():
+        model = col.models.get(entry.id)
+        if model and is_recall_model(model):
+            models.append(model)
+    return models
+
+def get_collection_theme(col):
+    """
+    Get the card theme chosen for a collection.
+    
+    Args:
+        col (Collection): The collection
+        
+    Returns:
+        tuple: The theme of every deck, THEME_FULL or THEME_LITE, and a
+            tuple of the decks that use the lite theme anyway
+    """
+    theme = col.get_config(THEME_CONFIG_KEY, None)
+    if not isinstance(theme, dict) or theme.get('theme') not in CARD_THEMES:
+        return THEME_FULL, ()
+    return theme['theme'], tuple(sorted(theme.get('liteDecks', [])))
+
+def set_collection_theme(col, theme, lite_decks=()):
+    """
+    Choose the card theme of a collection.
+    
+    Note types pick it up in upgrade_note_types, see migrations.py.
+    
+    Args:
+        col (Collection): The collection
+        theme (str): THEME_FULL or THEME_LITE; anything else is THEME_FULL
+        lite_decks (iterable): Names of decks, with their subdecks, that
+            use the lite theme when the theme is THEME_FULL
+    """
+    if theme not in CARD_THEMES:
+        theme = THEME_FULL
+    value = {'theme': theme, 'liteDecks': sorted(lite_decks)}
+    if col.get_config(THEME_CONFIG_KEY, None) != value:
+        col.set_config(THEME_CONFIG_KEY, value)
+
+def get_theme_key(theme, lite_decks=()):
+    """Get the name of a theme choice, for the version stamp of the styling."""
+    if theme == THEME_LITE or not lite_decks:
+        return theme
+    decks_hash = hashlib.sha1('\x1f'.join(sorted(lite_decks)).encode('utf-8')).hexdigest()[:8]
+    return f"{theme}+lite-decks-{decks_hash}"
+
+def is_current_note_type(model, theme=THEME_FULL, lite_decks=()):
+    """
+    Check whether a note type's templates and styling are of the current version.
+    
+    Only the version stamps are compared, so this is cheap enough to run on
+    every note type whenever a profile opens.
+    
+    Args:
+        model (dict): The note type model
+        theme (str): The card theme the styling should have
+        lite_decks (iterable): Decks the styling should give the lite theme
+        
+    Returns:
+        bool: False if anything needs regenerating
+    """
+    if f"/* {TEMPLATE_STAMP} {get_theme_key(theme, lite_decks)} */" not in model['css']:
+        return False
+    template_stamp = f"<!-- {TEMPLATE_STAMP} -->"
+    return all(
+        template_stamp in template['qfmt'] and template_stamp in template['afmt']
+        for template in model['tmpls']
+    )
+
+def create_recall_note_type(correct_options, incorrect_options, col=None):
+    """
+    Create a recall note type with code examples.
+    
+    Args:
+        correct_options (int): Number of correct options
+        incorrect_options (int): Number of incorrect options
+        col (Collection, optional): Collection to add the note type to,
+            defaults to the collection open in Anki
+        
+    Returns:
+        dict: The created note type model, or None if a note type of that
+            name exists already
+    """
+    if col is None:
+        from aqt import mw
+        col = mw.col
+    model_name = get_model_name(correct_options, incorrect_options)
+    
+    if col.models.id_for_name(model_name) is None:
+        mm = col.models
+        m = mm.new(model_name)
         
-        for field in fields:
+        # Add fields
+        field_names = get_field_names(correct_options, incorrect_options)
+        for field in field_names:
             mm.add_field(m, mm.new_field(field))
+        # Sort and search the browser by the plain text question
+        m['sortf'] = field_names.index(SUMMARY_FIELD)
 
         # Create template
         template = mm.new_template(model_name)
+        front, back, styling = get_note_type_templates(correct_options, incorrect_options,
+                                                       *get_collection_theme(col))
         
         # Front template
-        template['qfmt'] = create_front_template(correct_options, incorrect_options)
+        template['qfmt'] = front
 
         # Back template
-        template['afmt'] = create_back_template(correct_options, incorrect_options)
+        template['afmt'] = back
 
         # Add CSS
-        m['css'] = get_card_styling()
+        m['css'] = styling
 
         # Add template to model
         mm.add_template(m, template)
         
         # Add the model to the collection
         mm.add(m)
+        
+        # The templates load their scripts from the collection media
+        install_media_assets(col)
         return m
 
 def create_front_template(correct_options, incorrect_options):
     """
     Create the front template for the card.
     
+    The options are built by the shared card runtime, see assets.py; the
+    template only holds their content and ids. Options with an empty field
+    are left out of the card.
+    
     Args:
         correct_options (int): Number of correct options
         incorrect_options (int): Number of incorrect options
         
     Returns:
-        str: The front template HTML/JS
+        str: The front template HTML
     """
     # Generate hidden divs for option content
     hidden_content_divs = []
+    options = []
     
     # Add correct options
     for i in range(correct_options):
         suffix = str(i + 1) if correct_options > 1 else ""
         div_id = f"recall_option_content_correct_{i}"
         hidden_content_divs.append(
-            f'<div id="{div_id}" style="display:none;">{{{{CorrectOption{suffix}}}}}</div>'
+            f'{{{{#CorrectOption{suffix}}}}}<div id="{div_id}" style="display:none;">'
+            f'{{{{CorrectOption{suffix}}}}}</div>{{{{/CorrectOption{suffix}}}}}'
         )
+        options.append({'contentId': div_id, 'isCorrect': True})
     
     # Add incorrect options
     for i in range(incorrect_options):
         div_id = f"recall_option_content_incorrect_{i}"
         hidden_content_divs.append(
-            f'<div id="{div_id}" style="display:none;">{{{{IncorrectOption{i + 1}}}}}</div>'
+            f'{{{{#IncorrectOption{i + 1}}}}}<div id="{div_id}" style="display:none;">'
+            f'{{{{IncorrectOption{i + 1}}}}}</div>{{{{/IncorrectOption{i + 1}}}}}'
         )
+        options.append({'contentId': div_id, 'isCorrect': False})
     
     hidden_content_html = "\n".join(hidden_content_divs)
     
-    # Generate the options array structure
-    options_array_items = []
-    
-    for i in range(correct_options):
-        options_array_items.append(
-            f'{{ contentId: "recall_option_content_correct_{i}", isCorrect: true }}'
-        )
-    
-    for i in range(incorrect_options):
-        options_array_items.append(
-            f'{{ contentId: "recall_option_content_incorrect_{i}", isCorrect: false }}'
-        )
-    
-    options_array = ",\n                    ".join(options_array_items)
-    shuffled_indices = ", ".join(map(str, range(correct_options + incorrect_options)))
-    
     return f"""
+    <!-- {TEMPLATE_STAMP} -->
+    <div class="recall-card" data-deck="{{{{Deck}}}}">
     <div class="question">{{{{Question}}}}</div>
     
     <!-- Hidden divs containing option content -->
@@ -122,365 +453,102 @@ def create_front_template(correct_options, incorrect_options):
         {hidden_content_html}
     </div>
     
-    <div id="options" class="options"></div>
-    <button onclick="submitAnswer()" id="submit-btn" class="submit-button">Submit</button>
-
-    <script>
-        var selectedOptions = new Set();
-        var submitted = false;
-        var originalToShuffled = {{}};
-        var shuffledToOriginal = {{}};
-
-        function shuffleArray(array) {{
-            for (let i = array.length - 1; i > 0; i--) {{
-                const j = Math.floor(Math.random() * (i + 1));
-                [array[i], array[j]] = [array[j], array[i]];
-            }}
-            return array;
-        }}
-
-        function createOption(index, content) {{
-            return `
-                <div class="option" onclick="selectOption(${{index}})" id="option${{index}}" data-index="${{index}}">
-                    <input type="checkbox" name="option" id="checkbox${{index}}" class="option-checkbox">
-                    <label>${{content}}</label>
-                </div>
-            `;
-        }}
-        
-        function getOptionContent(contentId) {{
-            const contentDiv = document.getElementById(contentId);
-            if (contentDiv) {{
-                return contentDiv.innerHTML;
-            }}
-            console.error('Content div not found:', contentId);
-            return '';
-        }}
-
-        function initializeOptions() {{
-            try {{
-                // Define options with references to content divs
-                const options = [
-                    {options_array}
-                ];
-
-                const shuffledIndices = shuffleArray([{shuffled_indices}]);
-                
-                const optionsContainer = document.getElementById('options');
-                if (!optionsContainer) {{
-                    console.error('Options container not found');
-                    return;
-                }}
-
-                // Clear existing options
-                optionsContainer.innerHTML = '';
-                
-                shuffledIndices.forEach((originalIndex, newIndex) => {{
-                    originalToShuffled[originalIndex] = newIndex;
-                    shuffledToOriginal[newIndex] = originalIndex;
-                    const option = options[originalIndex];
-                    if (option && option.contentId) {{
-                        const content = getOptionContent(option.contentId);
-                        if (content) {{
-                            optionsContainer.innerHTML += createOption(newIndex, content);
-                        }}
-                    }}
-                }});
-
-                document.body.setAttribute('data-option-mapping', JSON.stringify({{
-                    originalToShuffled,
-                    shuffledToOriginal
-                }}));
-            }} catch (error) {{
-                console.error('Error initializing options:', error);
-                console.error('Error details:', error.message);
-                if (error.stack) {{
-                    console.error('Stack trace:', error.stack);
-                }}
-            }}
-        }}
-
-        function selectOption(index) {{
-            if (submitted) return;
-            
-            const checkbox = document.getElementById('checkbox' + index);
-            const optionDiv = document.getElementById('option' + index);
-            
-            if (selectedOptions.has(index)) {{
-                selectedOptions.delete(index);
-                optionDiv.classList.remove('selected');
-                checkbox.checked = false;
-            }} else {{
-                selectedOptions.add(index);
-                optionDiv.classList.add('selected');
-                checkbox.checked = true;
-            }}
-        }}
-
-        function submitAnswer() {{
-            if (submitted || selectedOptions.size === 0) return;
-            submitted = true;
-            
-            const originalSelected = Array.from(selectedOptions).map(index => shuffledToOriginal[index]);
-            document.body.setAttribute('data-selected-options', JSON.stringify(originalSelected));
-            
-            document.getElementById('submit-btn').disabled = true;
-            pycmd('ans');
-        }}
-
-        // Initialize options when the document is ready
-        if (document.readyState === 'loading') {{
-            document.addEventListener('DOMContentLoaded', initializeOptions);
-        }} else {{
-            setTimeout(initializeOptions, 0);
-        }}
-    </script>
+    <div id="options" class="options" data-items='{json.dumps(options)}'></div>
+    <button onclick="Recall.submitAnswer()" id="submit-btn" class="submit-button">Submit</button>
+    </div>
+    <script src="{RUNTIME_SCRIPT_NAME}"></script>
     """
 
 def create_back_template(correct_options, incorrect_options):
     """
     Create the back template for the card.
     
+    The answers are built by the shared card runtime, see assets.py; the
+    template only holds the explanations and the ids of each answer's
+    parts. Options are taken from the front side, so every field is
+    rendered into the page once. Explanations are inert <template>
+    elements until the runtime shows them.
+    
     Args:
         correct_options (int): Number of correct options
         incorrect_options (int): Number of incorrect options
         
     Returns:
-        str: The back template HTML/JS
+        str: The back template HTML
     """
-    # Generate all hidden divs for both content and explanations
+    # Generate templates for the explanations; their iframes, images and
+    # code are only loaded and laid out once shown
     hidden_data_divs_list = []
-    all_items_array = []
+    all_items = []
     
     # Add correct options
     for i in range(correct_options):
         suffix = str(i + 1) if correct_options > 1 else ""
-        content_id = f"recall_back_content_correct_{i}"
         explanation_id = f"recall_explanation_correct_{suffix}"
         
-        # Hidden divs for content and explanation
-        hidden_data_divs_list.append(
-            f'<div id="{content_id}" style="display:none;">{{{{CorrectOption{suffix}}}}}</div>'
-        )
         hidden_data_divs_list.append(
-            f'<div id="{explanation_id}" style="display:none;">{{{{CorrectExplanation{suffix}}}}}</div>'
+            f'{{{{#CorrectOption{suffix}}}}}<template id="{explanation_id}">'
+            f'{{{{CorrectExplanation{suffix}}}}}</template>{{{{/CorrectOption{suffix}}}}}'
         )
         
-        all_items_array.append(
-            f'{{ contentId: "{content_id}", explanationId: "{explanation_id}", isCorrect: true }}'
-        )
+        all_items.append({
+            'contentId': f"recall_option_content_correct_{i}",
+            'explanationId': explanation_id,
+            'isCorrect': True,
+        })
     
     # Add incorrect options
     for i in range(incorrect_options):
         incorrect_suffix = str(i + 1)
-        content_id = f"recall_back_content_incorrect_{i}"
         explanation_id = f"recall_explanation_incorrect_{incorrect_suffix}"
         
         hidden_data_divs_list.append(
-            f'<div id="{content_id}" style="display:none;">{{{{IncorrectOption{incorrect_suffix}}}}}</div>'
-        )
-        hidden_data_divs_list.append(
-            f'<div id="{explanation_id}" style="display:none;">{{{{IncorrectExplanation{incorrect_suffix}}}}}</div>'
+            f'{{{{#IncorrectOption{incorrect_suffix}}}}}<template id="{explanation_id}">'
+            f'{{{{IncorrectExplanation{incorrect_suffix}}}}}</template>{{{{/IncorrectOption{incorrect_suffix}}}}}'
         )
         
-        all_items_array.append(
-            f'{{ contentId: "{content_id}", explanationId: "{explanation_id}", isCorrect: false }}'
-        )
+        all_items.append({
+            'contentId': f"recall_option_content_incorrect_{i}",
+            'explanationId': explanation_id,
+            'isCorrect': False,
+        })
     
-    all_items_str = ",\n            ".join(all_items_array)
     hidden_data_divs_html = "\n        ".join(hidden_data_divs_list)
     
+    # The runtime is included again in case {{FrontSide}} scripts don't run;
+    # it sets each side up only once
     return f"""
+    <!-- {TEMPLATE_STAMP} -->
+    <div class="recall-card" data-deck="{{{{Deck}}}}">
     {{{{FrontSide}}}}
     <hr id="answer">
-    <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/prism/1.24.1/themes/prism-tomorrow.min.css">
-    <link href="https://fonts.googleapis.com/css2?family=JetBrains+Mono:wght@400;500;600&display=swap" rel="stylesheet">
-    <script src="https://cdnjs.cloudflare.com/ajax/libs/prism/1.24.1/prism.min.js" data-manual></script>
-    <script src="https://cdnjs.cloudflare.com/ajax/libs/prism/1.24.1/components/prism-markup.min.js"></script>
-    <script src="https://cdnjs.cloudflare.com/ajax/libs/prism/1.24.1/components/prism-css.min.js"></script>
-    <script src="https://cdnjs.cloudflare.com/ajax/libs/prism/1.24.1/components/prism-javascript.min.js"></script>
-    <script src="https://cdnjs.cloudflare.com/ajax/libs/prism/1.24.1/components/prism-csharp.min.js"></script>
-    <script src="https://cdnjs.cloudflare.com/ajax/libs/prism/1.24.1/components/prism-python.min.js"></script>
-    <script src="https://cdnjs.cloudflare.com/ajax/libs/prism/1.24.1/components/prism-java.min.js"></script>
-    <script src="https://cdnjs.cloudflare.com/ajax/libs/prism/1.24.1/components/prism-typescript.min.js"></script>
-    <script src="https://cdnjs.cloudflare.com/ajax/libs/prism/1.24.1/components/prism-json.min.js"></script>
-    <script src="https://cdnjs.cloudflare.com/ajax/libs/prism/1.24.1/components/prism-sql.min.js"></script>
-    <script src="https://cdnjs.cloudflare.com/ajax/libs/prism/1.24.1/components/prism-yaml.min.js"></script>
-    <script src="https://cdnjs.cloudflare.com/ajax/libs/prism/1.24.1/components/prism-bash.min.js"></script>
     
     <div id="recall_hidden_explanation_data" style="display:none;">
         {hidden_data_divs_html}
     </div>
+    <div id="recall_code_languages" style="display:none;">{{{{{LANGUAGES_FIELD}}}}}</div>
 
     <!-- This container will hold all explanation entries in the randomized order -->
-    <div class="answer" id="answers"></div>
-
-    <script>
-        // Build an array of all items in the same order they were added on the front side
-        var allItems = [
-            {all_items_str}
-        ];
-
-        // HTML escape function to prevent HTML interpretation
-        function htmlEscape(text) {{
-            if (typeof text !== 'string') return '';
-            return text
-                .replace(/&/g, '&amp;')
-                .replace(/</g, '&lt;')
-                .replace(/>/g, '&gt;')
-                .replace(/"/g, '&quot;')
-                .replace(/'/g, '&#39;');
-        }}
-        
-        // Safe content extraction from hidden divs
-        function getContentFromDiv(divId) {{
-            const div = document.getElementById(divId);
-            if (div) {{
-                return div.innerHTML;
-            }}
-            console.error('Div not found:', divId);
-            return '';
-        }}
-
-        function buildAnswerContainers() {{
-            try {{
-                var mappingStr = document.body.getAttribute('data-option-mapping');
-                if (!mappingStr) {{
-                    console.error('Recall Anki: data-option-mapping not found on body.');
-                    return; 
-                }}
-                var mapping = JSON.parse(mappingStr);
-                var stO = mapping.shuffledToOriginal; 
-                var answersDiv = document.getElementById('answers');
-                if (!answersDiv) {{
-                    console.error('Recall Anki: answers div not found.');
-                    return;
-                }}
-                
-                var questionDiv = document.querySelector('.question');
-                var questionText = questionDiv ? (questionDiv.textContent || questionDiv.innerText || '') : '';
-                
-                answersDiv.innerHTML = '';
-
-                for (var newIndex = 0; newIndex < allItems.length; newIndex++) {{
-                    if (!stO || typeof stO[newIndex] === 'undefined') {{
-                        console.error('Recall Anki: shuffledToOriginal mapping missing for index ' + newIndex);
-                        continue;
-                    }}
-                    var originalIndex = stO[newIndex];
-                    if (!allItems || typeof allItems[originalIndex] === 'undefined') {{
-                        console.error('Recall Anki: allItems missing for originalIndex ' + originalIndex);
-                        continue;
-                    }}
-                    var item = allItems[originalIndex];
-                    var container = document.createElement('div');
-                    container.className = 'explanation-container ' + 
-                        (item.isCorrect ? 'correct-answer' : 'incorrect-answer');
-                    container.setAttribute('data-option-index', originalIndex);
-                    
-                    // Get content and explanation from hidden divs
-                    var itemContent = '';
-                    var explanationHtml = '';
-                    
-                    if (item.contentId) {{
-                        itemContent = getContentFromDiv(item.contentId);
-                    }} else {{
-                        console.error('Recall Anki: item missing contentId for originalIndex ' + originalIndex);
-                    }}
-                    
-                    if (item.explanationId) {{
-                        explanationHtml = getContentFromDiv(item.explanationId);
-                    }} else {{
-                        console.error('Recall Anki: item missing explanationId for originalIndex ' + originalIndex);
-                    }}
-
-                    container.innerHTML = `
-                        <div class="question-reference">Q: ${{htmlEscape(questionText)}}</div>
-                        <div class="option-header">${{itemContent}}</div>
-                        <div class="explanation">${{explanationHtml}}</div>
-                    `;
-                    answersDiv.appendChild(container);
-                }}
-            }} catch (err) {{
-                console.error('Recall Anki: Error building answer containers:', err);
-                console.error('Error details:', err.message);
-                if (err.stack) {{
-                    console.error(err.stack);
-                }}
-            }}
-        }}
-
-        function highlightSelection() {{
-            try {{
-                var selectedOptionsStr = document.body.getAttribute('data-selected-options');
-                if (!selectedOptionsStr) return;
-
-                var selectedOptions = JSON.parse(selectedOptionsStr);
-                var containers = document.querySelectorAll('.explanation-container');
-                
-                containers.forEach(container => {{
-                    const optionIndexStr = container.getAttribute('data-option-index');
-                    if (optionIndexStr === null) return; // Skip if attribute is missing
-                    const optionIndex = parseInt(optionIndexStr);
-                    if (selectedOptions.includes(optionIndex)) {{
-                        container.classList.add('was-selected');
-                        const header = container.querySelector('.option-header');
-                        if (header) header.classList.add('was-selected');
-                    }}
-                }});
-
-                document.querySelectorAll('pre code').forEach(function(block) {{
-                    Prism.highlightElement(block);
-                }});
-                
-                // Enhanced syntax highlighting for JavaScript
-                document.querySelectorAll('.language-javascript, .language-js').forEach(function(codeBlock) {{
-                    // Fix common patterns that Prism might miss
-                    var html = codeBlock.innerHTML;
-                    
-                    // Highlight standalone 'document', 'window', 'console' objects
-                    html = html.replace(/\b(document|window|console|process|global|module|exports|require)\b(?!<\/span>)(?![^<]*>)/g, 
-                        '<span class="token dom variable">$1</span>');
-                    
-                    // Highlight const/let/var variable declarations
-                    html = html.replace(/(<span class="token keyword">(?:const|let|var)<\/span>\s+)([a-zA-Z_$][a-zA-Z0-9_$]*)(?![^<]*>)/g, 
-                        '$1<span class="token variable">$2</span>');
-                    
-                    // Highlight properties after dots (but not methods)
-                    html = html.replace(/(\.)([a-zA-Z_$][a-zA-Z0-9_$]*)(?=\s*[^(])/g, 
-                        '$1<span class="token property">$2</span>');
-                    
-                    // Update the code block
-                    codeBlock.innerHTML = html;
-                }});
-            }} catch (error) {{
-                console.error('Recall Anki: Error in highlightSelection:', error);
-                if (error.stack) {{
-                    console.error(error.stack);
-                }}
-            }}
-        }}
-
-        if (document.readyState === 'loading') {{
-            document.addEventListener('DOMContentLoaded', () => {{
-                buildAnswerContainers();
-                highlightSelection();
-            }});
-        }} else {{
-            buildAnswerContainers();
-            highlightSelection();
-        }}
-    </script>
+    <div class="answer" id="answers" data-items='{json.dumps(all_items)}'></div>
+    </div>
+    <script src="{RUNTIME_SCRIPT_NAME}"></script>
     """
 
-def get_card_styling():
+def get_card_styling(theme=THEME_FULL, lite_decks=()):
     """
     Get the CSS styling for the card.
     
+    Args:
+        theme (str): THEME_FULL, or THEME_LITE for every deck
+        lite_decks (iterable): Names of decks, with their subdecks, that
+            use the lite theme when the theme is THEME_FULL
+    
     Returns:
         str: The CSS styling
     """
-    return """
+    # JetBrains Mono is installed into the collection media with Prism
+    styling = get_font_face_css() + """
+
     .card {
         font-family: 'Segoe UI', Arial, sans-serif;
         font-size: 16px;
@@ -563,6 +631,51 @@ def get_card_styling():
         border-radius: 8px;
     }
     
+    /* Previews start as placeholders of the same size as the iframe */
+    .recall-preview {
+        position: relative;
+        display: flex;
+        align-items: center;
+        justify-content: center;
+        height: 300px;
+        background-color: #f5f5f5;
+    }
+    
+    .preview-snapshot {
+        position: absolute;
+        top: 0;
+        left: 0;
+        width: 100%;
+        height: 100%;
+        object-fit: cover;
+        object-position: top left;
+    }
+    
+    .recall-preview[data-live] .preview-snapshot {
+        display: none;
+    }
+    
+    .preview-run {
+        padding: 8px 16px;
+        background-color: #282c34;
+        color: #abb2bf;
+        border: none;
+        border-radius: 6px;
+        cursor: pointer;
+        font-family: inherit;
+        font-size: 0.9em;
+    }
+    
+    .recall-preview[data-live] .preview-run {
+        display: none;
+    }
+    
+    .preview-snapshot + .preview-run {
+        position: absolute;
+        right: 10px;
+        bottom: 10px;
+    }
+    
     /* One Dark Pro Colors */
     .odp-background { background-color: #282C34; }
     .odp-black { color: #3F4451; }
@@ -691,12 +804,26 @@ def get_card_styling():
         margin: 0;
         padding: 15px;
         border-radius: 7px;
+        white-space: pre;
+        word-wrap: normal;
+        overflow-wrap: normal;
     }
     
     .code-block pre code {
+        font-family: 'JetBrains Mono', 'Consolas', 'Monaco', monospace;
+        font-size: 14px;
+        color: #ABB2BF;
         background-color: transparent;
         padding: 0;
         border: none;
+        display: block;
+        white-space: pre;
+        overflow-x: auto;
+    }
+    
+    /* Ensure Prism.js styles take precedence when loaded */
+    .code-block pre[class*="language-"] {
+        background-color: #282C34 !important;
     }
 
     /* One Dark Pro Syntax Highlighting - Exact VS Code Colors */
@@ -1374,4 +1501,206 @@ def get_card_styling():
         color: #61afef;
         box-shadow: 0 2px 8px rgba(97, 175, 239, 0.2);
     }
-    """ 
\ No newline at end of file
+
+    /* Long code blocks show their first lines until expanded */
+    .code-expand {
+        margin: 8px;
+    }
+    
+    /* Explanations of options that weren't chosen start collapsed */
+    .explanation.collapsed {
+        padding: 8px 20px;
+    }
+
+    .explanation-toggle,
+    .code-expand {
+        padding: 6px 14px;
+        background-color: rgba(33, 37, 43, 0.8);
+        color: #abb2bf;
+        border: 1px solid rgba(62, 68, 81, 0.7);
+        border-radius: 6px;
+        cursor: pointer;
+        font-family: inherit;
+        font-size: 0.9em;
+    }
+
+    .explanation-toggle:hover,
+    .code-expand:hover {
+        color: #61afef;
+        border-color: rgba(97, 175, 239, 0.7);
+    }
+    """
+    stamp = f"/* {TEMPLATE_STAMP} {get_theme_key(theme, lite_decks)} */\n"
+    if theme == THEME_LITE:
+        return stamp + make_lite_styling(styling)
+    if lite_decks:
+        styling += get_lite_deck_overrides(styling, lite_decks)
+    return stamp + styling
+
+def make_opaque(value):
+    """Replace the translucent colors and gradients of a CSS value with opaque colors."""
+    def blend(match):
+        *color, alpha = match.groups()
+        alpha = float(alpha)
+        return '#' + ''.join(
+            f"{round(int(channel) * alpha + backdrop * (1 - alpha)):02x}"
+            for channel, backdrop in zip(color, LITE_BACKDROP)
+        )
+    
+    if 'gradient(' in value:
+        # A gradient becomes its first color
+        match = RGBA_PATTERN.search(value)
+        return blend(match) if match else 'none'
+    return RGBA_PATTERN.sub(blend, value)
+
+def get_lite_declaration(declaration):
+    """
+    Get the lite theme version of a CSS declaration.
+    
+    Args:
+        declaration (str): A declaration, e.g. "box-shadow: 0 2px 8px #000"
+    
+    Returns:
+        str: The changed declaration, or None if the lite theme keeps it
+    """
+    name, separator, value = declaration.partition(':')
+    name = name.strip()
+    value = value.strip()
+    important = value.endswith('!important')
+    if important:
+        value = value[:-len('!important')].strip()
+    if not separator:
+        return None
+    if name in LITE_DISABLED_PROPERTIES:
+        lite_value = 'none'
+    elif 'rgba(' in value or 'gradient(' in value:
+        lite_value = make_opaque(value)
+    else:
+        return None
+    return f"{name}: {lite_value}{' !important' if important else ''}"
+
+def make_lite_styling(styling):
+    """Turn the styling into the lite theme, rule by rule."""
+    def make_lite_rule(match):
+        selectors, body = match.groups()
+        declarations = []
+        for declaration in body.split(';'):
+            lite = get_lite_declaration(declaration)
+            if lite is not None:
+                # Keep the indentation of the original declaration
+                lite = declaration[:len(declaration) - len(declaration.lstrip())] + lite
+            declarations.append(lite or declaration)
+        return f"{selectors}{{{';'.join(declarations)}}}"
+    
+    return CSS_RULE_PATTERN.sub(make_lite_rule, styling)
+
+def escape_css_string(text):
+    """Escape text for a double-quoted CSS string."""
+    return ''.join(
+        f'\\{char}' if char in '"\\' else f'\\{ord(char):x} ' if ord(char) < 0x20 or ord(char) == 0x7f else char
+        for char in text
+    )
+
+def get_lite_deck_overrides(styling, lite_decks):
+    """
+    Get rules that give the cards of some decks the lite theme.
+    
+    Cards tell their deck through the data-deck attribute the templates
+    put on their outer element. The card element around the templates
+    gets the same attribute from the card runtime, since the WebViews of
+    older phones don't support :has. Anki inserts {{Deck}} unescaped, so
+    a deck whose name contains a double quote can't be matched.
+    
+    Args:
+        styling (str): The full theme
+        lite_decks (iterable): Names of the decks, subdecks included
+        
+    Returns:
+        str: CSS repeating the rules of the properties the lite theme
+            changes, scoped to the decks
+    """
+    scopes = []
+    for deck in sorted(lite_decks):
+        deck = escape_css_string(deck)
+        scopes.extend([f'[data-deck="{deck}"]', f'[data-deck^="{deck}::"]'])
+    
+    parsed = [
+        (selectors, [declaration for declaration in body.split(';') if ':' in declaration])
+        for selectors, body in CSS_RULE_PATTERN.findall(CSS_COMMENT_PATTERN.sub('', styling))
+        if not selectors.strip().startswith('@')
+    ]
+    # Every declaration of a property the lite theme changes anywhere is
+    # repeated, so the overrides cascade among themselves like the originals
+    changed = {
+        declaration.split(':', 1)[0].strip()
+        for selectors, declarations in parsed for declaration in declarations
+        if get_lite_declaration(declaration) is not None
+    }
+    
+    rules = []
+    for selectors, declarations in parsed:
+        selectors = [' '.join(selector.split()) for selector in selectors.split(',')]
+        declarations = [
+            get_lite_declaration(declaration) or ' '.join(declaration.split())
+            for declaration in declarations if declaration.split(':', 1)[0].strip() in changed
+        ]
+        if not declarations:
+            continue
+        scoped = [
+            f"{selector}{scope}" if selector == '.card' else f".recall-card{scope} {selector}"
+            for scope in scopes for selector in selectors
+        ]
+        rules.append(f"\n    {', '.join(scoped)} {{\n        {'; '.join(declarations)};\n    }}")
+    return ''.join(rules)
+
+def minify(text, comment_pattern):
+    """Remove the comments, indentation and blank lines of generated markup."""
+    lines = (line.strip() for line in comment_pattern.sub('', text).splitlines())
+    return '\n'.join(line for line in lines if line)
+
+@lru_cache(maxsize=None)
+def build_note_type_styling(version, theme, lite_decks):
+    """Minify the styling of a template version, see get_note_type_styling."""
+    return minify(get_card_styling(theme, lite_decks), CSS_COMMENT_PATTERN)
+
+@lru_cache(maxsize=None)
+def build_note_type_templates(correct_options, incorrect_options, version, theme, lite_decks):
+    """Minify the templates of a template version, see get_note_type_templates."""
+    return (
+        minify(create_front_template(correct_options, incorrect_options), HTML_COMMENT_PATTERN),
+        minify(create_back_template(correct_options, incorrect_options), HTML_COMMENT_PATTERN),
+        build_note_type_styling(version, theme, lite_decks),
+    )
+
+def get_note_type_styling(theme=THEME_FULL, lite_decks=()):
+    """
+    Get the minified styling every Recall note type uses.
+    
+    Args:
+        theme (str): THEME_FULL, or THEME_LITE for every deck
+        lite_decks (iterable): Decks that use the lite theme anyway
+    
+    Returns:
+        str: The CSS, generated once per template version and theme
+    """
+    return build_note_type_styling(TEMPLATE_VERSION, theme, tuple(sorted(lite_decks)))
+
+def get_note_type_templates(correct_options, incorrect_options, theme=THEME_FULL, lite_decks=()):
+    """
+    Get the minified templates and styling of a note type.
+    
+    The generators build large strings, so the results are cached; the
+    template version is part of the cache key, so templates of another
+    version are never reused.
+    
+    Args:
+        correct_options (int): Number of correct options
+        incorrect_options (int): Number of incorrect options
+        theme (str): THEME_FULL, or THEME_LITE for every deck
+        lite_decks (iterable): Decks that use the lite theme anyway
+        
+    Returns:
+        tuple: The front template, back template and styling
+    """
+    return build_note_type_templates(correct_options, incorrect_options, TEMPLATE_VERSION,
+                                     theme, tuple(sorted(lite_decks)))
@@ -0,0 +1,93 @@
+"""
+Note type registry for Recall Anki plugin.
+
+Finding the note type for a question used to cost a lookup by name, and
+another after creating it, for every note. The registry reads the names
+and ids of the collection's note types once and keeps them for the
+profile. Lookups are dictionary hits on the option slot counts; the
+collection is only asked again when a note type is missing, renamed or
+removed, or after Anki reports a note type change. Note types are
+returned as they are: adding the fields of newer versions to an existing
+one needs a full sync, so it only happens when the user asks, see
+upgrade_note_type_fields.
+"""
+
+from .note_types import create_recall_note_type, get_model_name, get_slot_counts
+
+class NoteTypeRegistry:
+    """Ids of a collection's Recall note types, keyed by option slot counts."""
+
+    def __init__(self, col):
+        """
+        Args:
+            col (Collection): The collection the note types belong to
+        """
+        self.col = col
+        self._ids = None
+
+    def invalidate(self):
+        """Forget the note types, so the next lookup reads them again."""
+        self._ids = None
+
+    def load(self):
+        """Read the ids of the collection's Recall note types."""
+        self._ids = {}
+        for entry in self.col.models.all_names_and_ids():
+            if entry.name.startswith("Recall"):
+                self._ids[entry.name] = entry.id
+
+    def get_model(self, correct_options, incorrect_options):
+        """
+        Get the note type a question is added to, creating it if needed.
+
+        Args:
+            correct_options (int): Number of correct options of the question
+            incorrect_options (int): Number of incorrect options of the question
+
+        Returns:
+            dict: The note type model
+        """
+        slot_counts = get_slot_counts(correct_options, incorrect_options)
+        model_name = get_model_name(*slot_counts)
+        if self._ids is None:
+            self.load()
+
+        model_id = self._ids.get(model_name)
+        model = self.col.models.get(model_id) if model_id else None
+        if model is None or model['name'] != model_name:
+            # Not created yet, or renamed or removed since the registry was built
+            model = (create_recall_note_type(*slot_counts, col=self.col)
+                     or self.col.models.by_name(model_name))
+            self._ids[model_name] = model['id']
+        return model
+
+_registry = None
+
+def get_note_type_registry(col=None):
+    """
+    Get the note type registry of a collection.
+
+    Args:
+        col (Collection, optional): The collection, defaults to the
+            collection open in Anki
+
+    Returns:
+        NoteTypeRegistry: The registry, shared until another collection is used
+    """
+    global _registry
+    if col is None:
+        from aqt import mw
+        col = mw.col
+    if _registry is None or _registry.col is not col:
+        _registry = NoteTypeRegistry(col)
+    return _registry
+
+def reset_note_type_registry():
+    """Drop the registry, e.g. when the profile closes."""
+    global _registry
+    _registry = None
+
+def on_operation_did_execute(changes, handler):
+    """Forget the note types when an operation changed any, see gui_hooks.operation_did_execute."""
+    if changes.notetype and _registry is not None:
+        _registry.invalidate()
@@ -0,0 +1,8 @@
+"""
+Standalone deck export for Recall Anki plugin.
+"""
+
+# Use relative import
+from .apkg import ApkgWriter
+
+__all__ = ['ApkgWriter']
@@ -0,0 +1,350 @@
+"""
+Standalone .apkg writer for Recall Anki plugin.
+
+Writes Recall notes straight into an Anki package without importing aqt or
+anki, so decks can be built on machines without Anki. Notes go into an
+on-disk SQLite collection in batches and media files are copied into the
+zip as soon as a note references them, so memory use does not grow with
+the size of the deck.
+"""
+
+import hashlib
+import html
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+import zipfile
+
+from ..card_templates.assets import get_media_assets
+from ..card_templates.note_types import (
+    get_note_type_templates, get_field_names, get_model_name, get_slot_counts, get_slot_fields,
+    SUMMARY_FIELD, CHECKSUM_FIELD
+)
+
+# Legacy (version 11) collection schema, which every Anki version can import
+SCHEMA = """
+create table col (
+    id integer primary key, crt integer not null, mod integer not null,
+    scm integer not null, ver integer not null, dty integer not null,
+    usn integer not null, ls integer not null, conf text not null,
+    models text not null, decks text not null, dconf text not null,
+    tags text not null
+);
+create table notes (
+    id integer primary key, guid text not null, mid integer not null,
+    mod integer not null, usn integer not null, tags text not null,
+    flds text not null, sfld integer not null, csum integer not null,
+    flags integer not null, data text not null
+);
+create table cards (
+    id integer primary key, nid integer not null, did integer not null,
+    ord integer not null, mod integer not null, usn integer not null,
+    type integer not null, queue integer not null, due integer not null,
+    ivl integer not null, factor integer not null, reps integer not null,
+    lapses integer not null, left integer not null, odue integer not null,
+    odid integer not null, flags integer not null, data text not null
+);
+create table revlog (
+    id integer primary key, cid integer not null, usn integer not null,
+    ease integer not null, ivl integer not null, lastIvl integer not null,
+    factor integer not null, time integer not null, type integer not null
+);
+create table graves (
+    usn integer not null, oid integer not null, type integer not null
+);
+create index ix_notes_usn on notes (usn);
+create index ix_cards_usn on cards (usn);
+create index ix_revlog_usn on revlog (usn);
+create index ix_cards_nid on cards (nid);
+create index ix_cards_sched on cards (did, queue, due);
+create index ix_revlog_cid on revlog (cid);
+create index ix_notes_csum on notes (csum);
+"""
+
+DEFAULT_DECK_ID = 1
+DEFAULT_CONF_ID = 1
+
+# Media references produced by the converter, e.g. <img src="image.jpg"> and
+# the preview documents loaded by <div class="recall-preview" data-src="...">
+MEDIA_REFERENCE_PATTERN = re.compile(r'<(?:img[^>]*?\ssrc|div class="recall-preview" data-src)="([^"/\\:]+)"')
+
+def strip_html(text):
+    """Get the plain text of a field, as Anki stores it for sorting."""
+    text = re.sub(r'<style.*?</style>|<script.*?</script>', '', text, flags=re.DOTALL | re.IGNORECASE)
+    text = re.sub(r'<[^>]+>', '', text)
+    return html.unescape(text).strip()
+
+def field_checksum(text):
+    """Get Anki's duplicate check checksum of a field."""
+    return int(hashlib.sha1(strip_html(text).encode('utf-8')).hexdigest()[:8], 16)
+
+def stable_id(*parts):
+    """
+    Get an id that every build of a package gives the same thing.
+
+    Anki matches imported note types and decks by id, so ids that change
+    between builds would add another note type on every import.
+
+    Args:
+        *parts (str): What identifies the object, e.g. its name
+
+    Returns:
+        int: A positive id well above the default deck's and note type's
+    """
+    digest = hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+    return int(digest[:12], 16) | 1 << 48
+
+def note_guid(fields):
+    """Get a stable GUID for a note, so re-importing a package updates it."""
+    digest = hashlib.sha1('\x1f'.join(fields).encode('utf-8')).hexdigest()
+    return digest[:16]
+
+def create_deck(deck_id, name, now):
+    """Create the JSON of a deck."""
+    return {
+        'id': deck_id, 'name': name, 'mod': now, 'usn': -1, 'desc': '', 'dyn': 0,
+        'conf': DEFAULT_CONF_ID, 'collapsed': False, 'browserCollapsed': False,
+        'newToday': [0, 0], 'revToday': [0, 0], 'lrnToday': [0, 0], 'timeToday': [0, 0],
+        'extendNew': 0, 'extendRev': 0,
+    }
+
+def create_deck_config(now):
+    """Create the JSON of the default deck options."""
+    return {
+        'id': DEFAULT_CONF_ID, 'name': 'Default', 'mod': now, 'usn': -1,
+        'maxTaken': 60, 'autoplay': True, 'timer': 0, 'replayq': True, 'dyn': False,
+        'new': {'delays': [1, 10], 'ints': [1, 4, 0], 'initialFactor': 2500,
+                'order': 1, 'perDay': 20, 'bury': False},
+        'lapse': {'delays': [10], 'mult': 0, 'minInt': 1, 'leechFails': 8,
+                  'leechAction': 1},
+        'rev': {'perDay': 200, 'ease4': 1.3, 'ivlFct': 1, 'maxIvl': 36500,
+                'hardFactor': 1.2, 'bury': False},
+    }
+
+def create_model(model_id, correct_options, incorrect_options, deck_id, now):
+    """Create the JSON of a Recall note type."""
+    model_name = get_model_name(correct_options, incorrect_options)
+    field_names = get_field_names(correct_options, incorrect_options)
+    front, back, styling = get_note_type_templates(correct_options, incorrect_options)
+    return {
+        'id': model_id, 'name': model_name, 'type': 0, 'mod': now, 'usn': -1,
+        'sortf': field_names.index(SUMMARY_FIELD), 'did': deck_id, 'tags': [], 'vers': [],
+        'flds': [
+            {'name': name, 'ord': i, 'sticky': False, 'rtl': False,
+             'font': 'Arial', 'size': 20, 'media': []}
+            for i, name in enumerate(field_names)
+        ],
+        'tmpls': [{
+            'name': model_name, 'ord': 0, 'did': None, 'bqfmt': '', 'bafmt': '',
+            'qfmt': front,
+            'afmt': back,
+        }],
+        'css': styling,
+        'latexPre': '\\documentclass[12pt]{article}\n\\special{papersize=3in,5in}\n'
+                    '\\usepackage[utf8]{inputenc}\n\\usepackage{amssymb,amsmath}\n'
+                    '\\pagestyle{empty}\n\\setlength{\\parindent}{0in}\n\\begin{document}\n',
+        'latexPost': '\\end{document}',
+        'latexsvg': False,
+        'req': [[0, 'any', [0]]],
+    }
+
+class ApkgWriter:
+    """Write converted Recall notes into an .apkg file."""
+
+    def __init__(self, path, deck_name, media_dir=None, batch_size=1000):
+        """
+        Args:
+            path (str): The .apkg file to create
+            deck_name (str): Deck the cards are added to
+            media_dir (str, optional): Folder the converter saved images to;
+                images referenced by notes are copied from here
+            batch_size (int): Notes inserted per SQLite transaction
+        """
+        self.path = path
+        self.deck_name = deck_name
+        self.media_dir = media_dir
+        self.batch_size = max(1, batch_size)
+        self.written = 0
+        self.duplicates = 0
+
+        self.now = int(time.time())
+        self.deck_id = stable_id('deck', deck_name)
+        self._next_id = self.now * 1000
+        self._models = {}
+        self._media = {}
+        self._media_names = set()
+        self._pending_notes = []
+        self._pending_cards = []
+        self._checksums = set()
+
+        self._temp_dir = tempfile.mkdtemp(prefix='recall-apkg-')
+        self._db_path = os.path.join(self._temp_dir, 'collection.anki2')
+        self._db = sqlite3.connect(self._db_path)
+        self._db.executescript(SCHEMA)
+        self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def new_id(self):
+        """Get a unique, increasing id in Anki's millisecond style."""
+        self._next_id += 1
+        return self._next_id
+
+    def get_model_id(self, correct_count, incorrect_count):
+        """
+        Get the id of the note type with some option slots, creating it if needed.
+
+        The id follows the note type's name and fields, so packages built
+        at different times update the same note type; its templates are
+        updated on import when they are newer.
+        """
+        key = (correct_count, incorrect_count)
+        if key not in self._models:
+            model_id = stable_id('model', get_model_name(correct_count, incorrect_count),
+                                 *get_field_names(correct_count, incorrect_count))
+            self._models[key] = create_model(model_id, correct_count, incorrect_count,
+                                             self.deck_id, self.now)
+        return self._models[key]['id']
+
+    def add_media(self, file_path, name=None):
+        """
+        Copy a media file into the package.
+
+        Args:
+            file_path (str): The file to add
+            name (str, optional): Name in the collection, defaults to the file name
+        """
+        name = name or os.path.basename(file_path)
+        if name in self._media_names:
+            return
+        index = str(len(self._media))
+        # Media is already compressed, so store it as is
+        self._zip.write(file_path, index, compress_type=zipfile.ZIP_STORED)
+        self._media[index] = name
+        self._media_names.add(name)
+
+    def add_media_data(self, name, data):
+        """
+        Add media file contents to the package.
+
+        Args:
+            name (str): Name in the collection
+            data (bytes): The file contents
+        """
+        if name in self._media_names:
+            return
+        index = str(len(self._media))
+        self._zip.writestr(index, data)
+        self._media[index] = name
+        self._media_names.add(name)
+
+    def add(self, converted, tags=()):
+        """
+        Add a converted note.
+
+        Questions already in the package are counted as duplicates and skipped.
+
+        Args:
+            converted (dict): A note produced by convert_file
+            tags (iterable): Tags for the note, besides its content tags
+        """
+        checksum = converted['fields'].get(CHECKSUM_FIELD)
+        if checksum:
+            if checksum in self._checksums:
+                self.duplicates += 1
+                return
+            self._checksums.add(checksum)
+
+        correct_count = converted['correct_count']
+        incorrect_count = converted['incorrect_count']
+        slot_counts = get_slot_counts(correct_count, incorrect_count)
+        model_id = self.get_model_id(*slot_counts)
+        slot_fields = get_slot_fields(converted['fields'], correct_count, incorrect_count, slot_counts)
+        field_names = get_field_names(*slot_counts)
+        fields = [slot_fields.get(name, '') for name in field_names]
+
+        if self.media_dir:
+            for field in fields:
+                for name in MEDIA_REFERENCE_PATTERN.findall(field):
+                    file_path = os.path.join(self.media_dir, name)
+                    if os.path.isfile(file_path):
+                        self.add_media(file_path, name)
+
+        tags = [*tags, *converted.get('tags', [])]
+        # Notes with a source keep their GUID when questions are inserted or
+        # moved, or their explanations are edited
+        guid = note_guid([self.deck_name, converted['source']]) if converted.get('source') else note_guid(fields)
+        note_id = self.new_id()
+        self._pending_notes.append((
+            note_id, guid, model_id, self.now, -1,
+            f" {' '.join(tags)} " if tags else '',
+            '\x1f'.join(fields), strip_html(fields[field_names.index(SUMMARY_FIELD)]),
+            field_checksum(fields[0]), 0, ''
+        ))
+        # New card, positioned in the order the notes were added
+        self._pending_cards.append((
+            self.new_id(), note_id, self.deck_id, 0, self.now, -1,
+            0, 0, self.written + len(self._pending_notes), 0, 0, 0, 0, 0, 0, 0, 0, ''
+        ))
+
+        if len(self._pending_notes) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Insert the queued notes and cards."""
+        if not self._pending_notes:
+            return
+        with self._db:
+            self._db.executemany('insert into notes values (?,?,?,?,?,?,?,?,?,?,?)', self._pending_notes)
+            self._db.executemany('insert into cards values (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)', self._pending_cards)
+        self.written += len(self._pending_notes)
+        self._pending_notes = []
+        self._pending_cards = []
+
+    def close(self):
+        """Write the collection and media map and finish the package."""
+        self.flush()
+
+        # Scripts and styles the templates load from the media folder
+        for name, data in get_media_assets().items():
+            self.add_media_data(name, data)
+
+        decks = {
+            str(DEFAULT_DECK_ID): create_deck(DEFAULT_DECK_ID, 'Default', self.now),
+            str(self.deck_id): create_deck(self.deck_id, self.deck_name, self.now),
+        }
+        models = {str(model['id']): model for model in self._models.values()}
+        with self._db:
+            self._db.execute(
+                'insert into col values (1,?,?,?,11,0,0,0,?,?,?,?,?)',
+                (self.now, self.now * 1000, self.now * 1000,
+                 json.dumps({'nextPos': self.written + 1, 'curDeck': self.deck_id}),
+                 json.dumps(models), json.dumps(decks),
+                 json.dumps({str(DEFAULT_CONF_ID): create_deck_config(self.now)}),
+                 json.dumps({}))
+            )
+        self._db.close()
+
+        self._zip.write(self._db_path, 'collection.anki2')
+        self._zip.writestr('media', json.dumps(self._media))
+        self._zip.close()
+        shutil.rmtree(self._temp_dir, ignore_errors=True)
+
+    def abort(self):
+        """Discard the package after an error."""
+        self._db.close()
+        self._zip.close()
+        shutil.rmtree(self._temp_dir, ignore_errors=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)
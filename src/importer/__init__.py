@@ -0,0 +1,11 @@
+"""
+Batch importing of markdown question banks for Recall Anki plugin.
+"""
+
+# Use relative import
+from .batch import find_markdown_files, get_source_name, convert_file, create_executor
+from .writer import NoteWriter, load_source_index
+from .duplicates import get_duplicate_index
+
+__all__ = ['find_markdown_files', 'get_source_name', 'convert_file', 'create_executor',
+           'NoteWriter', 'load_source_index', 'get_duplicate_index']
@@ -0,0 +1,209 @@
+"""
+Parsing and conversion of markdown question banks for Recall Anki plugin.
+
+Everything here runs in worker processes, so this module and what it
+imports use neither Anki nor Qt. Workers still import it through the
+add-on package, whose __init__ imports aqt; the menus and dialogs are only
+set up when Anki's main window exists, which it never does in a worker.
+"""
+
+import hashlib
+import os
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from ..markdown.parser import parse_input, split_questions
+from ..markdown.converter import (
+    convert_sections_to_fields, get_code_languages, get_question_summary, get_question_checksum
+)
+from ..markdown.storage import encode_markdown
+from ..markdown.tags import get_content_tags
+from ..card_templates.note_types import (
+    SOURCE_FIELD, HASH_FIELD, MARKDOWN_FIELD, LANGUAGES_FIELD, SUMMARY_FIELD, CHECKSUM_FIELD
+)
+
+# Checksum characters in a source id, enough to tell a file's questions apart
+SOURCE_ID_LENGTH = 12
+
+def find_markdown_files(folder):
+    """
+    Find all markdown files below a folder.
+    
+    Args:
+        folder (str): The folder to scan recursively
+        
+    Returns:
+        list: Sorted paths of the .md files found
+    """
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(folder):
+        # Skip hidden folders such as .git
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        for filename in filenames:
+            if filename.lower().endswith('.md'):
+                paths.append(os.path.join(dirpath, filename))
+    return sorted(paths)
+
+def get_source_name(path, folder=None):
+    """
+    Get the name a file's questions are identified by across imports.
+    
+    Args:
+        path (str): The markdown file
+        folder (str, optional): The folder being imported; without it only
+            the file name is used
+        
+    Returns:
+        str: The path relative to the folder, with forward slashes
+    """
+    if folder is None:
+        return os.path.basename(path)
+    return os.path.relpath(path, folder).replace(os.sep, '/')
+
+def hash_question(text):
+    """Get the content hash of a question's markdown."""
+    return hashlib.sha1(text.strip().encode('utf-8')).hexdigest()
+
+def get_source_id(source_name, checksum, taken=()):
+    """
+    Get the id of a question from its file and checksum.
+    
+    Args:
+        source_name (str): Name identifying the file, see get_source_name
+        checksum (str): The question's checksum, see get_question_checksum
+        taken (iterable): Ids already used in the file; a question that
+            occurs again gets a numbered id
+        
+    Returns:
+        str: The source id, e.g. "chapter1.md#3f2a9c01b7de"
+    """
+    source = f"{source_name}#{checksum[:SOURCE_ID_LENGTH]}"
+    copy = 2
+    while source in taken:
+        source = f"{source_name}#{checksum[:SOURCE_ID_LENGTH]}-{copy}"
+        copy += 1
+    return source
+
+def convert_file(path, media_dir=None, source_name=None, known_hashes=None, highlight=False, collapse_lines=0):
+    """
+    Parse and convert every question in a markdown file.
+    
+    Each question is identified by the source name and its checksum, e.g.
+    "chapter1.md#3f2a9c01b7de", so inserting or moving questions keeps the
+    ids of the others; see NoteWriter.add for questions whose text changed.
+    Questions whose hash matches known_hashes were imported before without
+    changes and are skipped unconverted, keeping the id they were imported
+    with.
+    
+    Args:
+        path (str): The markdown file to convert
+        media_dir (str, optional): Folder external images are saved to
+        source_name (str, optional): Name identifying the file, see
+            get_source_name; defaults to the file name
+        known_hashes (dict, optional): Hash of each previously imported
+            question of this file, keyed by source id
+        highlight (bool): Highlight code blocks with Pygments, see
+            format_code_block
+        collapse_lines (int): Collapse code blocks with more lines, see
+            format_code_block
+        
+    Returns:
+        dict: 'path', the converted 'notes', the source ids of 'unchanged'
+            questions, per-question 'errors', the seconds spent in each stage
+            as 'timings' and the ids of all questions converted or unchanged
+            as 'sources' (None if the file could not be read). Each note has 'source',
+            'hash', 'correct_count', 'incorrect_count', 'fields' and its
+            content 'tags'; each error is a (line_number, message) tuple.
+    """
+    source_name = source_name or os.path.basename(path)
+    known_hashes = known_hashes or {}
+    timings = {'read': 0.0, 'parse': 0.0, 'convert': 0.0}
+    result = {'path': path, 'source_name': source_name, 'notes': [], 'unchanged': [],
+              'errors': [], 'timings': timings, 'sources': None}
+    
+    start = time.perf_counter()
+    try:
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        result['errors'].append((0, str(e)))
+        return result
+    finally:
+        timings['read'] += time.perf_counter() - start
+    
+    start = time.perf_counter()
+    questions = split_questions(text)
+    timings['parse'] += time.perf_counter() - start
+    result['sources'] = []
+    # Source id of each previously imported question, by hash
+    known_sources = {}
+    for source, question_hash in known_hashes.items():
+        known_sources.setdefault(question_hash, source)
+    
+    for line_number, question_text in questions:
+        question_hash = hash_question(question_text)
+        source = known_sources.pop(question_hash, None)
+        if source is not None:
+            result['sources'].append(source)
+            result['unchanged'].append(source)
+            continue
+        
+        try:
+            start = time.perf_counter()
+            sections = parse_input(question_text)
+            timings['parse'] += time.perf_counter() - start
+            
+            start = time.perf_counter()
+            fields = convert_sections_to_fields(sections, media_dir, highlight=highlight,
+                                                collapse_lines=collapse_lines)
+            timings['convert'] += time.perf_counter() - start
+        except Exception as e:
+            result['errors'].append((line_number, str(e)))
+            continue
+        
+        checksum = get_question_checksum(fields)
+        source = get_source_id(source_name, checksum, result['sources'])
+        result['sources'].append(source)
+        
+        fields[LANGUAGES_FIELD] = ' '.join(get_code_languages(fields.values()))
+        fields[SUMMARY_FIELD] = get_question_summary(fields['Question'])
+        fields[CHECKSUM_FIELD] = checksum
+        fields[SOURCE_FIELD] = source
+        fields[HASH_FIELD] = question_hash
+        fields[MARKDOWN_FIELD] = encode_markdown(question_text)
+        result['notes'].append({
+            'source': source,
+            'hash': question_hash,
+            'correct_count': len(sections['correct_options']),
+            'incorrect_count': len(sections['incorrect_options']),
+            'fields': fields,
+            'tags': get_content_tags(fields)
+        })
+    
+    return result
+
+def create_executor(workers=0):
+    """
+    Create the executor that runs convert_file.
+    
+    Args:
+        workers (int): Number of worker processes, 0 for one per CPU and
+            1 to convert in a single background thread
+        
+    Returns:
+        Executor: A process pool, or a thread pool if processes are unavailable
+    """
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        return ThreadPoolExecutor(max_workers=1)
+    
+    try:
+        # Never fork a process that is running Qt
+        return ProcessPoolExecutor(max_workers=workers,
+                                   mp_context=multiprocessing.get_context('spawn'))
+    except (OSError, NotImplementedError, ValueError) as e:
+        print(f"Recall: process pool unavailable, converting in a thread: {e}", file=sys.stderr)
+        return ThreadPoolExecutor(max_workers=1)
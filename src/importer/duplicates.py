@@ -0,0 +1,152 @@
+"""
+Duplicate question index for Recall Anki plugin.
+
+Anki's duplicate check compares the raw HTML of the first field, which
+changes with every formatting or styling change. Recall notes instead keep
+a checksum of their parsed question and options, see get_question_checksum.
+The index reads the checksums of the collection's Recall notes once and
+keeps them for the profile, so checking a question is a dictionary lookup.
+After Anki reports that notes were edited, only the notes changed since
+the last read are read again.
+"""
+
+import time
+
+from ..card_templates.note_types import get_recall_models, CHECKSUM_FIELD
+
+class DuplicateIndex:
+    """Ids of a collection's Recall notes, keyed by question checksum."""
+
+    def __init__(self, col):
+        """
+        Args:
+            col (Collection): The collection the notes belong to
+        """
+        self.col = col
+        self._note_ids = None
+        # The checksum each note is indexed by, to replace it when the note changes
+        self._checksums = {}
+        self._read_at = None
+        self._changed = False
+
+    def mark_changed(self):
+        """Read the notes changed since the last read before the next lookup."""
+        self._changed = True
+
+    def load(self):
+        """Read the checksums of the collection's Recall notes."""
+        self._note_ids = {}
+        self._checksums = {}
+        self._changed = False
+        self.read_notes()
+
+    def read_notes(self, changed_since=None):
+        """
+        Read the checksums of Recall notes into the index.
+
+        Args:
+            changed_since (int, optional): Only read notes changed at or
+                after this time, in seconds. Notes changed locally are
+                unsynced, so they are found through the index on usn
+                rather than by reading every note.
+        """
+        positions = {}
+        for model in get_recall_models(self.col):
+            names = [field['name'] for field in model['flds']]
+            if CHECKSUM_FIELD in names:
+                positions[model['id']] = names.index(CHECKSUM_FIELD)
+        self._read_at = int(time.time())
+        if not positions:
+            return
+
+        # Reading the fields straight from the database avoids loading every note
+        if changed_since is None:
+            rows = self.col.db.all(
+                f"select id, mid, flds from notes where mid in ({','.join(map(str, positions))})")
+        else:
+            # Filtered by model here, so the query uses the usn index instead of the one on mid
+            rows = self.col.db.all(
+                "select id, mid, flds from notes where usn = -1 and mod >= ?", changed_since)
+        for note_id, model_id, flds in rows:
+            if model_id not in positions:
+                continue
+            checksum = flds.split('\x1f')[positions[model_id]]
+            previous = self._checksums.get(note_id)
+            if previous != checksum:
+                if previous is not None:
+                    self.discard(previous, note_id)
+                self.add(checksum, note_id)
+
+    def find(self, checksum):
+        """
+        Find the note with a question.
+
+        Args:
+            checksum (str): The question's checksum
+
+        Returns:
+            int: Id of a note with the same question, or None
+        """
+        if self._note_ids is None:
+            self.load()
+        elif self._changed:
+            self._changed = False
+            # Notes changed in the second of the last read may not have been read
+            self.read_notes(changed_since=self._read_at - 1)
+        note_id = self._note_ids.get(checksum)
+        # Notes removed without an operation, e.g. by an import, are dropped
+        if note_id is not None and not self.col.db.scalar("select 1 from notes where id = ?", note_id):
+            self.discard(checksum, note_id)
+            return None
+        return note_id
+
+    def add(self, checksum, note_id):
+        """Record the checksum of a note that was just added or changed."""
+        if self._note_ids is not None and checksum:
+            self._note_ids.setdefault(checksum, note_id)
+            self._checksums[note_id] = checksum
+
+    def discard(self, checksum, note_id):
+        """Forget a note's previous checksum, after its question changed."""
+        if self._note_ids is not None and self._note_ids.get(checksum) == note_id:
+            del self._note_ids[checksum]
+        if self._checksums.get(note_id) == checksum:
+            del self._checksums[note_id]
+
+    def remove(self, note_ids):
+        """Forget notes that were removed."""
+        for note_id in note_ids:
+            checksum = self._checksums.get(note_id)
+            if checksum is not None:
+                self.discard(checksum, note_id)
+
+_index = None
+
+def get_duplicate_index(col=None):
+    """
+    Get the duplicate index of a collection.
+
+    Args:
+        col (Collection, optional): The collection, defaults to the
+            collection open in Anki
+
+    Returns:
+        DuplicateIndex: The index, shared until another collection is used
+    """
+    global _index
+    if col is None:
+        from aqt import mw
+        col = mw.col
+    if _index is None or _index.col is not col:
+        _index = DuplicateIndex(col)
+    return _index
+
+def reset_duplicate_index():
+    """Drop the index, e.g. when the profile closes."""
+    global _index
+    _index = None
+
+def on_operation_did_execute(changes, handler):
+    """Read the changed notes again when an operation changed notes, see gui_hooks.operation_did_execute."""
+    if changes.note_text and _index is not None:
+        _index.mark_changed()
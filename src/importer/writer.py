@@ -0,0 +1,339 @@
+"""
+Single writer that adds converted Recall notes to a collection.
+"""
+
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+from ..card_templates.note_types import (
+    get_recall_models, get_option_counts, get_slot_counts, get_slot_fields, SOURCE_FIELD, HASH_FIELD,
+    CHECKSUM_FIELD, SUMMARY_FIELD
+)
+from ..card_templates.registry import get_note_type_registry
+from .duplicates import get_duplicate_index
+from ..markdown.tags import replace_content_tags, tags_differ
+
+# How similar a changed question's summary must be to take over a note
+RENAME_SIMILARITY = 0.6
+
+def load_source_index(col, deck_id):
+    """
+    Find the Recall notes previously imported into a deck.
+    
+    Args:
+        col (Collection): The collection
+        deck_id (int): The deck; its subdecks are included
+    
+    Returns:
+        dict: (note_id, hash) of each imported note, keyed by source id
+    """
+    field_positions = {}
+    for model in get_recall_models(col):
+        names = [field['name'] for field in model['flds']]
+        if SOURCE_FIELD in names and HASH_FIELD in names:
+            field_positions[model['id']] = (names.index(SOURCE_FIELD), names.index(HASH_FIELD))
+    if not field_positions:
+        return {}
+    
+    deck_ids = col.decks.deck_and_child_ids(deck_id)
+    # Reading the fields straight from the database avoids loading every note
+    rows = col.db.all(
+        f"select id, mid, flds from notes where mid in ({','.join(map(str, field_positions))}) "
+        f"and id in (select nid from cards where did in ({','.join(map(str, deck_ids))}))"
+    )
+    index = {}
+    for note_id, model_id, flds in rows:
+        source_position, hash_position = field_positions[model_id]
+        fields = flds.split('\x1f')
+        if fields[source_position]:
+            index[fields[source_position]] = (note_id, fields[hash_position])
+    return index
+
+class NoteWriter:
+    """Add converted notes to a collection in chunks, from one thread only."""
+    
+    def __init__(self, col, deck_id, chunk_size=500, existing=None, skip_duplicates=True):
+        """
+        Args:
+            col (Collection): The collection to write to
+            deck_id (int): Deck new notes are added to
+            chunk_size (int): Notes written per collection operation
+            existing (dict, optional): Previously imported notes, as returned
+                by load_source_index; matching notes are updated in place
+            skip_duplicates (bool): Whether new questions that are already
+                in the collection, in any deck, are skipped
+        """
+        self.col = col
+        self.deck_id = deck_id
+        self.chunk_size = max(1, chunk_size)
+        self.existing = existing or {}
+        self.written = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.removed = 0
+        self.duplicates = 0
+        self.skip_duplicates = skip_duplicates
+        self._pending = []
+        self._pending_updates = []
+        self._pending_removals = []
+        self._registry = get_note_type_registry(col)
+        self._duplicate_index = get_duplicate_index(col)
+        # Checksums of the notes added or updated in this run, which the
+        # index only learns once they are written
+        self._checksums = set()
+        self._previous_checksums = {}
+        # Notes updated or replaced in this run
+        self._changing = set()
+        self._identities = {}
+        self._seen = set()
+        self._recorded_files = set()
+        self._kept_files = set()
+        
+        self._hashes_by_file = defaultdict(dict)
+        self._sources_by_note = {}
+        for source, (note_id, question_hash) in self.existing.items():
+            self._hashes_by_file[source.rsplit('#', 1)[0]][source] = question_hash
+            self._sources_by_note[note_id] = source
+    
+    @property
+    def queued(self):
+        """Number of notes waiting for the next write."""
+        return len(self._pending) + len(self._pending_updates)
+    
+    def known_hashes(self, source_name):
+        """Get the hashes of the questions previously imported from a file."""
+        return self._hashes_by_file.get(source_name, {})
+    
+    def get_model(self, correct_count, incorrect_count):
+        """Get the note type for an option count, creating it if needed."""
+        return self._registry.get_model(correct_count, incorrect_count)
+    
+    def record_sources(self, result):
+        """
+        Record which questions a convert_file result covered.
+        
+        Args:
+            result (dict): The result of convert_file
+        """
+        if result['sources'] is None or result['errors']:
+            # Keep the notes of files that could not be read, or whose
+            # questions could not all be converted and identified
+            self._kept_files.add(result['source_name'])
+        if result['sources'] is not None:
+            self._seen.update(result['sources'])
+            self._recorded_files.add(result['source_name'])
+        self.unchanged += len(result['unchanged'])
+    
+    def add(self, converted):
+        """
+        Queue a converted note, writing a chunk when enough are queued.
+        
+        Notes imported before from the same source are updated instead, as
+        is the note of a question whose text changed, see find_renamed. New
+        questions already in the collection are counted as duplicates and
+        skipped, unless skip_duplicates is off; notes updated or removed in
+        this run are not counted.
+        
+        The file's sources should be recorded first, see record_sources.
+        
+        Args:
+            converted (dict): A note produced by convert_file
+        """
+        from anki.notes import Note
+        
+        correct_count = converted['correct_count']
+        incorrect_count = converted['incorrect_count']
+        model = self.get_model(correct_count, incorrect_count)
+        source = converted.get('source')
+        existing = self.existing.get(source)
+        if existing is None and source is not None:
+            source = self.find_renamed(converted)
+            existing = self.existing.get(source)
+        if existing is not None:
+            self._seen.update([source, converted['source']])
+            note = self.col.get_note(existing[0])
+            note_counts = get_option_counts(note.keys())
+            self._changing.add(note.id)
+            # Notes of older per-count note types are kept while they fit
+            if note.mid == model['id'] or note_counts == (correct_count, incorrect_count):
+                self.update(note, get_slot_fields(converted['fields'], correct_count, incorrect_count,
+                                                  note_counts), converted.get('tags', []))
+                return
+            # The number of options changed, so the note is replaced
+            self._pending_removals.append(note.id)
+        elif self.skip_duplicates and self.is_duplicate(converted['fields'].get(CHECKSUM_FIELD)):
+            self.duplicates += 1
+            return
+        
+        note = Note(self.col, model)
+        fields = get_slot_fields(converted['fields'], correct_count, incorrect_count,
+                                 get_slot_counts(correct_count, incorrect_count))
+        # Note types of older versions lack the newest hidden fields until upgraded
+        for field_name in note.keys():
+            if field_name in fields:
+                note[field_name] = fields[field_name]
+        note.tags = list(converted.get('tags', []))
+        self._pending.append(note)
+        if fields.get(CHECKSUM_FIELD):
+            self._checksums.add(fields[CHECKSUM_FIELD])
+        
+        if self.queued >= self.chunk_size:
+            self.flush()
+    
+    def find_renamed(self, converted):
+        """
+        Find the previously imported note of a question whose text changed.
+        
+        A changed question gets another source id. It takes over a note of
+        the same file whose question is no longer in the file: the one with
+        the same checksum, e.g. imported with an older id, or else the one
+        whose question summary is the most similar.
+        
+        Args:
+            converted (dict): A note produced by convert_file
+            
+        Returns:
+            str: Source id of the note, or None for a new question
+        """
+        source_name = converted['source'].rsplit('#', 1)[0]
+        candidates = [source for source in self._hashes_by_file.get(source_name, {})
+                      if source not in self._seen]
+        checksum = converted['fields'].get(CHECKSUM_FIELD, '')
+        summary = converted['fields'].get(SUMMARY_FIELD, '')
+        
+        identities = {source: self.get_identity(source) for source in candidates}
+        for source, (note_checksum, note_summary) in identities.items():
+            if checksum and note_checksum == checksum:
+                return source
+        
+        best_source, best_ratio = None, 0
+        for source, (note_checksum, note_summary) in identities.items():
+            if not summary or not note_summary:
+                continue
+            ratio = SequenceMatcher(None, summary, note_summary).ratio()
+            if ratio >= RENAME_SIMILARITY and ratio > best_ratio:
+                best_source, best_ratio = source, ratio
+        return best_source
+    
+    def get_identity(self, source):
+        """Get the checksum and question summary of a previously imported note."""
+        if source not in self._identities:
+            note = self.col.get_note(self.existing[source][0])
+            names = note.keys()
+            self._identities[source] = tuple(note[name] if name in names else ''
+                                             for name in (CHECKSUM_FIELD, SUMMARY_FIELD))
+        return self._identities[source]
+    
+    def is_duplicate(self, checksum):
+        """Check whether a question is in the collection or this run already."""
+        if not checksum:
+            return False
+        if checksum in self._checksums:
+            return True
+        note_id = self._duplicate_index.find(checksum)
+        return note_id is not None and not self.is_leaving(note_id)
+    
+    def is_leaving(self, note_id):
+        """
+        Check whether a note is updated or removed in this run.
+        
+        Notes whose question was deleted from a file already converted are
+        counted, as remove_missing would remove them.
+        """
+        if note_id in self._changing:
+            return True
+        source = self._sources_by_note.get(note_id)
+        if source is None or source in self._seen:
+            return False
+        source_name = source.rsplit('#', 1)[0]
+        return source_name in self._recorded_files and source_name not in self._kept_files
+    
+    def update(self, note, fields, content_tags=()):
+        """
+        Queue an existing note for writing, changing only the fields that differ.
+        
+        Args:
+            note (Note): The note imported before
+            fields (dict): The newly converted fields
+            content_tags (iterable): The note's new content tags; tags
+                users added are kept
+        """
+        tags = replace_content_tags(note.tags, content_tags)
+        changed = tags_differ(tags, note.tags)
+        note.tags = tags
+        if fields.get(CHECKSUM_FIELD):
+            self._checksums.add(fields[CHECKSUM_FIELD])
+        if CHECKSUM_FIELD in note.keys() and note[CHECKSUM_FIELD] != fields.get(CHECKSUM_FIELD, ''):
+            # The index learns the new checksum once the note is written
+            self._previous_checksums[note.id] = note[CHECKSUM_FIELD]
+        for field_name in note.keys():
+            field_html = fields.get(field_name, '')
+            if note[field_name] != field_html:
+                note[field_name] = field_html
+                changed = True
+        if not changed:
+            self.unchanged += 1
+            return
+        
+        self._pending_updates.append(note)
+        if self.queued >= self.chunk_size:
+            self.flush()
+    
+    def remove_missing(self):
+        """
+        Remove previously imported notes whose question no longer exists.
+        
+        Returns:
+            int: Number of notes removed
+        """
+        note_ids = [
+            note_id for source, (note_id, question_hash) in self.existing.items()
+            if source not in self._seen and source.rsplit('#', 1)[0] not in self._kept_files
+        ]
+        if note_ids:
+            self.col.remove_notes(note_ids)
+            self._duplicate_index.remove(note_ids)
+        self.removed += len(note_ids)
+        return len(note_ids)
+    
+    def flush(self):
+        """
+        Write all queued notes in a single collection operation.
+        
+        Returns:
+            int: Number of notes written
+        """
+        count = 0
+        if self._pending_updates:
+            notes, self._pending_updates = self._pending_updates, []
+            self.col.update_notes(notes)
+            for note in notes:
+                if note.id in self._previous_checksums:
+                    self._duplicate_index.discard(self._previous_checksums.pop(note.id), note.id)
+                    self._duplicate_index.add(note[CHECKSUM_FIELD], note.id)
+            self.updated += len(notes)
+            count += len(notes)
+        
+        if self._pending_removals:
+            note_ids, self._pending_removals = self._pending_removals, []
+            self.col.remove_notes(note_ids)
+            self._duplicate_index.remove(note_ids)
+        
+        if not self._pending:
+            return count
+        
+        notes, self._pending = self._pending, []
+        try:
+            from anki.collection import AddNoteRequest
+        except ImportError:
+            # Older Anki versions can only add one note at a time
+            for note in notes:
+                self.col.add_note(note, self.deck_id)
+        else:
+            self.col.add_notes([AddNoteRequest(note=note, deck_id=self.deck_id) for note in notes])
+        
+        for note in notes:
+            if CHECKSUM_FIELD in note.keys():
+                self._duplicate_index.add(note[CHECKSUM_FIELD], note.id)
+        self.written += len(notes)
+        return count + len(notes)
@@ -3,6 +3,11 @@ Markdown processing module for Recall Anki plugin.
 """
 
 # Use relative import
-from .converter import convert_markdown_to_html, format_code_block
+from .converter import (
+    convert_markdown_to_html, format_code_block, convert_sections_to_fields, get_code_languages
+)
+from .parser import parse_input, split_questions
+from .storage import encode_markdown, decode_markdown
 
-__all__ = ['convert_markdown_to_html', 'format_code_block'] 
\ No newline at end of file
+__all__ = ['convert_markdown_to_html', 'format_code_block', 'convert_sections_to_fields', 'get_code_languages',
+           'parse_input', 'split_questions', 'encode_markdown', 'decode_markdown']
@@ -2,14 +2,23 @@
 Markdown to HTML conversion for Recall Anki plugin.
 """
 
+import html
 import re
 import markdown
 import urllib.request
 import urllib.parse
 import urllib.error
 import os
+import sys
 import hashlib
-from aqt import mw
+
+from .highlighter import highlight_code
+
+# Preview documents are saved to the media folder as <prefix><hash>.html
+PREVIEW_MEDIA_PREFIX = '_recall_preview_'
+
+# Lines a collapsed code block shows until it is expanded
+CODE_EXCERPT_LINES = 20
 
 # This is a dummy function that does nothing, to replace the syntax highlighting functionality
 def safe_highlight(pattern, replacement, text, flags=0):
@@ -17,12 +26,21 @@ def safe_highlight(pattern, replacement, text, flags=0):
     # Simply return the text unchanged
     return text
 
-def convert_markdown_to_html(text):
+def get_media_dir():
+    """Return the media folder of the collection currently open in Anki."""
+    from aqt import mw
+    return mw.col.media.dir()
+
+def convert_markdown_to_html(text, media_dir=None, highlight=False, collapse_lines=0):
     """
     Convert markdown text to HTML with simple color formatting for options.
     
     Args:
         text (str): The markdown text to convert
+        media_dir (str, optional): Folder external images are saved to,
+            defaults to the media folder of the open collection
+        highlight (bool): Highlight code blocks now, see format_code_block
+        collapse_lines (int): Collapse longer code blocks, see format_code_block
         
     Returns:
         str: The converted HTML
@@ -38,7 +56,7 @@ def convert_markdown_to_html(text):
     def extract_preview_sections(match):
         nonlocal preview_counter
         # The HTML content is inside the code block
-        html_code_block = match.group(2)
+        html_code_block = match.group(1)
         
         # Check if we have a code block with html tag
         # Updated pattern to handle optional whitespace and newlines
@@ -47,11 +65,11 @@ def convert_markdown_to_html(text):
             # Extract the raw HTML content without the code block markers
             language = code_match.group(1).lower() if code_match.group(1) else 'html'
             html_content = code_match.group(2).strip()
-            placeholder = f"PREVIEW_SECTION_PLACEHOLDER_{preview_counter}"
+            placeholder = f"RECALLPREVIEWPLACEHOLDER{preview_counter}"
             
             # Store both the formatted code block (for display) and the raw HTML (for rendering)
             preview_sections[placeholder] = {
-                'code': format_code_block(html_content, language),
+                'code': format_code_block(html_content, language, highlight, collapse_lines),
                 'html': html_content if language == 'html' else None
             }
             preview_counter += 1
@@ -66,6 +84,7 @@ def convert_markdown_to_html(text):
     
     # Helper function to download external images and save them to Anki's media collection
     def retrieve_external_image(url):
+        nonlocal media_dir
         try:
             # Generate a filename for the image
             # Use the last part of the URL path, or a hash if that doesn't work
@@ -78,8 +97,11 @@ def convert_markdown_to_html(text):
                     file_ext = '.jpg'  # Default to .jpg if no extension
                 filename = hashlib.md5(url.encode('utf-8')).hexdigest() + file_ext
             
+            if media_dir is None:
+                media_dir = get_media_dir()
+            
             # Check if the file already exists in media collection
-            if not os.path.exists(os.path.join(mw.col.media.dir(), filename)):
+            if not os.path.exists(os.path.join(media_dir, filename)):
                 # Download the image
                 req = urllib.request.Request(
                     url, 
@@ -89,12 +111,12 @@ def convert_markdown_to_html(text):
                     image_data = response.read()
                 
                 # Save the image to Anki's media collection
-                with open(os.path.join(mw.col.media.dir(), filename), 'wb') as f:
+                with open(os.path.join(media_dir, filename), 'wb') as f:
                     f.write(image_data)
             
             return filename
         except Exception as e:
-            print(f"Error retrieving image {url}: {e}")
+            print(f"Error retrieving image {url}: {e}", file=sys.stderr)
             return url  # Return the original URL if download fails
     
     # STEP 1: Process and preserve code blocks FIRST (before any other processing)
@@ -107,7 +129,7 @@ def convert_markdown_to_html(text):
         language = match.group(1).strip() if match.group(1) else 'text'
         code = match.group(2)
         placeholder = f"CODE_BLOCK_PLACEHOLDER_{code_block_counter}"
-        code_blocks[placeholder] = format_code_block(code, language)
+        code_blocks[placeholder] = format_code_block(code, language, highlight, collapse_lines)
         code_block_counter += 1
         return placeholder
     
@@ -136,7 +158,7 @@ def convert_markdown_to_html(text):
                     return f'<img src="{filename}" alt="{alt_text}" style="max-width: 100%;">'
                 except Exception as e:
                     # If download fails, use the original URL but with warning text
-                    print(f"Failed to download image {url}: {e}")
+                    print(f"Failed to download image {url}: {e}", file=sys.stderr)
                     return f'<img src="{url}" alt="{alt_text}" style="max-width: 100%;"> (external image - may not display properly)'
             else:
                 # Local image - handle relative paths
@@ -305,32 +327,40 @@ def convert_markdown_to_html(text):
     
     # FINAL STEP: Restore Preview sections with both code display and rendered HTML
     for placeholder, content in preview_sections.items():
+        # Only HTML is rendered; other languages just show the code
+        rendered_html = f'''
+            <div class="preview-display">
+                <h5>Rendered Preview:</h5>
+                <div class="preview-result">
+                    {create_preview_frame(content['html'], media_dir)}
+                </div>
+            </div>''' if content['html'] is not None else ''
+        
         # Create a container with both the code display and the rendered HTML
         preview_html = f'''
         <div class="preview-container">
             <div class="code-display">
                 <h5>HTML Code:</h5>
                 {content['code']}
-            </div>
-            <div class="preview-display">
-                <h5>Rendered Preview:</h5>
-                <div class="preview-result">
-                    <iframe srcdoc="{content['html'].replace('"', '&quot;')}" style="width:100%; height:300px; border:none;"></iframe>
-                </div>
-            </div>
+            </div>{rendered_html}
         </div>
         '''
         text = text.replace(placeholder, preview_html)
     
     return text
 
-def format_code_block(code, language=None):
+def format_code_block(code, language=None, highlight=False, collapse_lines=0):
     """
     Format a code block with proper styling and line breaks.
     
     Args:
         code (str): The code to format
         language (str, optional): The programming language for syntax highlighting
+        highlight (bool): Emit Prism token spans now, with Pygments, instead
+            of leaving the block for Prism on the card; blocks Pygments can't
+            highlight are left for Prism either way
+        collapse_lines (int): Blocks with more lines show only their first
+            lines until "Show all" is clicked on the card; 0 never collapses
         
     Returns:
         str: The formatted HTML for the code block
@@ -377,58 +407,292 @@ def format_code_block(code, language=None):
     else:
         prism_language = 'plaintext'
     
-    # Add CSS to ensure proper styling and fallback behavior
-    css_for_code_block = """
-    <style>
-    /* Import JetBrains Mono font */
-    @import url('https://fonts.googleapis.com/css2?family=JetBrains+Mono:wght@400;500;600&display=swap');
-    
-    /* Fallback styling when Prism.js is not active */
-    .code-block {
-        background-color: #21252b; /* Darker outer background */
-        padding: 1px;
-        border-radius: 8px;
-        margin: 15px 0;
-        overflow-x: auto;
-    }
+    def render_pre(text, escaped_text):
+        highlighted_code = highlight_code(text, prism_language) if highlight else None
+        if highlighted_code is not None:
+            # The highlighted class tells the card's Prism loader to skip the block
+            return f'<pre class="language-{prism_language} highlighted"><code class="language-{prism_language} highlighted">{highlighted_code}</code></pre>'
+        
+        # The structure is: <pre><code class="language-{lang}">{escaped_code}</code></pre>
+        # This allows Prism.js to apply syntax highlighting while maintaining safety
+        return f'<pre><code class="language-{prism_language}">{escaped_text}</code></pre>'
+    
+    line_count = code.count('\n') + 1
+    if collapse_lines and line_count > collapse_lines:
+        excerpt = '\n'.join(code.split('\n', CODE_EXCERPT_LINES)[:min(CODE_EXCERPT_LINES, collapse_lines)])
+        # The whole block waits in a template, so the card only lays it out
+        # and highlights it once it is expanded
+        return f'''
+    <div class="code-block collapsed-code">
+        {render_pre(excerpt, encode_with_html_entities(excerpt))}
+        <template>{render_pre(code, escaped_code)}</template>
+        <button type="button" class="code-expand">Show all {line_count} lines</button>
+    </div>
+    '''
     
-    .code-block pre {
-        background-color: #282C34; /* Main code background */
-        padding: 15px;
-        border-radius: 7px;
-        margin: 0;
-        border: none;
-        box-shadow: none;
-        white-space: pre;
-        word-wrap: normal;
-        overflow-wrap: normal;
-    }
+    # Return the code block formatted for Prism.js
+    # The code block styling is part of the note type CSS, see get_card_styling
+    return f'''
+    <div class="code-block">
+        {render_pre(code, escaped_code)}
+    </div>
+    ''' 
+# The language class format_code_block gives each code block left for Prism
+CODE_LANGUAGE_PATTERN = re.compile(r'<pre><code class="language-([^"\s]+)">')
+
+def get_code_languages(fields_html):
+    """
+    Get the languages of the code blocks in a note.
     
-    .code-block pre code {
-        font-family: 'JetBrains Mono', 'Consolas', 'Monaco', monospace;
-        font-size: 14px;
-        color: #ABB2BF;
-        background: none;
-        padding: 0;
-        border: none;
-        display: block;
-        white-space: pre;
-        overflow-x: auto;
-    }
+    Args:
+        fields_html (iterable): The HTML of the note's fields
+        
+    Returns:
+        list: Sorted language classes, without plaintext and blocks
+            highlighted at conversion time
+    """
+    languages = set()
+    for field_html in fields_html:
+        languages.update(CODE_LANGUAGE_PATTERN.findall(field_html))
+    languages.discard('plaintext')
+    return sorted(languages)
+
+# Markup left out of the question summary: styles, scripts, the full copy
+# of collapsed code blocks and the preview buttons
+SUMMARY_SKIPPED_PATTERN = re.compile(
+    r'<(style|script|template|button)\b.*?</\1>', re.DOTALL | re.IGNORECASE
+)
+SUMMARY_LENGTH = 200
+
+# Markup left out of the question checksum, which reads the full copy of
+# collapsed code blocks instead of their excerpt
+CHECKSUM_SKIPPED_PATTERN = re.compile(r'<(style|script|button)\b.*?</\1>', re.DOTALL | re.IGNORECASE)
+COLLAPSED_EXCERPT_PATTERN = re.compile(r'<pre\b[^>]*>(?:(?!</pre>).)*</pre>\s*(?=<template>)', re.DOTALL)
+OPTION_FIELD_PATTERNS = {
+    'correct': re.compile(r'^CorrectOption\d*$'),
+    'incorrect': re.compile(r'^IncorrectOption\d*$'),
+}
+
+def get_plain_text(field_html, skipped_pattern=SUMMARY_SKIPPED_PATTERN):
+    """
+    Get the text of a converted field with whitespace collapsed.
     
-    /* Ensure Prism.js styles take precedence when loaded */
-    .code-block pre[class*="language-"] {
-        background-color: #282C34 !important;
-    }
-    </style>
+    Args:
+        field_html (str): The field's HTML
+        skipped_pattern (Pattern): Markup left out along with its contents
+        
+    Returns:
+        str: The field's plain text
+    """
+    text = skipped_pattern.sub(' ', field_html)
+    text = re.sub(r'<[^>]+>', ' ', text)
+    return ' '.join(html.unescape(text).split())
+
+def get_question_summary(question_html):
     """
+    Get the compact plain text of a question, for sorting and searching.
     
-    # Return the code block formatted for Prism.js
-    # The structure is: <pre><code class="language-{lang}">{escaped_code}</code></pre>
-    # This allows Prism.js to apply syntax highlighting while maintaining safety
-    return f'''
-    {css_for_code_block}
-    <div class="code-block">
-        <pre><code class="language-{prism_language}">{escaped_code}</code></pre>
+    Args:
+        question_html (str): The converted Question field
+        
+    Returns:
+        str: The question's text with whitespace collapsed, shortened to
+            SUMMARY_LENGTH characters
+    """
+    text = get_plain_text(question_html)
+    if len(text) > SUMMARY_LENGTH:
+        text = text[:SUMMARY_LENGTH - 1].rstrip() + '…'
+    return text
+
+def get_question_checksum(fields):
+    """
+    Get a checksum that identifies a question however it is formatted.
+    
+    Only the plain text of the question and options is read, with
+    whitespace collapsed and the order of the options ignored, so the same
+    question generated again gets the same checksum. Explanations and
+    previews are left out. Every note has these fields, so notes created
+    before checksums were introduced get the same checksum as new ones.
+    
+    Args:
+        fields (dict): Field name to HTML, as returned by
+            convert_sections_to_fields or read from a note; empty option
+            slots are ignored
+        
+    Returns:
+        str: Hex SHA-1 of the question text and sorted option texts
+    """
+    def get_text(field_html):
+        return get_plain_text(COLLAPSED_EXCERPT_PATTERN.sub('', field_html), CHECKSUM_SKIPPED_PATTERN)
+    
+    parts = [get_text(fields.get('Question', ''))]
+    for pattern in OPTION_FIELD_PATTERNS.values():
+        # Options are kept apart by kind, so swapping the correct answer matters
+        options = [get_text(field_html) for name, field_html in fields.items()
+                   if field_html and pattern.match(name)]
+        parts.append('\x1e'.join(sorted(options)))
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+def save_preview_document(html_content, media_dir=None):
+    """
+    Save the HTML document of a preview to the media folder.
+    
+    The file is named by a hash of its contents, so identical previews share
+    one file and an unchanged preview is never written again. The leading
+    underscore keeps Anki from deleting it as unused.
+    
+    Args:
+        html_content (str): The HTML document to render
+        media_dir (str, optional): The media folder, defaults to the media
+            folder of the open collection
+        
+    Returns:
+        str: The media file name
+    """
+    # Unlike srcdoc, a file needs its encoding and standards mode spelled out
+    doctype = re.match(r'\s*<!doctype[^>]*>', html_content, re.IGNORECASE)
+    if doctype:
+        document = f'{doctype.group(0)}\n<meta charset="utf-8">\n{html_content[doctype.end():]}'
+    else:
+        document = f'<!DOCTYPE html>\n<meta charset="utf-8">\n{html_content}'
+    data = document.encode('utf-8')
+    filename = f"{PREVIEW_MEDIA_PREFIX}{hashlib.sha1(data).hexdigest()[:16]}.html"
+    
+    if media_dir is None:
+        media_dir = get_media_dir()
+    path = os.path.join(media_dir, filename)
+    if not os.path.exists(path):
+        with open(path, 'wb') as f:
+            f.write(data)
+    return filename
+
+def create_preview_frame(html_content, media_dir=None):
+    """
+    Create the placeholder a rendered preview is started from.
+    
+    The card runtime turns the placeholder into a sandboxed iframe once it is
+    scrolled into view or clicked, so a card with several previews does not
+    load them all on every reveal.
+    
+    Args:
+        html_content (str): The HTML document to render
+        media_dir (str, optional): Folder the document is saved to, see
+            save_preview_document
+        
+    Returns:
+        str: HTML of the placeholder
+    """
+    try:
+        source = f'data-src="{save_preview_document(html_content, media_dir)}"'
+    except Exception as e:
+        # Without a media folder the document stays in the field
+        print(f"Error saving preview: {e}", file=sys.stderr)
+        source = f'data-srcdoc="{html.escape(html_content, quote=True)}"'
+    return (f'<div class="recall-preview" {source}>'
+            f'<button type="button" class="preview-run">Run preview</button></div>')
+
+def create_preview_display_html(language, code, html_to_render_in_iframe=None, highlight=False, media_dir=None,
+                                collapse_lines=0):
+    """Create a formatted HTML container for code display and optional rendered preview."""
+    
+    # Determine the title for the code block
+    code_block_title = f"{language.upper() if language else 'Code'} Source:" if language.lower() in ['html', 'css', 'javascript', 'js'] and html_to_render_in_iframe else f"{language.upper() if language else 'Code'} Preview:"
+
+    # Always include the code display part
+    formatted_code = format_code_block(code, language, highlight, collapse_lines)
+    code_display_html = f'''
+    <div class="code-display">
+        <h5>{code_block_title}</h5>
+        {formatted_code}
     </div>
-    ''' 
\ No newline at end of file
+    '''
+
+    # If it's a web language and there's content to render, add the iframe preview
+    if language.lower() in ['html', 'css', 'javascript', 'js'] and html_to_render_in_iframe:
+        rendered_preview_html = f'''
+        <div class="preview-display">
+            <h5>Rendered Preview:</h5>
+            <div class="preview-result">
+                {create_preview_frame(html_to_render_in_iframe, media_dir)}
+            </div>
+        </div>
+        '''
+        
+        return f'''
+        <!-- Preview HTML section for {language} -->
+        <div class="preview-container">
+            {code_display_html}
+            {rendered_preview_html}
+        </div>
+        '''
+    else:
+        # For other languages, or if no specific iframe content, just show the code
+        return f'''
+        <!-- Preview Code section for {language} -->
+        <div class="preview-container-code-only">
+            {code_display_html}
+        </div>
+        '''
+
+def get_field_sections(sections):
+    """
+    Get the markdown each note field is converted from.
+    
+    Args:
+        sections (dict): The output of parse_input
+        
+    Returns:
+        dict: Field name to a (markdown, preview_data) tuple, named as in the
+            RecallXY note types
+    """
+    field_sections = {'Question': (sections['question'], sections.get('question_preview'))}
+    correct_count = len(sections['correct_options'])
+    
+    for i, correct in enumerate(sections['correct_options'], 1):
+        suffix = str(i) if correct_count > 1 else ""
+        field_sections[f'CorrectOption{suffix}'] = (correct['option'], None)
+        field_sections[f'CorrectExplanation{suffix}'] = (correct['explanation'], correct.get('preview_data'))
+    
+    for i, incorrect in enumerate(sections['incorrect_options'], 1):
+        field_sections[f'IncorrectOption{i}'] = (incorrect['option'], None)
+        field_sections[f'IncorrectExplanation{i}'] = (incorrect['explanation'], incorrect.get('preview_data'))
+    
+    return field_sections
+
+def convert_sections_to_fields(sections, media_dir=None, previous_sections=None, highlight=False, collapse_lines=0):
+    """
+    Convert parsed question sections into the HTML of each note field.
+    
+    Args:
+        sections (dict): The output of parse_input
+        media_dir (str, optional): Folder external images are saved to
+        previous_sections (dict, optional): The sections the note was last
+            converted from; only fields whose section changed are converted
+        highlight (bool): Highlight code blocks now, see format_code_block
+        collapse_lines (int): Collapse longer code blocks, see format_code_block
+        
+    Returns:
+        dict: Field name to HTML, named as in the RecallXY note types
+    """
+    previous = get_field_sections(previous_sections) if previous_sections else {}
+    fields = {}
+    
+    for field_name, (markdown_text, preview_data) in get_field_sections(sections).items():
+        if previous.get(field_name) == (markdown_text, preview_data):
+            continue
+        
+        field_html = convert_markdown_to_html(markdown_text, media_dir, highlight, collapse_lines)
+        
+        # Add preview HTML after the content if it exists
+        if preview_data:
+            field_html += create_preview_display_html(
+                preview_data['language'],
+                preview_data['code'],
+                preview_data.get('html_to_render'),
+                highlight,
+                media_dir,
+                collapse_lines
+            )
+        fields[field_name] = field_html
+    
+    return fields
@@ -0,0 +1,121 @@
+"""
+Optional Python-side syntax highlighting for Recall Anki plugin.
+
+Code blocks can be tokenized with Pygments when a note is converted, so the
+reviewer has nothing left to highlight. The spans use Prism's token class
+names, so the One Dark Pro rules in the note type CSS color them the same
+way as code Prism highlights on the card. Neither Anki nor the add-on
+bundles Pygments, so this is meant for the command line converter run with
+Pygments installed; without it the highlight_code option is turned off,
+see get_config, and the code blocks are left for Prism.
+"""
+
+from functools import lru_cache
+
+try:
+    from pygments.lexers import get_lexer_by_name
+    from pygments.token import Token
+    from pygments.util import ClassNotFound
+except ImportError:
+    # Anki does not bundle Pygments
+    get_lexer_by_name = None
+
+# Languages with nothing to highlight
+PLAIN_LANGUAGES = {'text', 'plaintext', 'txt'}
+
+if get_lexer_by_name is not None:
+    # Prism class for each Pygments token type; subtypes not listed use the
+    # class of their closest listed parent, None means no span
+    TOKEN_CLASSES = {
+        Token: None,
+        Token.Comment: 'comment',
+        Token.Comment.Preproc: 'directive',
+        Token.Keyword: 'keyword',
+        Token.Keyword.Constant: 'boolean',
+        # Plain names stay bare text, as Prism leaves them
+        Token.Name: None,
+        Token.Name.Attribute: 'attr-name',
+        Token.Name.Builtin: 'builtin',
+        Token.Name.Class: 'class-name',
+        Token.Name.Constant: 'constant',
+        Token.Name.Decorator: 'decorator',
+        Token.Name.Entity: 'entity',
+        Token.Name.Exception: 'class-name',
+        Token.Name.Function: 'function',
+        Token.Name.Namespace: 'namespace',
+        Token.Name.Property: 'property',
+        Token.Name.Tag: 'tag',
+        Token.Name.Variable: 'variable',
+        Token.Literal: None,
+        Token.Literal.String: 'string',
+        Token.Literal.String.Regex: 'regex',
+        Token.Literal.Number: 'number',
+        Token.Operator: 'operator',
+        Token.Operator.Word: 'keyword',
+        Token.Punctuation: 'punctuation',
+    }
+
+def is_available():
+    """Check whether Pygments is installed."""
+    return get_lexer_by_name is not None
+
+def escape_code(text):
+    """Encode the characters format_code_block escapes in code."""
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+def get_token_class(token_type):
+    """Get the Prism class of a Pygments token type."""
+    while token_type not in TOKEN_CLASSES:
+        token_type = token_type.parent
+    return TOKEN_CLASSES[token_type]
+
+@lru_cache(maxsize=32)
+def get_lexer(language):
+    """Get the Pygments lexer for a Prism language class, or None."""
+    try:
+        # Keep the code exactly as written, including blank edge lines
+        return get_lexer_by_name(language, stripnl=False, ensurenl=False)
+    except ClassNotFound:
+        return None
+
+@lru_cache(maxsize=1024)
+def highlight_code(code, language):
+    """
+    Tokenize code into Prism token spans.
+
+    Results are cached, since question banks repeat the same snippets.
+
+    Args:
+        code (str): The code, unescaped
+        language (str): The Prism language class, e.g. "python"
+
+    Returns:
+        str: Escaped HTML with a <span class="token ..."> per token, or None
+            if Pygments is missing or does not know the language
+    """
+    if not is_available() or language in PLAIN_LANGUAGES:
+        return None
+    lexer = get_lexer(language)
+    if lexer is None:
+        return None
+
+    parts = []
+    current_class = None
+    current_text = []
+
+    def close_span():
+        text = escape_code(''.join(current_text))
+        parts.append(f'<span class="token {current_class}">{text}</span>' if current_class else text)
+
+    # Adjacent tokens of the same class share one span to keep fields small;
+    # whitespace stays outside the spans
+    for token_type, value in lexer.get_tokens(code):
+        token_class = get_token_class(token_type) if value.strip() else None
+        if token_class != current_class and current_text:
+            close_span()
+            current_text = []
+        current_class = token_class
+        current_text.append(value)
+    if current_text:
+        close_span()
+    return ''.join(parts)
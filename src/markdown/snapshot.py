@@ -0,0 +1,155 @@
+"""
+Static preview snapshots for Recall Anki plugin.
+
+Rendered previews can be captured once when a note is converted: the saved
+preview document is loaded offscreen in Qt WebEngine at a fixed viewport and
+saved as a PNG next to it. Cards then show the image, which also works on
+clients that don't run scripts, and only start the live iframe when asked
+to. Without Qt WebEngine installed previews are left as they are.
+"""
+
+import os
+import re
+
+try:
+    from PyQt6.QtCore import QBuffer, QEventLoop, QIODevice, QTimer, QUrl, Qt
+    from PyQt6.QtWidgets import QApplication
+    from PyQt6.QtWebEngineWidgets import QWebEngineView
+except ImportError:
+    # The command line runs without Qt unless PyQt6-WebEngine is installed
+    QWebEngineView = None
+
+from .converter import get_media_dir, PREVIEW_MEDIA_PREFIX
+
+# Viewport of the snapshot, the size of the preview iframe on the card
+SNAPSHOT_WIDTH = 800
+SNAPSHOT_HEIGHT = 300
+
+LOAD_TIMEOUT_MS = 10000
+# Time the preview's scripts get to run after loading
+SETTLE_MS = 300
+
+# Placeholders of previews saved as media, see create_preview_frame
+PREVIEW_PATTERN = re.compile(rf'<div class="recall-preview" data-src="({PREVIEW_MEDIA_PREFIX}[0-9a-f]+)\.html">')
+
+_application = None
+
+def is_available():
+    """Check whether Qt WebEngine is installed."""
+    return QWebEngineView is not None
+
+def get_application():
+    """Get the running QApplication, starting an offscreen one if there is none."""
+    global _application
+    application = QApplication.instance()
+    if application is None:
+        # Outside Anki there may be no display
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        if hasattr(os, 'geteuid') and os.geteuid() == 0:
+            # Chromium won't start its sandbox as root
+            os.environ.setdefault('QTWEBENGINE_DISABLE_SANDBOX', '1')
+        application = _application = QApplication(['recall'])
+    return application
+
+def create_snapshot_view():
+    """
+    Create a web view that renders previews without showing a window.
+
+    Returns:
+        QWebEngineView: The view, to pass to render_snapshot
+    """
+    get_application()
+    view = QWebEngineView()
+    view.setAttribute(Qt.WidgetAttribute.WA_DontShowOnScreen, True)
+    view.resize(SNAPSHOT_WIDTH, SNAPSHOT_HEIGHT)
+    view.show()
+    return view
+
+def wait(milliseconds, signal=None):
+    """Run the Qt event loop for a time, or until a signal fires."""
+    loop = QEventLoop()
+    if signal is not None:
+        signal.connect(loop.quit)
+    QTimer.singleShot(milliseconds, loop.quit)
+    loop.exec()
+    if signal is not None:
+        signal.disconnect(loop.quit)
+
+def render_snapshot(view, path):
+    """
+    Render an HTML file to a PNG image.
+
+    Must run on the Qt main thread.
+
+    Args:
+        view (QWebEngineView): A view made by create_snapshot_view
+        path (str): The HTML file
+
+    Returns:
+        bytes: The PNG image, or None if the file did not load
+    """
+    loaded = []
+    view.loadFinished.connect(loaded.append)
+    view.load(QUrl.fromLocalFile(os.path.abspath(path)))
+    wait(LOAD_TIMEOUT_MS, view.loadFinished)
+    view.loadFinished.disconnect(loaded.append)
+    if not (loaded and loaded[0]):
+        return None
+    wait(SETTLE_MS)
+
+    buffer = QBuffer()
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    # Quality 0 is the strongest PNG compression
+    view.grab().save(buffer, 'PNG', 0)
+    return bytes(buffer.data())
+
+def add_preview_snapshots(fields, media_dir=None, view=None):
+    """
+    Snapshot the previews in converted note fields.
+
+    Each preview placeholder gets an <img class="preview-snapshot"> of its
+    document, saved as _recall_preview_<hash>.png next to the document.
+    Snapshots already in the media folder are reused. Must run on the Qt
+    main thread.
+
+    Args:
+        fields (dict): Field name to HTML, as made by
+            convert_sections_to_fields; changed in place
+        media_dir (str, optional): The media folder, defaults to the media
+            folder of the open collection
+        view (QWebEngineView, optional): View to render with, to reuse one
+            across many notes; a new one is made and closed otherwise
+
+    Returns:
+        int: Number of previews given a snapshot
+    """
+    if not is_available() or not any(PREVIEW_PATTERN.search(field_html) for field_html in fields.values()):
+        return 0
+    if media_dir is None:
+        media_dir = get_media_dir()
+    own_view = view is None
+    if own_view:
+        view = create_snapshot_view()
+    added = 0
+
+    def add_snapshot(match):
+        nonlocal added
+        name = f"{match.group(1)}.png"
+        path = os.path.join(media_dir, name)
+        if not os.path.exists(path):
+            image = render_snapshot(view, os.path.join(media_dir, f"{match.group(1)}.html"))
+            if image is None:
+                return match.group(0)
+            with open(path, 'wb') as f:
+                f.write(image)
+        added += 1
+        return f'{match.group(0)}<img class="preview-snapshot" src="{name}" alt="Preview">'
+
+    try:
+        for field_name, field_html in fields.items():
+            fields[field_name] = PREVIEW_PATTERN.sub(add_snapshot, field_html)
+    finally:
+        if own_view:
+            view.close()
+            view.deleteLater()
+    return added
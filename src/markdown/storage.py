@@ -0,0 +1,49 @@
+"""
+Storage of the original markdown in notes for Recall Anki plugin.
+
+The markdown is kept compressed in a hidden field so a note can be edited
+again later. Base64 keeps it from being read as HTML by Anki's editor.
+"""
+
+import base64
+import binascii
+import zlib
+
+PREFIX = "zlib:"
+
+def encode_markdown(text):
+    """
+    Compress markdown for storing in a note field.
+    
+    Args:
+        text (str): The markdown of a question
+        
+    Returns:
+        str: The field value
+    """
+    compressed = zlib.compress(text.encode('utf-8'), 9)
+    return PREFIX + base64.b64encode(compressed).decode('ascii')
+
+def decode_markdown(value):
+    """
+    Get the markdown back from a note field.
+    
+    Args:
+        value (str): The field value written by encode_markdown
+        
+    Returns:
+        str: The markdown, or an empty string if there is none
+        
+    Raises:
+        ValueError: If the field value is damaged
+    """
+    value = (value or '').strip()
+    if not value:
+        return ''
+    if not value.startswith(PREFIX):
+        # Stored uncompressed, e.g. typed in by hand
+        return value
+    try:
+        return zlib.decompress(base64.b64decode(value[len(PREFIX):])).decode('utf-8')
+    except (binascii.Error, zlib.error, UnicodeDecodeError) as e:
+        raise ValueError(f"Stored markdown is damaged: {e}")
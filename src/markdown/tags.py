@@ -0,0 +1,81 @@
+"""
+Content tags for Recall Anki plugin.
+
+What a question contains is known once it is converted: the languages of
+its code blocks, its previews and images, and its number of options. Notes
+carry this as hierarchical tags such as recall::lang::python, so searches
+and filtered decks use the tag index instead of searching the field HTML.
+"""
+
+import re
+
+# Language class of every code block, highlighted at conversion time or not
+CODE_BLOCK_LANGUAGE_PATTERN = re.compile(r'<code class="language-([^"\s]+)')
+PREVIEW_PATTERN = re.compile(r'<div class="recall-preview"')
+# Images of the question, not the snapshots of its previews
+IMAGE_PATTERN = re.compile(r'<img\b(?![^>]*class="preview-snapshot")')
+
+# Fields with converted HTML, as opposed to the hidden fields
+CONTENT_FIELD_PATTERN = re.compile(r'^(?:Question|(?:Correct|Incorrect)(?:Option|Explanation)\d*)$')
+
+TAG_PREFIX = "recall::"
+LANGUAGE_TAG_PREFIX = f"{TAG_PREFIX}lang::"
+IMAGES_TAG_PREFIX = f"{TAG_PREFIX}images::"
+OPTIONS_TAG_PREFIX = f"{TAG_PREFIX}options::"
+PREVIEW_TAG = f"{TAG_PREFIX}has_preview"
+
+def get_content_tags(fields):
+    """
+    Get the tags describing a converted note.
+
+    Args:
+        fields (dict): Field name to HTML; empty option slots are not counted
+
+    Returns:
+        list: Tags such as recall::lang::python, recall::has_preview,
+            recall::images::2 and recall::options::correct::1
+    """
+    contents = [field_html for name, field_html in fields.items()
+                if field_html and CONTENT_FIELD_PATTERN.match(name)]
+    languages = set()
+    previews = images = 0
+    for field_html in contents:
+        languages.update(CODE_BLOCK_LANGUAGE_PATTERN.findall(field_html))
+        previews += len(PREVIEW_PATTERN.findall(field_html))
+        # Collapsed code keeps a second copy of the block in a <template>,
+        # which holds code only, so images are counted once
+        images += len(IMAGE_PATTERN.findall(field_html))
+    languages.discard('plaintext')
+
+    tags = [f"{LANGUAGE_TAG_PREFIX}{language}" for language in sorted(languages)]
+    if previews:
+        tags.append(PREVIEW_TAG)
+    if images:
+        tags.append(f"{IMAGES_TAG_PREFIX}{images}")
+    for kind in ("correct", "incorrect"):
+        count = sum(1 for name, field_html in fields.items()
+                    if field_html and re.match(rf'^{kind.capitalize()}Option\d*$', name))
+        tags.append(f"{OPTIONS_TAG_PREFIX}{kind}::{count}")
+    return tags
+
+def is_content_tag(tag):
+    """Check whether a tag is one of the tags get_content_tags makes."""
+    tag = tag.lower()
+    return tag == PREVIEW_TAG or tag.startswith((LANGUAGE_TAG_PREFIX, IMAGES_TAG_PREFIX, OPTIONS_TAG_PREFIX))
+
+def replace_content_tags(tags, content_tags):
+    """
+    Replace the content tags of a note, keeping the tags users added.
+
+    Args:
+        tags (list): The note's tags
+        content_tags (list): The new content tags
+
+    Returns:
+        list: The note's tags with the new content tags
+    """
+    return [tag for tag in tags if not is_content_tag(tag)] + list(content_tags)
+
+def tags_differ(tags, other_tags):
+    """Check whether two tag lists differ, ignoring order and case as Anki does."""
+    return {tag.lower() for tag in tags} != {tag.lower() for tag in other_tags}
@@ -3,6 +3,8 @@ UI components for Recall Anki plugin.
 """
 
 # Use relative import
-from .dialog import RecallInputDialog, show_recall_input_dialog
+from .dialog import RecallInputDialog, show_recall_input_dialog, show_edit_recall_note_dialog
+from .folder_import import FolderImportDialog, show_folder_import_dialog
 
-__all__ = ['RecallInputDialog', 'show_recall_input_dialog'] 
\ No newline at end of file
+__all__ = ['RecallInputDialog', 'show_recall_input_dialog', 'show_edit_recall_note_dialog',
+           'FolderImportDialog', 'show_folder_import_dialog']
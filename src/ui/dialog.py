@@ -5,22 +5,37 @@ Dialog UI for Recall Anki plugin.
 from aqt import mw
 from aqt.qt import *
 from anki.notes import Note
-import re
 
-from ..markdown.converter import convert_markdown_to_html, format_code_block
-from ..card_templates.note_types import create_recall_note_type
+from ..markdown.converter import (
+    convert_sections_to_fields, create_preview_display_html, get_code_languages, get_question_summary,
+    get_question_checksum
+)
+from ..markdown.snapshot import add_preview_snapshots
+from ..markdown.parser import parse_input
+from ..markdown.storage import encode_markdown, decode_markdown
+from ..markdown.tags import get_content_tags, replace_content_tags, tags_differ
+from ..card_templates.note_types import (
+    get_option_counts, get_slot_counts, get_slot_fields, MARKDOWN_FIELD, LANGUAGES_FIELD, SUMMARY_FIELD,
+    CHECKSUM_FIELD
+)
+from ..card_templates.registry import get_note_type_registry
+from ..importer.duplicates import get_duplicate_index
+from ..utils.config import get_config
 
 class RecallInputDialog(QDialog):
-    """Dialog for creating recall questions"""
+    """Dialog for creating recall questions, or editing one when given a note"""
     
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, note=None):
         super().__init__(parent)
+        self.note = note
         self.setup_ui()
         self.load_last_deck()  # Load last selected deck
+        if note is not None:
+            self.load_note()
         
     def setup_ui(self):
         """Set up the UI components"""
-        self.setWindowTitle("Create Recall Question")
+        self.setWindowTitle("Edit Recall Question" if self.note is not None else "Create Recall Question")
         self.setMinimumWidth(800)
         
         layout = QVBoxLayout(self)
@@ -34,6 +49,11 @@ class RecallInputDialog(QDialog):
         deck_layout.addWidget(self.deck_combo)
         layout.addLayout(deck_layout)
         
+        # Edited notes stay in the deck their card is in
+        if self.note is not None:
+            deck_label.hide()
+            self.deck_combo.hide()
+        
         # Input area
         self.input_text = QPlainTextEdit()
         self.input_text.setPlaceholderText("""#### Question 
@@ -64,7 +84,7 @@ ___""")
         
         # Buttons
         button_layout = QHBoxLayout()
-        self.create_button = QPushButton("Create Card")
+        self.create_button = QPushButton("Save Changes" if self.note is not None else "Create Card")
         self.create_button.clicked.connect(self.create_card)
         self.cancel_button = QPushButton("Cancel")
         self.cancel_button.clicked.connect(self.reject)
@@ -96,165 +116,23 @@ ___""")
         deck_id = self.deck_combo.currentData()
         mw.pm.profile['recall_last_deck'] = deck_id
 
+    def load_note(self):
+        """Fill the input with the markdown the edited note was created from."""
+        try:
+            self.input_text.setPlainText(decode_markdown(self.note[MARKDOWN_FIELD]))
+        except ValueError as e:
+            QMessageBox.warning(self, "Edit Recall Question", str(e))
+
     def parse_input(self):
         """Parse the input text into structured data for card creation."""
-        text = self.input_text.toPlainText()
-        
-        # First, clean up any variations of the Explanation header
-        text = re.sub(r'##### Explanation.*?\n', '##### Explanation\n', text)
-        
-        # STEP 1: Protect code blocks from interfering with section parsing
-        # Store code blocks with placeholders to prevent regex confusion
-        code_blocks = {}
-        code_block_counter = 0
-        
-        def extract_code_blocks(match):
-            nonlocal code_block_counter
-            placeholder = f"__CODE_BLOCK_PLACEHOLDER_{code_block_counter}__"
-            code_blocks[placeholder] = match.group(0)
-            code_block_counter += 1
-            return placeholder
-        
-        # Extract all code blocks (including those with nested backticks)
-        # This pattern handles multi-line code blocks with any language specifier
-        # Flexible pattern: optional whitespace after ```, optional language, flexible content
-        code_block_pattern = r'```\s*(\w*)\s*([\s\S]*?)```'
-        text_with_placeholders = re.sub(code_block_pattern, extract_code_blocks, text)
-        
-        # STEP 2: Extract main sections using the protected text
-        sections = {}
-        
-        # Extract question section - now using protected text
-        question_match = re.search(r'#### Question\s*\n([\s\S]*?)(?=\n(?:___|---)|\Z)', text_with_placeholders, re.DOTALL)
-        if question_match:
-            question_content = question_match.group(1).strip()
-            
-            # Restore code blocks in question content
-            for placeholder, original in code_blocks.items():
-                question_content = question_content.replace(placeholder, original)
-            
-            sections['question'] = question_content
-            
-            # Check for preview section in question using the original content
-            # Updated regex to handle edge cases better with flexible code block pattern
-            preview_regex = r'#### Preview\s*\n(```\s*\w*\s*[\s\S]*?```)'
-            preview_match = re.search(preview_regex, question_content, re.DOTALL)
-            
-            if preview_match:
-                full_code_block = preview_match.group(1)
-                # Extract language and content from the code block with flexible pattern
-                code_block_match = re.match(r'```\s*(\w*)\s*([\s\S]*?)```', full_code_block, re.DOTALL)
-                if code_block_match:
-                    language = code_block_match.group(1).lower().strip() if code_block_match.group(1) else 'html'
-                    code_content = code_block_match.group(2).rstrip()  # Remove trailing whitespace but preserve internal structure
-                    
-                    sections['question_preview'] = {
-                        'language': language,
-                        'code': code_content
-                    }
-                    # For HTML/CSS/JS, we also want to specify the content for iframe rendering
-                    if language in ['html', 'css', 'javascript', 'js']:
-                        sections['question_preview']['html_to_render'] = code_content
-        
-        # Initialize option lists
-        sections['correct_options'] = []
-        sections['incorrect_options'] = []
-        
-        # STEP 3: Split by section markers using protected text
-        # Find all section markers
-        section_markers = list(re.finditer(r'\n(?:---|___)\n', text_with_placeholders))
-        marker_positions = [m.start() for m in section_markers]
-        
-        # Add beginning and end positions
-        marker_positions = [-1] + marker_positions + [len(text_with_placeholders)]
-        
-        # Extract sections between markers
-        option_sections = []
-        for i in range(len(marker_positions) - 1):
-            start = marker_positions[i]
-            end = marker_positions[i+1]
-            
-            # Skip the marker itself
-            if start >= 0:
-                start = marker_positions[i] + len(section_markers[i-1].group(0)) if i > 0 else start + 5
-            else:
-                start = 0
-                
-            section = text_with_placeholders[start:end].strip()
-            
-            # Only include sections that have option headers
-            if section and ('#### Correct Option' in section or '#### Incorrect Option' in section):
-                # Restore code blocks in this section
-                for placeholder, original in code_blocks.items():
-                    section = section.replace(placeholder, original)
-                option_sections.append(section)
-        
-        # STEP 4: Parse each option section
-        for section in option_sections:
-            # Determine if this is a correct or incorrect option
-            is_correct = '#### Correct Option' in section
-            
-            # Extract option text - be more careful about where explanation starts
-            option_match = re.search(
-                r'#### (?:Correct|Incorrect) Option\s*\n([\s\S]*?)(?=\n##### Explanation|\Z)',
-                section, re.DOTALL
-            )
-            
-            # Extract explanation text - be more careful about where preview starts
-            explanation_match = re.search(
-                r'##### Explanation\s*\n([\s\S]*?)(?=\n#### Preview|\Z)',
-                section, re.DOTALL
-            )
-            
-            # Extract preview if it exists - handle edge cases better
-            preview_match = re.search(
-                r'#### Preview\s*\n(```\s*\w*\s*[\s\S]*?```)',
-                section, re.DOTALL
-            )
-            
-            if option_match and explanation_match:
-                option_text = option_match.group(1).strip()
-                explanation_text = explanation_match.group(1).strip()
-                
-                option_preview_data = None
-                if preview_match:
-                    full_code_block = preview_match.group(1)
-                    # Extract language and content from the code block with flexible pattern
-                    code_block_match = re.match(r'```\s*(\w*)\s*([\s\S]*?)```', full_code_block, re.DOTALL)
-                    if code_block_match:
-                        language = code_block_match.group(1).lower().strip() if code_block_match.group(1) else 'html'
-                        code_content = code_block_match.group(2).rstrip()  # Remove trailing whitespace
-                        
-                        option_preview_data = {
-                            'language': language,
-                            'code': code_content
-                        }
-                        # For HTML/CSS/JS, specify content for iframe rendering
-                        if language in ['html', 'css', 'javascript', 'js']:
-                            option_preview_data['html_to_render'] = code_content
-                
-                option_data = {
-                    'option': option_text,
-                    'explanation': explanation_text,
-                    'preview_data': option_preview_data
-                }
-                
-                if is_correct:
-                    sections['correct_options'].append(option_data)
-                else:
-                    sections['incorrect_options'].append(option_data)
-        
-        # Validate that we have at least some content
-        if not sections.get('question'):
-            raise ValueError("No question section found. Please ensure your input starts with '#### Question'")
-        
-        if not sections['correct_options'] and not sections['incorrect_options']:
-            raise ValueError("No option sections found. Please ensure you have at least one '#### Correct Option' or '#### Incorrect Option' section")
-            
-        return sections
+        return parse_input(self.input_text.toPlainText())
 
     def create_card(self):
         """Create a new card based on the parsed input."""
+        if self.note is not None:
+            self.save_note()
+            return
+        
         try:
             sections = self.parse_input()
             
@@ -267,85 +145,48 @@ ___""")
             # Save the selected deck before creating the card
             self.save_last_deck()
             
+            config = get_config()
+            fields = convert_sections_to_fields(sections, highlight=config['highlight_code'],
+                                                collapse_lines=config['collapse_code_lines'])
+            
+            # Questions generated again are caught before previews are snapshotted
+            checksum = get_question_checksum(fields)
+            duplicate_index = get_duplicate_index(mw.col)
+            if duplicate_index.find(checksum) is not None:
+                answer = QMessageBox.question(
+                    self, "Duplicate Question",
+                    "A Recall note with the same question and options already exists. Add it anyway?"
+                )
+                if answer != QMessageBox.StandardButton.Yes:
+                    return
+            
             # Count correct and incorrect options
             correct_count = len(sections['correct_options'])
             incorrect_count = len(sections['incorrect_options'])
             
-            # Create note with appropriate model name
-            if correct_count == 1 and incorrect_count == 1:
-                model_name = "Recall"
-            else:
-                model_name = f"Recall{correct_count}{incorrect_count}"
-                
-            model = mw.col.models.by_name(model_name)
-            if not model:
-                create_recall_note_type(correct_count, incorrect_count)
-                model = mw.col.models.by_name(model_name)
+            # Create note with appropriate model
+            slot_counts = get_slot_counts(correct_count, incorrect_count)
+            model = get_note_type_registry(mw.col).get_model(correct_count, incorrect_count)
                 
             note = Note(mw.col, model)
             
             # Fill note fields with converted HTML
-            question_html = convert_markdown_to_html(sections['question'])
-            
-            # Add question preview section if exists
-            if 'question_preview' in sections:
-                preview_data = sections['question_preview']
-                # Pass language, code, and html_to_render (if available)
-                preview_html_content = self.create_general_preview_display_html(
-                    preview_data['language'],
-                    preview_data['code'],
-                    preview_data.get('html_to_render') 
-                )
-                question_html += preview_html_content
-            
-            note['Question'] = question_html
-            
-            # Add correct options
-            for i, correct in enumerate(sections['correct_options'], 1):
-                suffix = str(i) if correct_count > 1 else ""
-                
-                # Convert option and explanation to HTML
-                option_html = convert_markdown_to_html(correct['option'])
-                explanation_html = convert_markdown_to_html(correct['explanation'])
-                
-                # Add preview HTML if it exists
-                if correct.get('preview_data'):
-                    preview_data = correct['preview_data']
-                    # Create a custom preview HTML section
-                    preview_html_content = self.create_general_preview_display_html(
-                        preview_data['language'],
-                        preview_data['code'],
-                        preview_data.get('html_to_render')
-                    )
-                    # Append this to the explanation
-                    explanation_html += preview_html_content
-                
-                note[f'CorrectOption{suffix}'] = option_html
-                note[f'CorrectExplanation{suffix}'] = explanation_html
-            
-            # Add incorrect options
-            for i, incorrect in enumerate(sections['incorrect_options'], 1):
-                # Convert option and explanation to HTML
-                option_html = convert_markdown_to_html(incorrect['option'])
-                explanation_html = convert_markdown_to_html(incorrect['explanation'])
-                
-                # Add preview HTML if it exists
-                if incorrect.get('preview_data'):
-                    preview_data = incorrect['preview_data']
-                    # Create a custom preview HTML section
-                    preview_html_content = self.create_general_preview_display_html(
-                        preview_data['language'],
-                        preview_data['code'],
-                        preview_data.get('html_to_render')
-                    )
-                    # Append this to the explanation
-                    explanation_html += preview_html_content
-                
-                note[f'IncorrectOption{i}'] = option_html
-                note[f'IncorrectExplanation{i}'] = explanation_html
+            if config['preview_snapshots']:
+                add_preview_snapshots(fields)
+            fields = get_slot_fields(fields, correct_count, incorrect_count, slot_counts)
+            fields[LANGUAGES_FIELD] = ' '.join(get_code_languages(fields.values()))
+            fields[SUMMARY_FIELD] = get_question_summary(fields['Question'])
+            fields[MARKDOWN_FIELD] = encode_markdown(self.input_text.toPlainText())
+            fields[CHECKSUM_FIELD] = checksum
+            # Note types of older versions lack the newest hidden fields until upgraded
+            for field_name in note.keys():
+                if field_name in fields:
+                    note[field_name] = fields[field_name]
+            note.tags = get_content_tags(fields)
             
             # Add note to selected deck
             mw.col.add_note(note, deck_id)
+            duplicate_index.add(checksum, note.id)
             mw.reset()
             
             QMessageBox.information(self, "Success", f"Card created successfully with {correct_count} correct and {incorrect_count} incorrect options!")
@@ -356,52 +197,86 @@ ___""")
             error_details = traceback.format_exc()
             QMessageBox.critical(self, "Error", f"Failed to create card: {str(e)}\n\nDetails:\n{error_details}")
 
-    def create_general_preview_display_html(self, language, code, html_to_render_in_iframe=None):
-        """Create a formatted HTML container for code display and optional rendered preview."""
-        
-        # Determine the title for the code block
-        code_block_title = f"{language.upper() if language else 'Code'} Source:" if language.lower() in ['html', 'css', 'javascript', 'js'] and html_to_render_in_iframe else f"{language.upper() if language else 'Code'} Preview:"
-
-        # Always include the code display part
-        formatted_code = format_code_block(code, language)
-        code_display_html = f'''
-        <div class="code-display">
-            <h5>{code_block_title}</h5>
-            {formatted_code}
-        </div>
-        '''
-
-        # If it's a web language and there's content to render, add the iframe preview
-        if language.lower() in ['html', 'css', 'javascript', 'js'] and html_to_render_in_iframe:
-            # Sanitize for iframe's srcdoc
-            sanitized_html_for_iframe = html_to_render_in_iframe.replace('"', '&quot;')
+    def save_note(self):
+        """Write the edited markdown back to the note, reconverting only changed sections."""
+        try:
+            text = self.input_text.toPlainText()
+            sections = parse_input(text)
+            
+            try:
+                previous_sections = parse_input(decode_markdown(self.note[MARKDOWN_FIELD]))
+            except ValueError:
+                # Without usable stored markdown every section is converted
+                previous_sections = None
             
-            rendered_preview_html = f'''
-            <div class="preview-display">
-                <h5>Rendered Preview:</h5>
-                <div class="preview-result">
-                    <iframe srcdoc="{sanitized_html_for_iframe}" style="width:100%; height:300px; border:none;"></iframe>
-                </div>
-            </div>
-            '''
+            counts = (len(sections['correct_options']), len(sections['incorrect_options']))
+            slot_counts = get_option_counts(self.note.keys())
+            # Notes of the generic note type can use any number of its slots
+            if counts != slot_counts and get_slot_counts(*counts) != slot_counts:
+                QMessageBox.critical(self, "Error",
+                                     "The note type of this note has no fields for that number of "
+                                     "correct and incorrect options. Create a new question instead.")
+                return
+            
+            config = get_config()
+            fields = convert_sections_to_fields(sections, previous_sections=previous_sections,
+                                                highlight=config['highlight_code'],
+                                                collapse_lines=config['collapse_code_lines'])
+            if config['preview_snapshots']:
+                add_preview_snapshots(fields)
+            fields = get_slot_fields(fields, *counts, slot_counts)
+            fields[MARKDOWN_FIELD] = encode_markdown(text)
+            # Unchanged fields keep their code blocks, so look at all of them
+            note_fields = {name: fields.get(name, self.note[name]) for name in self.note.keys()}
+            fields[LANGUAGES_FIELD] = ' '.join(get_code_languages(note_fields.values()))
+            if 'Question' in fields:
+                fields[SUMMARY_FIELD] = get_question_summary(fields['Question'])
+            fields[CHECKSUM_FIELD] = get_question_checksum(note_fields)
+            # Note types of older versions lack the newest hidden fields until upgraded
+            fields = {name: field_html for name, field_html in fields.items() if name in note_fields}
+            if CHECKSUM_FIELD in fields and self.note[CHECKSUM_FIELD] != fields[CHECKSUM_FIELD]:
+                duplicate_index = get_duplicate_index(mw.col)
+                duplicate_index.discard(self.note[CHECKSUM_FIELD], self.note.id)
+                duplicate_index.add(fields[CHECKSUM_FIELD], self.note.id)
+            changed = [name for name, field_html in fields.items() if self.note[name] != field_html]
+            for field_name in changed:
+                self.note[field_name] = fields[field_name]
+            tags = replace_content_tags(self.note.tags, get_content_tags(note_fields))
+            if tags_differ(tags, self.note.tags):
+                self.note.tags = tags
+                changed.append('tags')
+            
+            if changed:
+                mw.col.update_note(self.note)
+                mw.reset()
+            self.accept()
             
-            return f'''
-            <!-- Preview HTML section for {language} -->
-            <div class="preview-container">
-                {code_display_html}
-                {rendered_preview_html}
-            </div>
-            '''
-        else:
-            # For other languages, or if no specific iframe content, just show the code
-            return f'''
-            <!-- Preview Code section for {language} -->
-            <div class="preview-container-code-only">
-                {code_display_html}
-            </div>
-            '''
+        except Exception as e:
+            import traceback
+            error_details = traceback.format_exc()
+            QMessageBox.critical(self, "Error", f"Failed to save note: {str(e)}\n\nDetails:\n{error_details}")
+
+    def create_general_preview_display_html(self, language, code, html_to_render_in_iframe=None):
+        """Create a formatted HTML container for code display and optional rendered preview."""
+        return create_preview_display_html(language, code, html_to_render_in_iframe)
 
 def show_recall_input_dialog():
     """Show the recall input dialog."""
     dialog = RecallInputDialog(mw)
-    dialog.exec() 
\ No newline at end of file
+    dialog.exec()
+
+def show_edit_recall_note_dialog(note, parent=None):
+    """
+    Show the recall input dialog for editing an existing note.
+    
+    Args:
+        note (Note): The note to edit
+        parent (QWidget, optional): Parent window, defaults to the main window
+    """
+    if MARKDOWN_FIELD not in note.keys() or not note[MARKDOWN_FIELD].strip():
+        QMessageBox.information(parent or mw, "Edit Recall Note",
+                                "This note has no stored markdown. Only Recall notes created "
+                                "or imported with this version can be edited.")
+        return
+    dialog = RecallInputDialog(parent or mw, note)
+    dialog.exec()
\ No newline at end of file
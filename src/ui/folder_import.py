@@ -0,0 +1,295 @@
+"""
+Folder import dialog for Recall Anki plugin.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from aqt import mw
+from aqt.qt import *
+
+from ..importer.batch import find_markdown_files, get_source_name, convert_file, create_executor
+from ..importer.writer import NoteWriter, load_source_index
+from ..markdown.snapshot import add_preview_snapshots, create_snapshot_view, is_available as can_snapshot
+from ..utils.config import get_config
+
+class FolderImportDialog(QDialog):
+    """Dialog for importing a folder of markdown question banks"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.config = get_config()
+        self.executor = None
+        self.futures = {}
+        self.writer = None
+        self.snapshot_view = None
+        self.snapshotting = False
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.collect_results)
+        self.setup_ui()
+
+    def setup_ui(self):
+        """Set up the UI components"""
+        self.setWindowTitle("Import Recall Folder")
+        self.setMinimumWidth(700)
+
+        layout = QVBoxLayout(self)
+
+        # Folder selector
+        folder_layout = QHBoxLayout()
+        folder_label = QLabel("Folder:")
+        self.folder_edit = QLineEdit()
+        self.browse_button = QPushButton("Browse…")
+        self.browse_button.clicked.connect(self.browse_folder)
+        folder_layout.addWidget(folder_label)
+        folder_layout.addWidget(self.folder_edit)
+        folder_layout.addWidget(self.browse_button)
+        layout.addLayout(folder_layout)
+
+        # Deck selector
+        deck_layout = QHBoxLayout()
+        deck_label = QLabel("Select Deck:")
+        self.deck_combo = QComboBox()
+        self.populate_deck_list()
+        deck_layout.addWidget(deck_label)
+        deck_layout.addWidget(self.deck_combo)
+        layout.addLayout(deck_layout)
+
+        # Import settings
+        settings_layout = QHBoxLayout()
+        self.chunk_spin = QSpinBox()
+        self.chunk_spin.setRange(1, 100000)
+        self.chunk_spin.setValue(self.config['import_chunk_size'])
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(0, 64)
+        self.workers_spin.setSpecialValueText("Auto")
+        self.workers_spin.setValue(self.config['import_workers'])
+        settings_layout.addWidget(QLabel("Notes per write:"))
+        settings_layout.addWidget(self.chunk_spin)
+        settings_layout.addWidget(QLabel("Workers:"))
+        settings_layout.addWidget(self.workers_spin)
+        layout.addLayout(settings_layout)
+
+        # Questions deleted from the files since the last import
+        self.remove_missing_check = QCheckBox("Remove notes whose question was deleted from the folder")
+        layout.addWidget(self.remove_missing_check)
+        # Questions generated again, matched by their normalized text
+        self.skip_duplicates_check = QCheckBox("Skip questions that are already in the collection")
+        self.skip_duplicates_check.setChecked(True)
+        layout.addWidget(self.skip_duplicates_check)
+
+        # Progress
+        self.progress_bar = QProgressBar()
+        layout.addWidget(self.progress_bar)
+        self.status_label = QLabel("Choose a folder of .md files to import.")
+        layout.addWidget(self.status_label)
+
+        # Per-file errors
+        self.error_text = QPlainTextEdit()
+        self.error_text.setReadOnly(True)
+        self.error_text.setPlaceholderText("Errors will be listed here")
+        layout.addWidget(self.error_text)
+
+        # Buttons
+        button_layout = QHBoxLayout()
+        self.import_button = QPushButton("Import")
+        self.import_button.clicked.connect(self.start_import)
+        self.cancel_button = QPushButton("Close")
+        self.cancel_button.clicked.connect(self.reject)
+
+        button_layout.addWidget(self.import_button)
+        button_layout.addWidget(self.cancel_button)
+        layout.addLayout(button_layout)
+
+    def populate_deck_list(self):
+        """Populate the deck selector with all available decks and subdecks."""
+        decks = mw.col.decks.all_names_and_ids()
+        for deck in decks:
+            deck_name = deck.name
+            indent = deck_name.count("::") * 4  # 4 spaces per level
+            display_name = " " * indent + deck_name.split("::")[-1]
+            self.deck_combo.addItem(display_name, deck.id)
+
+        last_deck_id = mw.pm.profile.get('recall_last_deck', None)
+        if last_deck_id is not None:
+            index = self.deck_combo.findData(last_deck_id)
+            if index >= 0:
+                self.deck_combo.setCurrentIndex(index)
+
+    def browse_folder(self):
+        """Let the user pick the folder to import."""
+        folder = QFileDialog.getExistingDirectory(self, "Select Recall Folder", self.folder_edit.text())
+        if folder:
+            self.folder_edit.setText(folder)
+
+    def start_import(self):
+        """Scan the folder and submit every markdown file for conversion."""
+        folder = self.folder_edit.text().strip()
+        if not folder or not os.path.isdir(folder):
+            QMessageBox.critical(self, "Error", "Please select a folder")
+            return
+
+        deck_id = self.deck_combo.currentData()
+        if not deck_id:
+            QMessageBox.critical(self, "Error", "Please select a deck")
+            return
+
+        paths = find_markdown_files(folder)
+        if not paths:
+            QMessageBox.information(self, "Import Recall Folder", "No .md files found in the selected folder.")
+            return
+
+        self.import_button.setEnabled(False)
+        self.cancel_button.setText("Cancel")
+        self.error_text.clear()
+        self.progress_bar.setRange(0, len(paths))
+        self.progress_bar.setValue(0)
+
+        self.folder = folder
+        self.files_done = 0
+        self.error_count = 0
+        self.start_time = time.monotonic()
+        self.media_dir = mw.col.media.dir()
+        self.writer = NoteWriter(mw.col, deck_id, self.chunk_spin.value(), load_source_index(mw.col, deck_id),
+                                 self.skip_duplicates_check.isChecked())
+        self.executor = create_executor(self.workers_spin.value())
+        if self.config['preview_snapshots'] and can_snapshot():
+            self.snapshot_view = create_snapshot_view()
+        self.submit(paths)
+        self.timer.start(100)
+
+    def submit(self, paths):
+        """Submit files to the executor."""
+        for path in paths:
+            source_name = get_source_name(path, self.folder)
+            future = self.executor.submit(convert_file, path, self.media_dir,
+                                          source_name, self.writer.known_hashes(source_name),
+                                          self.config['highlight_code'], self.config['collapse_code_lines'])
+            self.futures[future] = path
+
+    def collect_results(self):
+        """Hand finished conversions to the writer and update progress."""
+        done = [future for future in self.futures if future.done()]
+        retry = []
+
+        for future in done:
+            path = self.futures.pop(future)
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                retry.append(path)
+                continue
+            except Exception as e:
+                result = {'path': path, 'source_name': get_source_name(path, self.folder), 'notes': [],
+                          'unchanged': [], 'errors': [(0, str(e))], 'sources': None}
+
+            if self.snapshot_view is not None and not self.add_snapshots(result['notes']):
+                return
+            self.writer.record_sources(result)
+            for converted in result['notes']:
+                try:
+                    self.writer.add(converted)
+                except Exception as e:
+                    self.error_count += 1
+                    self.add_error(path, 0, f"Failed to add note: {e}")
+            for line_number, message in result['errors']:
+                self.error_count += 1
+                self.add_error(path, line_number, message)
+            self.files_done += 1
+
+        if retry:
+            # Worker processes can't start in some Anki builds, so finish in a thread
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            retry.extend(self.futures.values())
+            self.futures = {}
+            self.executor = ThreadPoolExecutor(max_workers=1)
+            self.submit(retry)
+
+        if not self.futures:
+            self.finish_import()
+        self.update_status()
+
+    def add_snapshots(self, notes):
+        """
+        Snapshot the previews of converted notes.
+
+        Returns:
+            bool: False if the import was cancelled meanwhile
+        """
+        # Rendering runs the event loop, so results aren't collected meanwhile
+        self.timer.stop()
+        self.snapshotting = True
+        for converted in notes:
+            if self.executor is None:
+                break
+            add_preview_snapshots(converted['fields'], self.media_dir, self.snapshot_view)
+        self.snapshotting = False
+        if self.executor is None:
+            self.close_snapshot_view()
+            return False
+        self.timer.start(100)
+        return True
+
+    def close_snapshot_view(self):
+        """Release the web view previews are rendered in."""
+        if self.snapshot_view is not None:
+            self.snapshot_view.deleteLater()
+            self.snapshot_view = None
+
+    def add_error(self, path, line_number, message):
+        """Show an error for a file."""
+        location = os.path.relpath(path, self.folder)
+        if line_number:
+            location += f":{line_number}"
+        self.error_text.appendPlainText(f"{location}: {message}")
+
+    def update_status(self):
+        """Show progress and throughput."""
+        written = self.writer.written + self.writer.updated + self.writer.queued
+        elapsed = max(time.monotonic() - self.start_time, 1e-6)
+        self.progress_bar.setValue(self.files_done)
+        self.status_label.setText(
+            f"{self.files_done}/{self.progress_bar.maximum()} files, "
+            f"{written} questions ({written / elapsed:.1f} questions/s), "
+            f"{self.writer.unchanged} unchanged, {self.writer.duplicates} duplicates, "
+            f"{self.writer.removed} removed, {self.error_count} errors"
+        )
+
+    def finish_import(self):
+        """Write the last chunk and release the workers."""
+        self.timer.stop()
+        try:
+            self.writer.flush()
+            if self.remove_missing_check.isChecked():
+                self.writer.remove_missing()
+        except Exception as e:
+            self.error_count += 1
+            self.error_text.appendPlainText(f"Failed to add notes: {e}")
+        self.executor.shutdown(wait=False)
+        self.executor = None
+        self.close_snapshot_view()
+        mw.reset()
+
+        self.import_button.setEnabled(True)
+        self.cancel_button.setText("Close")
+
+    def reject(self):
+        """Stop an import in progress before closing."""
+        if self.executor is not None:
+            self.timer.stop()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+            self.futures = {}
+            # Keep the notes that were already converted
+            self.writer.flush()
+            mw.reset()
+        if not self.snapshotting:
+            self.close_snapshot_view()
+        super().reject()
+
+def show_folder_import_dialog():
+    """Show the folder import dialog."""
+    dialog = FolderImportDialog(mw)
+    dialog.exec()
@@ -0,0 +1,72 @@
+"""
+Edit actions for existing notes for Recall Anki plugin.
+"""
+
+from anki.errors import AbortSchemaModification
+from aqt import mw
+from aqt.qt import *
+from aqt.utils import askUser, tooltip
+
+from .dialog import show_edit_recall_note_dialog
+from ..card_templates.migrations import (
+    migrate_to_generic_note_type, needs_note_type_fields, upgrade_note_type_fields, FIELD_UPGRADE_OFFERED_KEY
+)
+from ..card_templates.note_types import GENERIC_MODEL_NAME
+
+def edit_selected_note(browser):
+    """Edit the note selected in the browser."""
+    note_ids = browser.selected_notes()
+    if len(note_ids) != 1:
+        tooltip("Select a single Recall note to edit", parent=browser)
+        return
+    show_edit_recall_note_dialog(mw.col.get_note(note_ids[0]), browser)
+
+def add_browser_menu_action(browser):
+    """Add "Edit Recall Note" to the browser's Notes menu."""
+    action = QAction("Edit Recall Note", browser)
+    action.triggered.connect(lambda: edit_selected_note(browser))
+    browser.form.menu_Notes.addSeparator()
+    browser.form.menu_Notes.addAction(action)
+
+def add_browser_context_action(browser, menu):
+    """Add "Edit Recall Note" to the browser's context menu."""
+    action = menu.addAction("Edit Recall Note")
+    action.triggered.connect(lambda: edit_selected_note(browser))
+
+def add_reviewer_context_action(reviewer, menu):
+    """Add "Edit Recall Note" to the reviewer's context menu."""
+    if reviewer.card is None:
+        return
+    action = menu.addAction("Edit Recall Note")
+    action.triggered.connect(lambda: show_edit_recall_note_dialog(reviewer.card.note()))
+
+def move_notes_to_generic_note_type():
+    """Move the notes of older Recall note types onto the generic note type."""
+    try:
+        # Anki asks the user to accept the full sync this needs
+        moved = migrate_to_generic_note_type(mw.col)
+    except AbortSchemaModification:
+        return
+    mw.reset()
+    tooltip(f"Moved {moved} notes to the {GENERIC_MODEL_NAME} note type")
+
+def add_note_type_fields():
+    """Add the fields of the current version to older Recall note types."""
+    try:
+        # Anki asks the user to accept the full sync this needs
+        changed = upgrade_note_type_fields(mw.col)
+    except AbortSchemaModification:
+        return
+    mw.reset()
+    tooltip(f"Upgraded {changed} Recall note types")
+
+def offer_note_type_fields():
+    """Offer to add missing note type fields, once per collection."""
+    if mw.col.get_config(FIELD_UPGRADE_OFFERED_KEY, False) or not needs_note_type_fields(mw.col):
+        return
+    mw.col.set_config(FIELD_UPGRADE_OFFERED_KEY, True)
+    if askUser("Some Recall note types were created by an older version of Recall. Adding the hidden "
+               "fields this version uses lets notes sort by question, be checked for duplicate questions "
+               "and load only the code highlighting they need.\n\nAdding fields needs a full sync. "
+               "Add them now? You can also do this later from Tools > Upgrade Recall Note Types."):
+        add_note_type_fields()
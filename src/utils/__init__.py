@@ -3,5 +3,6 @@ Utility functions for Recall Anki plugin.
 """
 
 # Import utility functions here as needed
+from .config import get_config
 
-__all__ = [] 
\ No newline at end of file
+__all__ = ['get_config']
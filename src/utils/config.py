@@ -0,0 +1,52 @@
+"""
+Add-on configuration for Recall Anki plugin.
+"""
+
+import sys
+
+from ..markdown.highlighter import is_available as can_highlight
+
+# Defaults used when config.json is missing a key (e.g. after an upgrade)
+DEFAULT_CONFIG = {
+    'import_chunk_size': 500,
+    'import_workers': 0,
+    'highlight_code': False,
+    'collapse_code_lines': 60,
+    'preview_snapshots': False,
+    'card_theme': 'full',
+    'lite_theme_decks': [],
+}
+
+def get_config():
+    """
+    Get the add-on configuration merged over the defaults.
+    
+    Returns:
+        dict: The configuration
+    """
+    config = dict(DEFAULT_CONFIG)
+    try:
+        from aqt import mw
+        config.update(mw.addonManager.getConfig(__name__) or {})
+    except Exception as e:
+        print(f"Recall: using default configuration: {e}", file=sys.stderr)
+    # Highlighting at conversion time needs Pygments, which Anki does not
+    # bundle, so in Anki the option usually has no effect
+    if config['highlight_code'] and not can_highlight():
+        config['highlight_code'] = False
+        warn_once("Recall: highlight_code needs Pygments, which Anki does not include; "
+                  "use the command line converter's --highlight option instead")
+    return config
+
+_warnings = set()
+
+def warn_once(message):
+    """Tell the user about a configuration problem once per session."""
+    if message in _warnings:
+        return
+    _warnings.add(message)
+    try:
+        from aqt.utils import tooltip
+        tooltip(message, period=8000)
+    except Exception:
+        print(message, file=sys.stderr)
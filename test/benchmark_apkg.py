@@ -0,0 +1,61 @@
+"""
+Benchmark for the standalone .apkg writer.
+
+Builds a package from generated questions and reports notes per second and
+peak memory, so the writer can be checked for throughput and for memory
+that stays flat as the deck grows:
+
+    python test/benchmark_apkg.py --notes 100000
+"""
+
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+
+# Add parent directory to path so we can import the plugin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.exporter.apkg import ApkgWriter
+
+def make_note(index):
+    """Generate a converted note the size of a typical Recall question."""
+    explanation = f"<p>{'Explanation text for option. ' * 20}</p>"
+    return {
+        'correct_count': 1,
+        'incorrect_count': 3,
+        'fields': {
+            'Question': f"<p>Question {index}: which statement is true?</p>",
+            'CorrectOption': f"<p>Correct statement {index}</p>",
+            'CorrectExplanation': explanation,
+            **{f'IncorrectOption{i}': f"<p>Incorrect statement {index}.{i}</p>" for i in range(1, 4)},
+            **{f'IncorrectExplanation{i}': explanation for i in range(1, 4)},
+        },
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the .apkg writer")
+    parser.add_argument('--notes', type=int, default=20000, help='Number of notes to write')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Notes per SQLite transaction')
+    args = parser.parse_args()
+
+    output = os.path.join(tempfile.mkdtemp(prefix='recall-benchmark-'), 'benchmark.apkg')
+    start = time.perf_counter()
+    with ApkgWriter(output, 'Benchmark', batch_size=args.batch_size) as writer:
+        for index in range(args.notes):
+            writer.add(make_note(index))
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+    print(f"Wrote {args.notes} notes in {elapsed:.2f}s ({args.notes / elapsed:.0f} notes/s)")
+    print(f"Package size: {os.path.getsize(output) / (1024 * 1024):.1f} MB")
+    print(f"Peak memory: {peak_mb:.1f} MB")
+    os.remove(output)
+
+if __name__ == '__main__':
+    main()
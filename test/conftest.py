@@ -23,7 +23,7 @@ class MockCollection:
         self.models.new_template = MagicMock(return_value={'name': '', 'qfmt': '', 'afmt': ''})
         self.models.add = MagicMock()
         self.models.by_name = MagicMock(return_value=None)  # Initially no models exist
-        self.models.all_names = MagicMock(return_value=[])
+        self.models.id_for_name = MagicMock(return_value=None)
         
         # Media directory
         self.media.dir = MagicMock(return_value="/mock/media/dir")
@@ -0,0 +1,131 @@
+import json
+import os
+import sqlite3
+import sys
+import zipfile
+
+import pytest
+
+# Add parent directory to path so we can import the plugin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def make_note(question, correct_count=1, incorrect_count=1, image=None):
+    fields = {'Question': f'<p>{question}</p>'}
+    if image:
+        fields['Question'] += f'<img src="{image}">'
+    fields['RecallSummary'] = question
+    for i in range(1, correct_count + 1):
+        suffix = str(i) if correct_count > 1 else ''
+        fields[f'CorrectOption{suffix}'] = f'Correct {i}'
+    for i in range(1, incorrect_count + 1):
+        fields[f'IncorrectOption{i}'] = f'Incorrect {i}'
+    return {'correct_count': correct_count, 'incorrect_count': incorrect_count, 'fields': fields}
+
+class TestApkgWriter:
+
+    def test_write_package(self, tmp_path):
+        """Test that notes, note types and media end up in the package"""
+        from src.exporter.apkg import ApkgWriter
+
+        media_dir = tmp_path / "media"
+        media_dir.mkdir()
+        (media_dir / "diagram.png").write_bytes(b"png")
+        output = tmp_path / "deck.apkg"
+
+        with ApkgWriter(str(output), "Course::Chapter 1", str(media_dir), batch_size=2) as writer:
+            writer.add(make_note("First", image="diagram.png"))
+            writer.add(make_note("Second", image="diagram.png"))
+            writer.add(make_note("Third", correct_count=2), tags=["recall"])
+
+        from src.card_templates.assets import get_media_assets
+
+        with zipfile.ZipFile(output) as package:
+            media = json.loads(package.read("media"))
+            assert sorted(package.namelist()) == sorted(["collection.anki2", "media", *media])
+            assert sorted(media.values()) == sorted(["diagram.png", *get_media_assets()])
+            assert media["0"] == "diagram.png"
+            package.extract("collection.anki2", tmp_path)
+
+        db = sqlite3.connect(tmp_path / "collection.anki2")
+        models = json.loads(db.execute("select models from col").fetchone()[0])
+        decks = json.loads(db.execute("select decks from col").fetchone()[0])
+        notes = db.execute("select mid, tags, flds, sfld from notes order by id").fetchall()
+        cards = db.execute("select did, due from cards order by id").fetchall()
+        db.close()
+
+        assert [model['name'] for model in models.values()] == ["RecallN"]
+        assert "Course::Chapter 1" in [deck['name'] for deck in decks.values()]
+        assert [note[3] for note in notes] == ["First", "Second", "Third"]
+        assert notes[2][1] == " recall "
+        # Questions fill the first option slots of the generic note type
+        assert notes[0][2].split('\x1f')[1:4] == ["Correct 1", "", ""]
+        assert notes[2][2].split('\x1f')[1:4] == ["Correct 1", "", "Correct 2"]
+        assert [card[1] for card in cards] == [1, 2, 3]
+
+    def test_preview_documents_are_packaged(self, tmp_path):
+        """Test that the preview documents a note loads are copied into the package"""
+        from src.exporter.apkg import ApkgWriter
+        from src.markdown.converter import create_preview_frame
+
+        media_dir = tmp_path / "media"
+        media_dir.mkdir()
+        note = make_note("Preview")
+        note['fields']['CorrectExplanation'] = create_preview_frame("<p>Demo</p>", str(media_dir))
+        output = tmp_path / "deck.apkg"
+
+        with ApkgWriter(str(output), "Previews", str(media_dir)) as writer:
+            writer.add(note)
+
+        with zipfile.ZipFile(output) as package:
+            media = json.loads(package.read("media"))
+        assert media["0"] == os.listdir(media_dir)[0]
+        assert media["0"].startswith("_recall_preview_")
+
+    def test_abort_removes_package(self, tmp_path):
+        """Test that a failed export leaves no partial package behind"""
+        from src.exporter.apkg import ApkgWriter
+
+        output = tmp_path / "deck.apkg"
+
+        with pytest.raises(RuntimeError):
+            with ApkgWriter(str(output), "Default") as writer:
+                writer.add(make_note("First"))
+                raise RuntimeError("conversion failed")
+
+        assert not output.exists()
+
+    def test_duplicate_questions_are_skipped(self, tmp_path):
+        """Test that a question already in the package is added once"""
+        from src.exporter.apkg import ApkgWriter
+
+        output = tmp_path / "deck.apkg"
+        notes = [make_note("First"), make_note("First again"), make_note("Second")]
+        for note, checksum in zip(notes, ["aaa", "aaa", "bbb"]):
+            note['fields']['RecallChecksum'] = checksum
+
+        with ApkgWriter(str(output), "Default") as writer:
+            for note in notes:
+                writer.add(note)
+
+        assert (writer.written, writer.duplicates) == (2, 1)
+
+    def test_ids_are_stable_across_builds(self, tmp_path, monkeypatch):
+        """Test that packages built at different times share note type and deck ids"""
+        from src.exporter import apkg
+
+        ids = []
+        for build, now in enumerate([1600000000, 1700000000]):
+            monkeypatch.setattr(apkg.time, 'time', lambda now=now: now)
+            output = tmp_path / f"deck{build}.apkg"
+            with apkg.ApkgWriter(str(output), "Course") as writer:
+                writer.add(make_note("First"))
+            with zipfile.ZipFile(output) as package:
+                package.extract("collection.anki2", tmp_path / str(build))
+            db = sqlite3.connect(tmp_path / str(build) / "collection.anki2")
+            models = json.loads(db.execute("select models from col").fetchone()[0])
+            decks = json.loads(db.execute("select decks from col").fetchone()[0])
+            db.close()
+            ids.append((sorted(models), sorted(decks)))
+
+        assert ids[0] == ids[1]
+        assert apkg.stable_id('deck', "Course") != apkg.stable_id('deck', "Other")
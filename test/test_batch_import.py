@@ -0,0 +1,260 @@
+import pytest
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+# Add parent directory to path so we can import the plugin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+QUESTION_BANK = """#### Question
+What is the capital of France?
+___
+#### Correct Option
+Paris
+
+##### Explanation
+Paris is the capital of France.
+
+```markdown
+#### Question
+This header is inside a code block
+```
+___
+#### Incorrect Option
+London
+
+##### Explanation
+London is the capital of the United Kingdom, not France.
+___
+
+#### Question
+Which of these are planets?
+___
+#### Correct Option
+Earth
+
+##### Explanation
+Earth is the third planet from the Sun.
+___
+#### Correct Option
+Mars
+
+##### Explanation
+Mars is the fourth planet from the Sun.
+___
+#### Incorrect Option
+Moon
+
+##### Explanation
+The Moon is Earth's satellite, not a planet.
+___
+
+#### Question
+A question without any options
+"""
+
+@pytest.mark.usefixtures("mock_anki")
+class TestBatchImport:
+
+    def test_split_questions(self):
+        """Test that a bank is split at question headers outside code blocks"""
+        from src.markdown.parser import split_questions
+
+        questions = split_questions(QUESTION_BANK)
+
+        assert [line for line, _ in questions] == [1, 22, 44]
+        assert "This header is inside a code block" in questions[0][1]
+        assert questions[1][1].startswith("#### Question\nWhich of these are planets?")
+
+    def test_find_markdown_files(self, tmp_path):
+        """Test that markdown files are found recursively, skipping hidden folders"""
+        from src.importer.batch import find_markdown_files
+
+        (tmp_path / "sub").mkdir()
+        (tmp_path / ".git").mkdir()
+        (tmp_path / "a.md").write_text(QUESTION_BANK)
+        (tmp_path / "sub" / "b.MD").write_text(QUESTION_BANK)
+        (tmp_path / "notes.txt").write_text("not markdown")
+        (tmp_path / ".git" / "c.md").write_text(QUESTION_BANK)
+
+        paths = find_markdown_files(str(tmp_path))
+
+        assert paths == [str(tmp_path / "a.md"), str(tmp_path / "sub" / "b.MD")]
+
+    def test_convert_file(self, tmp_path):
+        """Test that every question in a file is converted and errors are reported per question"""
+        from src.importer.batch import convert_file
+
+        path = tmp_path / "bank.md"
+        path.write_text(QUESTION_BANK)
+
+        result = convert_file(str(path), str(tmp_path))
+
+        assert len(result["notes"]) == 2
+        first, second = result["notes"]
+        assert (first["correct_count"], first["incorrect_count"]) == (1, 1)
+        assert (second["correct_count"], second["incorrect_count"]) == (2, 1)
+        assert "Paris" in first["fields"]["CorrectOption"]
+        assert first["fields"]["RecallSummary"] == "What is the capital of France?"
+        assert first["tags"] == ["recall::lang::markdown", "recall::options::correct::1",
+                                 "recall::options::incorrect::1"]
+        assert "recall::options::correct::2" in second["tags"]
+        assert "Mars" in second["fields"]["CorrectOption2"]
+        assert len(result["errors"]) == 1
+        assert result["errors"][0][0] == 44
+
+    def test_convert_missing_file(self, tmp_path):
+        """Test that an unreadable file is reported instead of raising"""
+        from src.importer.batch import convert_file
+
+        result = convert_file(str(tmp_path / "missing.md"))
+
+        assert result["notes"] == []
+        assert len(result["errors"]) == 1
+
+    def test_writer_adds_notes_in_chunks(self):
+        """Test that the writer only touches the collection once per chunk"""
+        from src.importer.writer import NoteWriter
+        from src.card_templates.note_types import get_field_names
+
+        col = MagicMock()
+        model = {'id': 7, 'name': 'RecallN', 'flds': [{'name': name} for name in get_field_names(10, 10)]}
+        col.models.by_name.return_value = model
+        col.models.get.return_value = model
+        converted = {
+            'correct_count': 1,
+            'incorrect_count': 1,
+            'fields': {'Question': 'Q', 'CorrectOption': 'A'}
+        }
+
+        with patch.dict(sys.modules, {'anki.collection': MagicMock(), 'anki.notes': MagicMock()}):
+            writer = NoteWriter(col, deck_id=1, chunk_size=2)
+            for _ in range(5):
+                writer.add(converted)
+            assert col.add_notes.call_count == 2
+            assert writer.queued == 1
+
+            writer.flush()
+
+        assert col.add_notes.call_count == 3
+        assert writer.written == 5
+        # The note type is looked up once and then found in the registry
+        col.models.by_name.assert_called_once_with("RecallN")
+        col.models.get.assert_called_with(7)
+
+    def test_convert_file_skips_unchanged_questions(self, tmp_path):
+        """Test that questions whose hash is known are not converted again"""
+        from src.importer.batch import convert_file
+
+        path = tmp_path / "bank.md"
+        path.write_text(QUESTION_BANK)
+        first = convert_file(str(path), str(tmp_path), "bank.md")
+        france, planets = first["notes"]
+        known_hashes = {note["source"]: note["hash"] for note in first["notes"]}
+        known_hashes[planets["source"]] = "outdated"
+
+        result = convert_file(str(path), str(tmp_path), "bank.md", known_hashes)
+
+        # Questions are identified by their checksum, not their position
+        assert france["source"] == "bank.md#" + france["fields"]["RecallChecksum"][:12]
+        assert france["fields"]["RecallSource"] == france["source"]
+        assert result["unchanged"] == [france["source"]]
+        assert [note["source"] for note in result["notes"]] == [planets["source"]]
+        assert result["sources"] == [france["source"], planets["source"]]
+
+    def test_reimport_keeps_notes_with_their_questions(self, tmp_path):
+        """Test that inserting, moving and editing questions updates the right notes"""
+        from src.importer.batch import convert_file
+        from src.importer.writer import NoteWriter
+        from src.importer.duplicates import reset_duplicate_index
+        from src.card_templates.note_types import get_field_names
+        from src.markdown.parser import split_questions
+
+        france, planets, _ = [text for _, text in split_questions(QUESTION_BANK)]
+        inserted = ("#### Question\nWhat is 2 + 2?\n___\n#### Correct Option\n4\n\n##### Explanation\nSum.\n"
+                    "___\n#### Incorrect Option\n5\n\n##### Explanation\nOne too many.")
+        path = tmp_path / "bank.md"
+        path.write_text("\n\n".join([france, planets]))
+        first = convert_file(str(path), str(tmp_path), "bank.md")
+
+        notes = {}
+        existing = {}
+        for note_id, converted in enumerate(first["notes"], 10):
+            note = MagicMock()
+            note.id = note_id
+            note.mid = 7
+            note.tags = []
+            fields = dict(converted["fields"])
+            note.keys.side_effect = lambda fields=fields: list(fields)
+            note.__getitem__.side_effect = fields.__getitem__
+            note.__setitem__.side_effect = fields.__setitem__
+            note.fields = fields
+            notes[note_id] = note
+            existing[converted["source"]] = (note_id, converted["hash"])
+
+        reset_duplicate_index()
+        col = MagicMock()
+        col.models.all_names_and_ids.return_value = []
+        col.models.by_name.return_value = {'id': 7, 'flds': [{'name': name} for name in get_field_names(10, 10)]}
+        col.get_note.side_effect = notes.__getitem__
+
+        # A question is inserted at the top, the planets question is edited and moved up
+        edited = planets.replace("these are planets", "these are planets of the Solar System")
+        path.write_text("\n\n".join([inserted, edited, france]))
+        with patch.dict(sys.modules, {'anki.collection': MagicMock(), 'anki.notes': MagicMock()}):
+            writer = NoteWriter(col, deck_id=1, existing=existing)
+            result = convert_file(str(path), str(tmp_path), "bank.md", writer.known_hashes("bank.md"))
+            writer.record_sources(result)
+            for converted in result["notes"]:
+                writer.add(converted)
+            writer.flush()
+            writer.remove_missing()
+
+        assert result["unchanged"] == [first["notes"][0]["source"]]
+        assert len(col.add_notes.call_args[0][0]) == 1
+        col.update_notes.assert_called_once_with([notes[11]])
+        assert "Solar System" in notes[11].fields["Question"]
+        assert notes[11].fields["RecallSource"] == result["notes"][1]["source"]
+        col.remove_notes.assert_not_called()
+        assert (writer.written, writer.updated, writer.unchanged, writer.duplicates) == (1, 1, 1, 0)
+
+    def test_writer_updates_changed_fields_only(self):
+        """Test that a re-imported note is updated in place, touching only changed fields"""
+        from src.importer.writer import NoteWriter
+        from src.card_templates.note_types import get_field_names
+
+        note = MagicMock()
+        note.mid = 7
+        note.id = 42
+        fields = {'Question': 'Q', 'CorrectOption': 'Old', 'RecallSource': 'bank.md#1', 'RecallHash': 'a'}
+        note.keys.side_effect = lambda: list(fields)
+        note.__getitem__.side_effect = fields.__getitem__
+        note.__setitem__.side_effect = fields.__setitem__
+
+        col = MagicMock()
+        col.models.by_name.return_value = {'id': 7, 'flds': [{'name': name} for name in get_field_names(1, 1)]}
+        note.tags = ["mine", "recall::lang::java"]
+        col.get_note.return_value = note
+        converted = {
+            'source': 'bank.md#1',
+            'correct_count': 1,
+            'incorrect_count': 1,
+            'fields': {'Question': 'Q', 'CorrectOption': 'New', 'RecallSource': 'bank.md#1', 'RecallHash': 'b'},
+            'tags': ["recall::lang::python"]
+        }
+
+        with patch.dict(sys.modules, {'anki.collection': MagicMock(), 'anki.notes': MagicMock()}):
+            writer = NoteWriter(col, deck_id=1, existing={'bank.md#1': (42, 'a'), 'bank.md#2': (43, 'c')})
+            writer.add(converted)
+            writer.flush()
+            writer.remove_missing()
+
+        col.get_note.assert_called_once_with(42)
+        col.update_notes.assert_called_once_with([note])
+        col.add_notes.assert_not_called()
+        assert note.__setitem__.call_count == 2
+        assert fields['CorrectOption'] == 'New'
+        # Content tags are replaced, tags users added are kept
+        assert note.tags == ["mine", "recall::lang::python"]
+        col.remove_notes.assert_called_once_with([43])
+        assert (writer.written, writer.updated, writer.removed) == (0, 1, 1)
@@ -98,10 +98,10 @@ class TestCardCreation:
         from aqt import mw
         mw.col.add_note.assert_called_once()
         
-        # Verify that the correct model was used (Recall22 for 2 correct, 2 incorrect)
+        # Verify that the generic model was used for 2 correct, 2 incorrect
         from anki.notes import Note
         assert Note.call_args[0][1] == mw.col.models.by_name.return_value
-        mw.col.models.by_name.assert_called_with("Recall22")
+        mw.col.models.by_name.assert_called_with("RecallN")
     
     def test_create_card_with_preview(self, dialog):
         """Test creating a card with HTML preview sections"""
@@ -167,7 +167,7 @@ class TestCardCreation:
         """Test creation of a complex note type with multiple options"""
         from __init__ import create_recall_note_type
         
-        # Test creating Recall23 note type (2 correct, 3 incorrect)
+        # Test creating Recall2_3 note type (2 correct, 3 incorrect)
         model = create_recall_note_type(2, 3)
         
         # Verify that the necessary fields were created
@@ -175,7 +175,7 @@ class TestCardCreation:
         mm = mw.col.models
         
         # Check model name is correct
-        mm.new.assert_called_with("Recall23")
+        mm.new.assert_called_with("Recall2_3")
         
         # Check model was added to collection
         mm.add.assert_called_once()
@@ -0,0 +1,161 @@
+import json
+import pytest
+import re
+import sys
+import os
+from unittest.mock import MagicMock
+
+# Add parent directory to path so we can import the plugin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def get_items(template, element_id):
+    match = re.search(rf'<div[^>]* id="{element_id}"[^>]* data-items=\'([^\']*)\'', template)
+    return json.loads(match.group(1))
+
+@pytest.mark.usefixtures("mock_anki")
+class TestCardRuntime:
+
+    def test_templates_only_hold_data(self):
+        """Test that templates reference the shared runtime instead of inlining scripts"""
+        from src.card_templates.assets import RUNTIME_SCRIPT_NAME
+        from src.card_templates.note_types import create_front_template, create_back_template
+
+        front = create_front_template(2, 1)
+        back = create_back_template(2, 1)
+
+        for template in (front, back):
+            assert re.findall(r'<script[^>]*>', template) == [f'<script src="{RUNTIME_SCRIPT_NAME}">']
+        options = get_items(front, "options")
+        answers = get_items(back, "answers")
+        assert [option["isCorrect"] for option in options] == [True, True, False]
+        assert [item["explanationId"] for item in answers] == [
+            "recall_explanation_correct_1", "recall_explanation_correct_2", "recall_explanation_incorrect_1"
+        ]
+        for item in options + answers:
+            assert f'<div id="{item["contentId"]}"' in front + back
+        # Explanations stay inert until the runtime shows them
+        for item in answers:
+            assert f'<template id="{item["explanationId"]}">' in back
+
+    def test_runtime_is_versioned_media(self, tmp_path):
+        """Test that the runtime is named by its contents and replaces older versions"""
+        from src.card_templates.assets import (
+            install_media_assets, RUNTIME_SCRIPT, RUNTIME_SCRIPT_NAME, PRISM_SCRIPT_NAME
+        )
+
+        assert re.match(r'^_recall-[0-9a-f]{10}\.js$', RUNTIME_SCRIPT_NAME)
+        assert PRISM_SCRIPT_NAME.encode() in RUNTIME_SCRIPT
+        assert b"innerHTML +=" not in RUNTIME_SCRIPT
+
+        (tmp_path / "_recall-0123456789.js").write_text("old")
+        col = MagicMock()
+        col.media.dir.return_value = str(tmp_path)
+        col.media.have.return_value = False
+
+        added = install_media_assets(col)
+
+        assert RUNTIME_SCRIPT_NAME in added
+        col.media.trash_files.assert_called_once_with(["_recall-0123456789.js"])
+
+    def test_back_side_renders_each_field_once(self):
+        """Test that the rendered back side, including the front side, holds each field once"""
+        from src.card_templates.note_types import create_front_template, create_back_template, get_field_names
+
+        field_names = get_field_names(2, 3)
+        fields = {name: f"<p>value of {name}</p>" for name in field_names}
+
+        def render(template, fields):
+            return re.sub(r"\{\{([^}]+)\}\}", lambda match: fields.get(match.group(1), ""), template)
+
+        front = render(create_front_template(2, 3), fields)
+        back = render(create_back_template(2, 3), dict(fields, FrontSide=front))
+
+        for name in field_names:
+            if name in ("RecallSource", "RecallHash", "RecallMarkdown", "RecallSummary", "RecallChecksum"):
+                assert back.count(fields[name]) == 0
+            else:
+                assert back.count(fields[name]) == 1, name
+
+    def test_generic_note_type_skips_empty_slots(self):
+        """Test that questions fill the first slots of RecallN and its templates skip the rest"""
+        from src.card_templates.note_types import (
+            get_slot_counts, get_slot_fields, get_model_name, get_field_names, create_front_template,
+            create_back_template
+        )
+
+        assert get_slot_counts(1, 2) == (10, 10)
+        assert get_slot_counts(11, 1) == (11, 1)
+        assert get_model_name(*get_slot_counts(2, 3)) == "RecallN"
+        # Counts of 10 or more don't run together into the same name
+        assert get_model_name(11, 2) == "Recall11_2"
+        assert get_model_name(11, 2) != get_model_name(1, 12)
+
+        fields = get_slot_fields({"Question": "Q", "CorrectOption": "A", "IncorrectOption1": "B"}, 1, 1, (10, 10))
+
+        assert fields["CorrectOption1"] == "A"
+        assert fields["CorrectOption2"] == fields["IncorrectOption10"] == ""
+        assert set(fields) <= set(get_field_names(10, 10))
+        assert ('{{#CorrectOption2}}<div id="recall_option_content_correct_1"'
+                in create_front_template(10, 10))
+        assert ('{{#IncorrectOption10}}<template id="recall_explanation_incorrect_10">'
+                in create_back_template(10, 10))
+
+    def test_templates_are_minified_and_cached(self):
+        """Test that generated templates lose comments and indentation but keep the version stamp"""
+        from src.card_templates.note_types import (
+            get_note_type_templates, build_note_type_templates, create_front_template, TEMPLATE_STAMP
+        )
+
+        front, back, styling = get_note_type_templates(1, 2)
+
+        assert front.startswith(f"<!-- {TEMPLATE_STAMP} -->\n<div class=\"recall-card\" data-deck=\"{{{{Deck}}}}\">")
+        assert "Hidden divs" not in front and "\n " not in front + back + styling
+        assert styling.startswith(f"/* {TEMPLATE_STAMP} full */\n")
+        assert styling.count("/*") == 1
+        assert get_items(front, "options") == get_items(create_front_template(1, 2), "options")
+        hits = build_note_type_templates.cache_info().hits
+        assert get_note_type_templates(1, 2)[0] is front
+        assert build_note_type_templates.cache_info().hits == hits + 1
+
+    def test_lite_theme_keeps_colors_without_costly_effects(self):
+        """Test that the lite theme drops shadows, transitions and translucency, globally or per deck"""
+        from src.card_templates.note_types import get_note_type_styling, make_opaque
+
+        full = get_note_type_styling()
+        lite = get_note_type_styling("lite")
+        per_deck = get_note_type_styling("full", ["Phone"])
+
+        assert "box-shadow: 0" in full and "transition: all" in full and "rgba(" in full
+        assert "box-shadow: 0" not in lite and "transition: all" not in lite and "rgba(" not in lite
+        for color in ("#98c379", "#e06c75", "#61afef"):
+            assert color in lite
+        assert make_opaque("rgba(224, 108, 117, 0.7)") == "#a95962"
+        assert make_opaque("rgba(0, 0, 0, 1)") == "#000000"
+        assert "full+lite-decks-" in per_deck.split("\n", 1)[0]
+        assert ('.recall-card[data-deck="Phone"] .option.selected, .recall-card[data-deck^="Phone::"] .option.selected {'
+                in per_deck)
+        # The card element carries the deck itself, old WebViews have no :has
+        assert '.card[data-deck="Phone"], .card[data-deck^="Phone::"] {' in per_deck
+        assert ":has(" not in per_deck
+        # Deck names are CSS strings, so quotes and backslashes don't end them
+        quoted = get_note_type_styling("full", ['Say "hi"\\now'])
+        assert '.recall-card[data-deck="Say \\"hi\\"\\\\now"] .option.selected' in quoted
+
+    def test_previews_are_placeholders(self, tmp_path):
+        """Test that rendered previews are placeholders loading a shared media document"""
+        from src.markdown.converter import convert_markdown_to_html, create_preview_display_html
+
+        document = '<p class="demo">Tom &amp; Jerry ✓</p>'
+        converted = convert_markdown_to_html(f"Question\n\n#### Preview\n```html\n{document}\n```\n", str(tmp_path))
+        displayed = create_preview_display_html("html", document, document, media_dir=str(tmp_path))
+
+        names = []
+        for preview_html in (converted, displayed):
+            assert "<iframe" not in preview_html
+            names.append(re.search(r'<div class="recall-preview" data-src="([^"]*)">', preview_html).group(1))
+        assert names[0] == names[1]
+        assert re.match(r'^_recall_preview_[0-9a-f]{16}\.html$', names[0])
+        assert os.listdir(tmp_path) == [names[0]]
+        assert (tmp_path / names[0]).read_text(encoding="utf-8") == (
+            f'<!DOCTYPE html>\n<meta charset="utf-8">\n{document}'
+        )
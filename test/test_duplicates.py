@@ -0,0 +1,193 @@
+import pytest
+import sys
+import os
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+# Add parent directory to path so we can import the plugin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+QUESTION = """#### Question
+What is 2 + 2?
+___
+#### Correct Option
+4
+
+##### Explanation
+Basic arithmetic.
+___
+#### Incorrect Option
+5
+
+##### Explanation
+One too many.
+___
+#### Incorrect Option
+3
+
+##### Explanation
+One too few.
+"""
+
+# The same question generated again: other whitespace, option order and explanations
+REGENERATED = """#### Question
+What is   2 + 2?
+
+___
+#### Incorrect Option
+3
+
+##### Explanation
+Too small.
+___
+#### Correct Option
+4
+
+##### Explanation
+Two and two make four.
+___
+#### Incorrect Option
+5
+
+##### Explanation
+Too large.
+"""
+
+def make_collection(checksums):
+    """Make a collection whose RecallN notes have the given checksums, keyed by note id."""
+    from src.card_templates.note_types import get_field_names, CHECKSUM_FIELD
+
+    field_names = get_field_names(10, 10)
+    model = {'id': 1, 'name': "RecallN", 'flds': [{'name': name} for name in field_names], 'tmpls': []}
+    position = field_names.index(CHECKSUM_FIELD)
+    col = MagicMock()
+    col.models.all_names_and_ids.return_value = [SimpleNamespace(id=1, name="RecallN")]
+    col.models.get.return_value = model
+    col.db.all.return_value = [
+        (note_id, 1, '\x1f'.join(checksum if i == position else '' for i in range(len(field_names))))
+        for note_id, checksum in checksums.items()
+    ]
+    col.db.scalar.side_effect = lambda sql, note_id: 1 if note_id in checksums else None
+    return col
+
+@pytest.mark.usefixtures("mock_anki")
+class TestDuplicates:
+
+    def test_checksum_ignores_formatting(self, tmp_path):
+        """Test that whitespace, option order, explanations and code collapsing don't change the checksum"""
+        from src.markdown.parser import parse_input
+        from src.markdown.converter import convert_sections_to_fields, get_question_checksum
+
+        def checksum(text, collapse_lines=0):
+            fields = convert_sections_to_fields(parse_input(text), str(tmp_path), collapse_lines=collapse_lines)
+            return get_question_checksum(fields)
+
+        expected = checksum(QUESTION)
+
+        assert checksum(REGENERATED) == expected
+        assert checksum(QUESTION.replace("2 + 2", "2 + 3")) != expected
+        # Swapping which option is correct makes another question
+        swapped = QUESTION.replace("Correct Option\n4", "Correct Option\n5").replace(
+            "Incorrect Option\n5", "Incorrect Option\n4")
+        assert checksum(swapped) != expected
+
+        code = "\n".join(f"line {i}" for i in range(30))
+        with_code = QUESTION.replace("What is 2 + 2?", f"What is 2 + 2?\n\n```python\n{code}\n```")
+        assert checksum(with_code, collapse_lines=10) == checksum(with_code)
+        assert checksum(with_code) != expected
+
+    def test_index_reads_the_checksums_once(self):
+        """Test that lookups are dictionary hits and removed notes are not reported"""
+        from src.importer.duplicates import DuplicateIndex
+
+        col = make_collection({10: "aaa", 11: "bbb"})
+        index = DuplicateIndex(col)
+
+        assert index.find("aaa") == 10
+        assert index.find("ccc") is None
+        index.add("ccc", 12)
+        index.discard("bbb", 11)
+        assert index.find("bbb") is None
+        col.db.all.assert_called_once()
+
+        col.db.scalar.side_effect = lambda sql, note_id: None
+        assert index.find("aaa") is None
+
+    def test_index_reads_only_changed_notes(self):
+        """Test that after an edit only the changed notes are read, replacing their old checksum"""
+        from src.importer.duplicates import DuplicateIndex
+
+        col = make_collection({10: "aaa", 11: "bbb"})
+        index = DuplicateIndex(col)
+        assert index.find("aaa") == 10
+
+        # Note 10 is edited to another question, note 11 is removed
+        col.db.all.return_value = make_collection({10: "ccc"}).db.all.return_value
+        index.mark_changed()
+        index.remove([11])
+
+        assert index.find("ccc") == 10
+        assert index.find("aaa") is None
+        assert index.find("bbb") is None
+        sql = col.db.all.call_args[0][0]
+        assert "where usn = -1 and mod >= ?" in sql
+        assert col.db.all.call_count == 2
+
+    def test_writer_skips_duplicates(self):
+        """Test that questions already in the collection or the same import are skipped"""
+        from src.importer.writer import NoteWriter
+        from src.importer.duplicates import reset_duplicate_index
+        from src.card_templates.note_types import CHECKSUM_FIELD
+
+        reset_duplicate_index()
+        col = make_collection({10: "aaa"})
+
+        def make_converted(checksum):
+            return {'correct_count': 1, 'incorrect_count': 1,
+                    'fields': {'Question': 'Q', CHECKSUM_FIELD: checksum}}
+
+        with patch.dict(sys.modules, {'anki.collection': MagicMock(), 'anki.notes': MagicMock()}):
+            writer = NoteWriter(col, deck_id=1)
+            for checksum in ["aaa", "bbb", "bbb", ""]:
+                writer.add(make_converted(checksum))
+            assert (writer.queued, writer.duplicates) == (2, 2)
+
+            writer = NoteWriter(col, deck_id=1, skip_duplicates=False)
+            writer.add(make_converted("aaa"))
+            assert (writer.queued, writer.duplicates) == (1, 0)
+
+    def test_writer_leaves_changing_notes_out(self):
+        """Test that notes updated in the same run are not duplicates and the index follows the writes"""
+        from src.importer.writer import NoteWriter
+        from src.importer.duplicates import reset_duplicate_index, get_duplicate_index
+        from src.card_templates.note_types import CHECKSUM_FIELD, SUMMARY_FIELD
+
+        reset_duplicate_index()
+        col = make_collection({10: "aaa"})
+        col.models.by_name.return_value = col.models.get.return_value
+        fields = {'Question': 'Q', CHECKSUM_FIELD: "aaa", SUMMARY_FIELD: "What is 2 + 2?"}
+        note = MagicMock()
+        note.id = 10
+        note.mid = 1
+        note.tags = []
+        note.keys.side_effect = lambda: list(fields)
+        note.__getitem__.side_effect = fields.__getitem__
+        note.__setitem__.side_effect = fields.__setitem__
+        col.get_note.return_value = note
+
+        def make_converted(source, checksum, summary):
+            return {'source': source, 'correct_count': 1, 'incorrect_count': 1,
+                    'fields': {'Question': 'Q', CHECKSUM_FIELD: checksum, SUMMARY_FIELD: summary}}
+
+        with patch.dict(sys.modules, {'anki.collection': MagicMock(), 'anki.notes': MagicMock()}):
+            writer = NoteWriter(col, deck_id=1, existing={'bank.md#1': (10, 'h')})
+            # The question of note 10 is edited, then its old text is added again
+            writer.add(make_converted('bank.md#bbb', "bbb", "What is 2 + 3?"))
+            writer.add(make_converted('bank.md#aaa', "aaa", "What is 2 + 2?"))
+            assert (writer.queued, writer.duplicates) == (2, 0)
+            assert get_duplicate_index(col).find("bbb") is None
+
+            writer.flush()
+
+        assert get_duplicate_index(col).find("bbb") == 10
+        assert fields[CHECKSUM_FIELD] == "bbb"
@@ -0,0 +1,68 @@
+import pytest
+import sys
+import os
+from unittest.mock import MagicMock
+
+# Add parent directory to path so we can import the plugin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import pygments
+except ImportError:
+    pygments = None
+
+@pytest.mark.usefixtures("mock_anki")
+@pytest.mark.skipif(pygments is None, reason="Pygments is not installed")
+class TestHighlighter:
+
+    def test_highlight_code_uses_prism_classes(self):
+        """Test that Pygments tokens become escaped Prism token spans"""
+        from src.markdown.highlighter import highlight_code
+
+        html = highlight_code('def f(x):\n    return "<b>"  # done', "python")
+
+        assert '<span class="token keyword">def</span> <span class="token function">f</span>' in html
+        assert '<span class="token string">"&lt;b&gt;"</span>' in html
+        assert '<span class="token comment"># done</span>' in html
+        # Plain names are left as bare text, as Prism leaves them
+        assert highlight_code("y = x", "python").endswith('<span class="token operator">=</span> x')
+        assert highlight_code("plain", "text") is None
+        assert highlight_code("x", "not-a-language") is None
+
+    def test_highlight_code_is_cached(self):
+        """Test that highlighting the same code twice reuses the first result"""
+        from src.markdown.highlighter import highlight_code
+
+        highlight_code.cache_clear()
+        highlight_code("x = 1", "python")
+        highlight_code("x = 1", "python")
+
+        assert highlight_code.cache_info().hits == 1
+
+    def test_highlighted_blocks_skip_prism(self):
+        """Test that highlighted code blocks are marked and need no Prism grammar"""
+        from src.markdown.converter import format_code_block, get_code_languages
+
+        highlighted = format_code_block("x = 1", "py", highlight=True)
+        plain = format_code_block("x = 1", "py")
+
+        assert '<code class="language-python highlighted">' in highlighted
+        assert '<span class="token number">1</span>' in highlighted
+        assert '<pre><code class="language-python">x = 1</code></pre>' in plain
+        assert get_code_languages([highlighted]) == []
+        assert get_code_languages([highlighted, plain]) == ["python"]
+
+def test_highlight_code_is_off_without_pygments(monkeypatch):
+    """Test that the option is turned off with a single notice when Pygments is missing"""
+    from src.utils import config
+
+    aqt = MagicMock()
+    aqt.mw.addonManager.getConfig.return_value = {'highlight_code': True}
+    monkeypatch.setitem(sys.modules, 'aqt', aqt)
+    monkeypatch.setitem(sys.modules, 'aqt.utils', aqt.utils)
+    monkeypatch.setattr(config, 'can_highlight', lambda: False)
+    monkeypatch.setattr(config, '_warnings', set())
+
+    assert config.get_config()['highlight_code'] is False
+    assert config.get_config()['highlight_code'] is False
+    aqt.utils.tooltip.assert_called_once()
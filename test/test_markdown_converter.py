@@ -258,4 +258,20 @@ When you see repeat(3, 1fr):
         
         # Ensure the list items contain the full content
         assert 'track definition that follows should be created three times' in html
-        assert 'each of the three columns will receive one equal share' in html 
\ No newline at end of file
+        assert 'each of the three columns will receive one equal share' in html
+    
+    def test_long_code_blocks_are_collapsed(self):
+        """Test that code blocks over the line threshold show an excerpt and keep the whole block in a template"""
+        from src.markdown.converter import format_code_block, get_code_languages, CODE_EXCERPT_LINES
+        
+        code = "\n".join(f"x{i} = {i}" for i in range(100))
+        collapsed = format_code_block(code, "py", collapse_lines=50)
+        whole = format_code_block(code, "py", collapse_lines=100)
+        
+        excerpt = "\n".join(f"x{i} = {i}" for i in range(CODE_EXCERPT_LINES))
+        assert f'<pre><code class="language-python">{excerpt}</code></pre>' in collapsed
+        assert f'<template><pre><code class="language-python">{code}</code></pre></template>' in collapsed
+        assert 'Show all 100 lines' in collapsed
+        assert 'collapsed-code' not in whole
+        assert 'collapsed-code' not in format_code_block(code, "py")
+        assert get_code_languages([collapsed]) == ["python"]
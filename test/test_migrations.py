@@ -0,0 +1,439 @@
+import pytest
+import sys
+import os
+from collections import defaultdict
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+# Add parent directory to path so we can import the plugin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# A code block as the converter of version 2.0.0 stored it, with the <style> block
+# format_code_block embedded and the converter's emphasis and line break passes
+# run over it
+EMBEDDED_CODE_BLOCK = """
+<br><br>
+    <style>
+    /<em> Import JetBrains Mono font </em>/
+    @import url('https://fonts.googleapis.com/css2?family=JetBrains+Mono:wght@400;500;600&display=swap');
+<br><br>
+    /<em> Fallback styling when Prism.js is not active </em>/
+    .code-block {
+        background-color: #21252b; /<em> Darker outer background </em>/
+        padding: 1px;
+        border-radius: 8px;
+        margin: 15px 0;
+        overflow-x: auto;
+    }
+<br><br>
+    .code-block pre {
+        background-color: #282C34; /<em> Main code background </em>/
+        padding: 15px;
+        border-radius: 7px;
+        margin: 0;
+        border: none;
+        box-shadow: none;
+        white-space: pre;
+        word-wrap: normal;
+        overflow-wrap: normal;
+    }
+<br><br>
+    .code-block pre code {
+        font-family: 'JetBrains Mono', 'Consolas', 'Monaco', monospace;
+        font-size: 14px;
+        color: #ABB2BF;
+        background: none;
+        padding: 0;
+        border: none;
+        display: block;
+        white-space: pre;
+        overflow-x: auto;
+    }
+<br><br>
+    /<em> Ensure Prism.js styles take precedence when loaded </em>/
+    .code-block pre[class*="language-"] {
+        background-color: #282C34 !important;
+    }
+    </style>
+<br><br>
+    <div class="code-block">
+        <pre><code class="language-python">print("hi")</code></pre>
+    </div>
+    """
+
+@pytest.mark.usefixtures("mock_anki")
+class TestMigrations:
+
+    def test_code_blocks_have_no_embedded_style(self):
+        """Test that code blocks are plain markup and their rules live in the note type CSS"""
+        from src.markdown.converter import format_code_block
+        from src.card_templates.note_types import get_card_styling
+
+        html = format_code_block("print('hi')", "python")
+
+        assert "<style>" not in html
+        assert "@import" not in html
+        assert '<pre><code class="language-python">' in html
+        assert '.code-block pre[class*="language-"]' in get_card_styling()
+
+    def test_strip_embedded_code_styles(self):
+        """Test that only the embedded style block is removed from a field"""
+        from src.card_templates.migrations import strip_embedded_code_styles
+
+        field_html = "<p>Question</p>" + EMBEDDED_CODE_BLOCK + EMBEDDED_CODE_BLOCK
+
+        stripped = strip_embedded_code_styles(field_html)
+
+        assert "<style>" not in stripped and "<em>" not in stripped
+        assert stripped.startswith("<p>Question</p>")
+        assert stripped.count('<div class="code-block">') == 2
+        assert '<pre><code class="language-python">print("hi")</code></pre>' in stripped
+
+    def test_legacy_note_types_keep_their_styling(self):
+        """Test that stripping embedded styles leaves note types the templates can't upgrade alone"""
+        from src.card_templates.migrations import migrate_embedded_code_styles
+        from src.card_templates.note_types import get_field_names, LANGUAGES_FIELD
+
+        # Created before the templates used the RecallLanguages field
+        model = {'id': 1, 'name': "Recall12", 'css': "/* old */",
+                 'flds': [{'name': name} for name in get_field_names(1, 2) if name != LANGUAGES_FIELD],
+                 'tmpls': [{'qfmt': "old", 'afmt': "old"}]}
+        col = MagicMock()
+        col.models.all_names_and_ids.return_value = [SimpleNamespace(id=1, name="Recall12")]
+        col.models.get.return_value = model
+
+        assert migrate_embedded_code_styles(col) == 0
+
+        assert model['css'] == "/* old */"
+        col.models.update_dict.assert_not_called()
+        col.db.list.assert_not_called()
+
+    def test_migrations_run_once(self, monkeypatch):
+        """Test that finished migrations are recorded and skipped afterwards"""
+        from src.card_templates import migrations
+
+        config = {}
+        col = MagicMock()
+        col.get_config.side_effect = lambda key, default: config.get(key, default)
+        col.set_config.side_effect = config.__setitem__
+        migrate = MagicMock(return_value=3)
+        monkeypatch.setattr(migrations, "MIGRATIONS", [("test_migration", migrate)])
+
+        assert migrations.run_migrations(col) == {"test_migration": 3}
+        assert migrations.run_migrations(col) == {}
+
+        migrate.assert_called_once_with(col)
+        assert config[migrations.MIGRATIONS_KEY] == ["test_migration"]
+
+    def test_prism_media_is_local(self, tmp_path):
+        """Test that templates load Prism from media and stale versions are removed"""
+        from src.card_templates.assets import (
+            install_media_assets, PRISM_SCRIPT_NAME, PRISM_STYLE_NAME, PRISM_MEDIA_PREFIX, PRISM_LANGUAGES
+        )
+        from src.card_templates.note_types import create_back_template
+
+        back = create_back_template(1, 2)
+        assert "{{RecallLanguages}}" in back
+        assert "cdnjs" not in back
+
+        (tmp_path / "_recall_prism-1.0.0.js").write_text("old")
+        (tmp_path / "_recall_other.js").write_text("other")
+        col = MagicMock()
+        col.media.dir.return_value = str(tmp_path)
+        col.media.have.return_value = False
+
+        added = install_media_assets(col)
+
+        grammars = [f"{PRISM_MEDIA_PREFIX}-{language}.js" for language in PRISM_LANGUAGES]
+        assert set([PRISM_SCRIPT_NAME, PRISM_STYLE_NAME] + grammars) <= set(added)
+        col.media.trash_files.assert_called_once_with(["_recall_prism-1.0.0.js"])
+
+    def test_prism_load_order(self):
+        """Test that only the grammars a note uses are loaded, dependencies first"""
+        from src.card_templates.assets import get_prism_load_order
+        from src.markdown.converter import format_code_block, get_code_languages
+
+        fields = {
+            "Question": format_code_block("let x: number = 1;", "typescript"),
+            "CorrectOption": format_code_block("x = 1", "python") + format_code_block("plain", "text"),
+        }
+
+        assert get_code_languages(fields.values()) == ["python", "text", "typescript"]
+        assert get_prism_load_order(["typescript"]) == ["clike", "javascript", "typescript"]
+        assert get_prism_load_order(["cs"]) == ["clike", "csharp"]
+        assert get_prism_load_order(["html"]) == ["markup", "css", "clike", "javascript"]
+        assert get_prism_load_order(["text", "cobol"]) == []
+
+    def test_prism_is_the_official_release(self):
+        """Test that assets/prism holds the PrismJS release, one component per vendored grammar"""
+        from src.card_templates.assets import PRISM_DIR, PRISM_LANGUAGES, PRISM_VERSION, PRISM_CDN_LANGUAGES, PRISM_CDN_PREFIX, read_asset
+
+        assert PRISM_VERSION == "1.24.1"
+        assert sorted(os.listdir(os.path.join(PRISM_DIR, 'components'))) == sorted(
+            f"prism-{language}.min.js" for language in PRISM_LANGUAGES)
+        assert "Lea Verou" in read_asset('prism', 'LICENSE')
+        assert read_asset('prism', 'prism-tomorrow.css').startswith(f"/* PrismJS {PRISM_VERSION}")
+        # Components that are not vendored load from the release on the CDN
+        assert PRISM_CDN_LANGUAGES == ["csharp", "typescript"]
+        assert PRISM_CDN_PREFIX.endswith(f"/prism/{PRISM_VERSION}/components/prism-")
+
+    def test_font_is_local(self, tmp_path, monkeypatch):
+        """Test that the bundled JetBrains Mono loads from versioned media files instead of Google Fonts"""
+        from src.card_templates import assets
+        from src.card_templates.note_types import create_back_template, get_card_styling
+
+        styling = get_card_styling()
+        media = assets.get_media_assets()
+
+        assert "googleapis" not in styling
+        assert "googleapis" not in create_back_template(1, 2)
+        assert os.path.isfile(os.path.join(assets.FONTS_DIR, "OFL.txt"))
+        for weight in assets.FONT_FILES:
+            name = assets.get_font_media_name(weight)
+            assert name.startswith("_recall_jetbrains-mono-")
+            assert f"url('{name}') format('woff2')" in styling
+            assert media[name].startswith(b"wOF2")
+
+        # A missing asset is an error rather than a card without its font
+        monkeypatch.setattr(assets, "FONTS_DIR", str(tmp_path))
+        with pytest.raises(FileNotFoundError):
+            assets.get_media_assets()
+
+    def test_user_note_types_named_recall_are_left_alone(self):
+        """Test that Recall note types are known by their fields or stamp, not by their name"""
+        from src.card_templates.note_types import (
+            get_recall_models, get_field_names, create_front_template, SOURCE_FIELD
+        )
+
+        def make_model(model_id, name, field_names, front=""):
+            return {'id': model_id, 'name': name, 'css': ".card{color:red}",
+                    'flds': [{'name': field_name} for field_name in field_names],
+                    'tmpls': [{'qfmt': front, 'afmt': ""}]}
+
+        baseline_fields = get_field_names(1, 2)[:get_field_names(1, 2).index(SOURCE_FIELD)]
+        models = {model['id']: model for model in (
+            make_model(1, "Recall Vocab", ["Question", "Answer"]),
+            make_model(2, "Recall12", baseline_fields),
+            make_model(3, "Quiz", get_field_names(10, 10)),
+            make_model(4, "RecallN", get_field_names(10, 10) + ["Notes"], create_front_template(10, 10)),
+            make_model(5, "Recall12 notes", baseline_fields + ["Notes"]),
+        )}
+        col = MagicMock()
+        col.models.all_names_and_ids.return_value = [
+            SimpleNamespace(id=model['id'], name=model['name']) for model in models.values()
+        ]
+        col.models.get.side_effect = models.get
+
+        assert [model['id'] for model in get_recall_models(col)] == [2, 3, 4]
+
+    def test_migrate_to_generic_note_type(self):
+        """Test that per-count note types are moved onto RecallN field by field and removed"""
+        from src.card_templates.migrations import migrate_to_generic_note_type
+        from src.card_templates.note_types import get_field_names
+
+        def make_model(model_id, name, field_names):
+            return {'id': model_id, 'name': name, 'tmpls': [],
+                    'flds': [{'name': field_name, 'ord': i} for i, field_name in enumerate(field_names)]}
+
+        generic = make_model(1, "RecallN", get_field_names(10, 10))
+        recall12 = make_model(2, "Recall12", get_field_names(1, 2))
+        custom = make_model(3, "Recall11", get_field_names(1, 1) + ["Notes"])
+        models = {model['id']: model for model in (generic, recall12, custom)}
+        col = MagicMock()
+        col.models.by_name.return_value = generic
+        col.models.all_names_and_ids.return_value = [
+            SimpleNamespace(id=model['id'], name=model['name']) for model in models.values()
+        ]
+        col.models.get.side_effect = models.get
+        col.models.nids.return_value = [10, 11]
+
+        assert migrate_to_generic_note_type(col) == 2
+
+        field_map = col.models.change.call_args[0][3]
+        generic_names = get_field_names(10, 10)
+        assert field_map[0] == 0
+        assert field_map[1] == generic_names.index("CorrectOption1")
+        assert field_map[5] == generic_names.index("IncorrectOption2")
+        assert field_map[10] == generic_names.index("RecallLanguages")
+        col.models.change.assert_called_once_with(recall12, [10, 11], generic, field_map, {0: 0})
+        # A note type with a field of its own is left alone
+        col.models.remove.assert_called_once_with(2)
+
+    def test_upgrade_note_types_only_touches_outdated(self):
+        """Test that only note types with an old version stamp are regenerated"""
+        from src.card_templates.migrations import upgrade_note_types
+        from src.card_templates.note_types import (
+            create_front_template, create_back_template, get_card_styling, get_note_type_styling,
+            get_field_names, TEMPLATE_STAMP
+        )
+
+        def make_model(model_id, name, front, back, css):
+            return {'id': model_id, 'name': name, 'css': css,
+                    'flds': [{'name': field_name} for field_name in get_field_names(1, 2)],
+                    'tmpls': [{'qfmt': front, 'afmt': back}]}
+
+        current = make_model(1, "Recall12", create_front_template(1, 2), create_back_template(1, 2),
+                             get_card_styling())
+        outdated = make_model(2, "Recall12 old", "<!-- Recall note type 0 -->", "", "/* old */")
+        models = {1: current, 2: outdated}
+        col = MagicMock()
+        col.models.all_names_and_ids.return_value = [
+            SimpleNamespace(id=model['id'], name=model['name']) for model in models.values()
+        ]
+        col.models.get.side_effect = models.get
+        col.media.dir.return_value = "/missing"
+
+        assert upgrade_note_types(col) == 1
+
+        col.models.update_dict.assert_called_once_with(outdated)
+        # The upgrade is a single undo step
+        col.merge_undo_entries.assert_called_once_with(col.add_custom_undo_entry.return_value)
+        assert f"<!-- {TEMPLATE_STAMP} -->" in outdated['tmpls'][0]['qfmt']
+        assert outdated['css'] == get_note_type_styling()
+
+        col.reset_mock()
+        assert upgrade_note_types(col) == 0
+        col.models.update_dict.assert_not_called()
+        col.media.have.assert_not_called()
+
+    def test_question_summaries_are_backfilled(self):
+        """Test that existing notes get a plain text summary in chunks, leaving the sort field alone"""
+        from src.card_templates.migrations import migrate_question_summaries
+        from src.card_templates.note_types import get_field_names, SUMMARY_FIELD
+        from src.markdown.converter import get_question_summary
+
+        assert get_question_summary(
+            '<p>What does\n<code>a &amp;&amp; b</code>  do?</p><style>p {}</style>'
+            '<template id="full"><pre>hidden</pre></template>'
+        ) == "What does a && b do?"
+        assert len(get_question_summary("<p>" + "word " * 100 + "</p>")) == 200
+
+        field_names = get_field_names(10, 10)
+        model = {'id': 1, 'name': "RecallN", 'sortf': 0, 'tmpls': [],
+                 'flds': [{'name': field_name} for field_name in field_names]}
+        notes = {
+            10: {'Question': "<p>First</p>", SUMMARY_FIELD: ''},
+            11: {'Question': "<p>Second</p>", SUMMARY_FIELD: ''},
+            12: {'Question': "<p>Third</p>", SUMMARY_FIELD: "Kept"},
+        }
+        col = MagicMock()
+        col.models.all_names_and_ids.return_value = [SimpleNamespace(id=1, name="RecallN")]
+        col.models.get.return_value = model
+        col.models.nids.return_value = list(notes)
+        col.get_note.side_effect = notes.get
+
+        assert migrate_question_summaries(col, chunk_size=2) == 2
+
+        assert [note[SUMMARY_FIELD] for note in notes.values()] == ["First", "Second", "Kept"]
+        assert col.update_notes.call_count == 1
+        # Changing the sort field is a schema change, see upgrade_note_type_fields
+        assert model['sortf'] == 0
+        col.models.update_dict.assert_not_called()
+
+    def test_content_tags_are_backfilled(self):
+        """Test that existing notes are tagged with their contents, keeping the tags users added"""
+        from src.card_templates.migrations import migrate_content_tags
+        from src.card_templates.note_types import get_field_names
+
+        fields = {
+            'Question': '<p>Q</p><img src="a.png"><img src="b.png">'
+                        '<div class="code-block"><pre><code class="language-python">x</code></pre></div>',
+            'CorrectOption1': '<p>A</p>', 'CorrectOption2': '',
+            'IncorrectOption1': '<p>B</p>', 'IncorrectOption2': '<p>C</p>',
+            'IncorrectExplanation2': '<div class="recall-preview" data-src="_recall_preview_0a.html">'
+                                     '<img class="preview-snapshot" src="_recall_preview_0a.png" alt="Preview">',
+            'RecallMarkdown': '<code class="language-java">',
+        }
+        tagged = SimpleNamespace(tags=["mine", "recall::lang::java"], items=fields.items)
+        current = SimpleNamespace(tags=["recall::options::correct::0", "recall::options::incorrect::0"],
+                                  items={'Question': 'Q'}.items)
+        col = MagicMock()
+        col.models.all_names_and_ids.return_value = [SimpleNamespace(id=1, name="RecallN")]
+        col.models.get.return_value = {'id': 1, 'name': "RecallN", 'tmpls': [],
+                                       'flds': [{'name': name} for name in get_field_names(10, 10)]}
+        col.models.nids.return_value = [10, 11]
+        col.get_note.side_effect = {10: tagged, 11: current}.get
+
+        assert migrate_content_tags(col) == 1
+
+        col.update_notes.assert_called_once_with([tagged])
+        assert tagged.tags == ["mine", "recall::lang::python", "recall::has_preview", "recall::images::2",
+                               "recall::options::correct::1", "recall::options::incorrect::2"]
+
+    def test_question_checksums_are_backfilled(self):
+        """Test that checksums are computed from the converted fields every note has"""
+        from src.card_templates.migrations import migrate_question_checksums
+        from src.card_templates.note_types import get_field_names, CHECKSUM_FIELD, MARKDOWN_FIELD
+        from src.markdown.parser import parse_input
+        from src.markdown.converter import convert_sections_to_fields, get_question_checksum
+
+        markdown = "#### Question\nQ\n___\n#### Correct Option\nA\n##### Explanation\nE\n"
+        fields = convert_sections_to_fields(parse_input(markdown))
+        current = get_question_checksum(fields)
+        notes = {
+            # Created before markdown was stored
+            10: {**fields, MARKDOWN_FIELD: '', CHECKSUM_FIELD: ''},
+            11: {**fields, CHECKSUM_FIELD: "outdated"},
+            12: {**fields, CHECKSUM_FIELD: current},
+        }
+        col = MagicMock()
+        col.models.all_names_and_ids.return_value = [SimpleNamespace(id=1, name="RecallN")]
+        col.models.get.return_value = {'id': 1, 'name': "RecallN", 'tmpls': [],
+                                       'flds': [{'name': name} for name in get_field_names(10, 10)]}
+        col.models.nids.return_value = list(notes)
+        col.get_note.side_effect = notes.get
+
+        assert migrate_question_checksums(col) == 2
+
+        assert [note[CHECKSUM_FIELD] for note in notes.values()] == [current] * 3
+        col.update_notes.assert_called_once_with([notes[10], notes[11]])
+
+    def test_note_type_fields_are_only_added_when_accepted(self):
+        """Test that migrations leave fields alone and upgrading asks for the full sync first"""
+        from src.card_templates.migrations import (
+            migrate_question_summaries, migrate_question_checksums, migrate_embedded_code_styles,
+            migrate_media_assets, upgrade_note_types, upgrade_note_type_fields, needs_note_type_fields
+        )
+        from src.card_templates.note_types import get_field_names, is_current_note_type, SUMMARY_FIELD, CHECKSUM_FIELD
+
+        class AbortSchemaModification(Exception):
+            pass
+
+        # Created before the summary and checksum fields were introduced
+        field_names = [name for name in get_field_names(1, 2) if name not in (SUMMARY_FIELD, CHECKSUM_FIELD)]
+        model = {'id': 1, 'name': "Recall12", 'sortf': 0, 'css': '',
+                 'flds': [{'name': field_name} for field_name in field_names],
+                 'tmpls': [{'qfmt': '', 'afmt': ''}]}
+        # Fields added to the note type are empty in its notes
+        note = defaultdict(str, {'Question': "<p>Q</p>"})
+        col = MagicMock()
+        col.models.all_names_and_ids.return_value = [SimpleNamespace(id=1, name="Recall12")]
+        col.models.get.return_value = model
+        col.models.new_field.side_effect = lambda name: {'name': name}
+        col.models.add_field.side_effect = lambda model, field: model['flds'].append(field)
+        col.models.nids.return_value = [10]
+        col.get_note.return_value = note
+        col.media.dir.return_value = "/missing"
+
+        for migrate in [migrate_question_summaries, migrate_question_checksums, migrate_embedded_code_styles,
+                        migrate_media_assets, upgrade_note_types]:
+            migrate(col)
+        col.mod_schema.assert_not_called()
+        # Templates and styling are only ever upgraded together
+        assert is_current_note_type(model)
+        col.models.add_field.assert_not_called()
+        assert needs_note_type_fields(col)
+
+        col.mod_schema.side_effect = AbortSchemaModification
+        with pytest.raises(AbortSchemaModification):
+            upgrade_note_type_fields(col)
+        col.models.add_field.assert_not_called()
+
+        col.mod_schema.side_effect = None
+        assert upgrade_note_type_fields(col) == 1
+        col.mod_schema.assert_called_with(check=True)
+        assert [field['name'] for field in model['flds']][-2:] == [SUMMARY_FIELD, CHECKSUM_FIELD]
+        assert model['sortf'] == len(model['flds']) - 2
+        # The new fields of existing notes are filled in
+        assert note[SUMMARY_FIELD] == "Q"
+        assert not needs_note_type_fields(col)
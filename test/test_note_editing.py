@@ -0,0 +1,70 @@
+import pytest
+import sys
+import os
+from unittest.mock import patch
+
+# Add parent directory to path so we can import the plugin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+QUESTION = """#### Question
+What is the capital of France?
+___
+#### Correct Option
+Paris
+
+##### Explanation
+Paris is the capital of France.
+___
+#### Incorrect Option
+London
+
+##### Explanation
+London is the capital of the United Kingdom.
+___"""
+
+@pytest.mark.usefixtures("mock_anki")
+class TestNoteEditing:
+
+    def test_markdown_round_trip(self):
+        """Test that stored markdown is compressed and decoded unchanged"""
+        from src.markdown.storage import encode_markdown, decode_markdown
+
+        stored = encode_markdown(QUESTION * 20)
+
+        assert stored.startswith("zlib:")
+        assert len(stored) < len(QUESTION * 20)
+        assert decode_markdown(stored) == QUESTION * 20
+        assert decode_markdown("") == ""
+
+    def test_damaged_markdown(self):
+        """Test that damaged stored markdown raises ValueError"""
+        from src.markdown.storage import decode_markdown
+
+        with pytest.raises(ValueError):
+            decode_markdown("zlib:bm90IGNvbXByZXNzZWQ=")
+
+    def test_only_changed_sections_are_converted(self):
+        """Test that editing one explanation reconverts only that field"""
+        from src.markdown import converter
+        from src.markdown.parser import parse_input
+
+        previous = parse_input(QUESTION)
+        edited = parse_input(QUESTION.replace("United Kingdom.", "United Kingdom, not France."))
+
+        with patch.object(converter, 'convert_markdown_to_html',
+                          wraps=converter.convert_markdown_to_html) as convert:
+            fields = converter.convert_sections_to_fields(edited, previous_sections=previous)
+
+        assert list(fields) == ['IncorrectExplanation1']
+        assert "not France" in fields['IncorrectExplanation1']
+        assert convert.call_count == 1
+
+    def test_all_sections_converted_without_previous(self):
+        """Test that every field is converted for a new note"""
+        from src.markdown.converter import convert_sections_to_fields
+        from src.markdown.parser import parse_input
+
+        fields = convert_sections_to_fields(parse_input(QUESTION))
+
+        assert list(fields) == ['Question', 'CorrectOption', 'CorrectExplanation',
+                                'IncorrectOption1', 'IncorrectExplanation1']
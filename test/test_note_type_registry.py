@@ -0,0 +1,62 @@
+import pytest
+import sys
+import os
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+# Add parent directory to path so we can import the plugin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def make_collection(models):
+    col = MagicMock()
+    col.models.all_names_and_ids.return_value = [
+        SimpleNamespace(id=model['id'], name=model['name']) for model in models.values()
+    ]
+    col.models.get.side_effect = models.get
+    return col
+
+@pytest.mark.usefixtures("mock_anki")
+class TestNoteTypeRegistry:
+
+    def test_lookups_read_the_note_types_once(self):
+        """Test that the note type names are read once and lookups don't search by name"""
+        from src.card_templates.registry import NoteTypeRegistry
+        from src.card_templates.note_types import get_field_names
+
+        # Created by an older version, without the newest hidden field
+        field_names = get_field_names(10, 10)[:-1]
+        generic = {'id': 5, 'name': "RecallN", 'flds': [{'name': name} for name in field_names]}
+        col = make_collection({5: generic, 6: {'id': 6, 'name': "Basic", 'flds': []}})
+        registry = NoteTypeRegistry(col)
+
+        for counts in [(1, 1), (2, 3), (1, 2)]:
+            assert registry.get_model(*counts) is generic
+
+        col.models.all_names_and_ids.assert_called_once()
+        col.models.by_name.assert_not_called()
+        col.models.add.assert_not_called()
+        # Adding the field needs a full sync, so lookups leave the note type alone
+        col.models.add_field.assert_not_called()
+        col.mod_schema.assert_not_called()
+
+    def test_missing_and_renamed_note_types_are_created(self):
+        """Test that a lookup misses when the note type is gone, and finds it again after an invalidation"""
+        from src.card_templates.registry import NoteTypeRegistry, on_operation_did_execute, get_note_type_registry
+
+        models = {5: {'id': 5, 'name': "RecallN renamed", 'flds': []}}
+        col = make_collection(models)
+        col.models.id_for_name.return_value = None
+        col.models.new.return_value = {'name': "RecallN", 'flds': [], 'tmpls': []}
+        col.models.add.side_effect = lambda model: model.update(id=9)
+        col.media.dir.return_value = "/missing"
+        registry = NoteTypeRegistry(col)
+        registry._ids = {"RecallN": 5}
+
+        assert registry.get_model(1, 1)['id'] == 9
+        col.models.add.assert_called_once()
+
+        registry = get_note_type_registry(col)
+        registry.get_model(1, 1)
+        assert registry._ids is not None
+        on_operation_did_execute(MagicMock(notetype=True), None)
+        assert registry._ids is None
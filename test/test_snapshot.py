@@ -0,0 +1,39 @@
+import pytest
+import sys
+import os
+
+# Add parent directory to path so we can import the plugin
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DOCUMENT = '<p style="font-size: 40px">Snapshot</p>'
+
+@pytest.mark.usefixtures("mock_anki")
+class TestSnapshot:
+
+    def test_previews_are_kept_without_qt(self, tmp_path, monkeypatch):
+        """Test that fields are left alone when Qt WebEngine is missing"""
+        from src.markdown import snapshot
+        from src.markdown.converter import create_preview_frame
+
+        monkeypatch.setattr(snapshot, "QWebEngineView", None)
+        fields = {'CorrectExplanation': create_preview_frame(DOCUMENT, str(tmp_path))}
+        original = dict(fields)
+
+        assert snapshot.add_preview_snapshots(fields, str(tmp_path)) == 0
+        assert fields == original
+
+    def test_snapshot_is_added_to_preview(self, tmp_path):
+        """Test that a preview gets a PNG snapshot of its document, rendered offscreen"""
+        pytest.importorskip("PyQt6.QtWebEngineWidgets")
+        from src.markdown.snapshot import add_preview_snapshots
+        from src.markdown.converter import create_preview_frame
+
+        fields = {'Question': '<p>No preview</p>',
+                  'CorrectExplanation': create_preview_frame(DOCUMENT, str(tmp_path))}
+
+        assert add_preview_snapshots(fields, str(tmp_path)) == 1
+
+        name = fields['CorrectExplanation'].split('data-src="')[1].split('.html"')[0] + '.png'
+        assert f'<img class="preview-snapshot" src="{name}" alt="Preview"><button' in fields['CorrectExplanation']
+        assert fields['Question'] == '<p>No preview</p>'
+        assert (tmp_path / name).read_bytes().startswith(b'\x89PNG')